@@ -0,0 +1,252 @@
+"""aggregate.py: Merge sharded build results into a single check run."""
+
+# バッチビルドの各シャードは --shard-store を指定してprcb-checksを呼び出し、
+# 部分結果(件数・アノテーション・conclusion)を共有ストアへJSON Linesで書き出す。
+#   1行目    : ヘッダ {"shard": ..., "conclusion": ..., "counts": {...}, ...}
+#   2行目以降: アノテーション
+# 最後に prcb-checks aggregate <name> がシャードを順に読み込みながら1つのチェックランにまとめる。
+# 結果を書く前に落ちたシャードは見えないため、--expected-shards より少なければfailureにする。
+
+import json
+import os
+import sys
+from urllib.parse import quote
+
+from prcb_checks.annotations import json_default
+from prcb_checks.client import ChecksClient, ChecksClientError
+from prcb_checks.logger import logger
+from prcb_checks.store import get_store
+from prcb_checks.summary import AnnotationStats, render_summary
+
+# 後ろほど深刻。シャードの中で最も深刻なものを全体のconclusionにする
+CONCLUSION_SEVERITY = (
+    "success",
+    "skipped",
+    "neutral",
+    "cancelled",
+    "timed_out",
+    "failure",
+    "action_required",
+)
+COUNTED_LEVELS = ("failure", "warning", "notice")
+
+
+def shard_prefix(name, head_sha):
+    """Get the key prefix of the shards of a check"""
+    return f"shards/{quote(name, safe='')}/{head_sha}/"
+
+
+def get_shard_id():
+    """Get the shard ID of this build from CodeBuild environment variables"""
+    shard_id = os.environ.get("CODEBUILD_BATCH_BUILD_IDENTIFIER") or os.environ.get(
+        "CODEBUILD_BUILD_ID"
+    )
+    if not shard_id:
+        logger.error(
+            "Error: --shard-id is required outside of a CodeBuild (batch) build"
+        )
+        sys.exit(1)
+    return shard_id
+
+
+def worst_conclusion(current, conclusion):
+    """Return the more severe of two conclusions (None is ignored)"""
+    if current is None:
+        return conclusion
+    if conclusion is None:
+        return current
+    return max(current, conclusion, key=CONCLUSION_SEVERITY.index)
+
+
+def write_shard(store, check_run_payload, shard_id):
+    """
+    Write the partial result of a shard to the store
+    Args:
+        store (LocalStore/S3Store): Shared store
+        check_run_payload (dict): Validated check-run payload of this shard
+        shard_id (str): Shard identifier
+    """
+    output = check_run_payload.get("output", {})
+    annotations = output.get("annotations") or []
+    counts = dict.fromkeys(COUNTED_LEVELS, 0)
+    for annotation in annotations:
+        counts[annotation["annotation_level"]] += 1
+
+    header = {
+        "shard": shard_id,
+        "conclusion": check_run_payload.get("conclusion"),
+        "title": output.get("title"),
+        "summary": output.get("summary"),
+        "counts": counts,
+    }
+    lines = [json.dumps(header)]
+    lines.extend(
+        json.dumps(annotation, default=json_default) for annotation in annotations
+    )
+    key = shard_prefix(check_run_payload["name"], check_run_payload["head_sha"])
+    store.put(
+        key + quote(shard_id, safe="") + ".jsonl", ("\n".join(lines) + "\n").encode()
+    )
+    logger.debug(f"Wrote shard {shard_id}: {counts}")
+
+
+class ShardMerger:
+    """Streams the annotations of all shards while merging their headers"""
+
+    def __init__(self, store, name, head_sha, expected_shards=None):
+        self.store = store
+        self.keys = store.list(shard_prefix(name, head_sha))
+        self.expected_shards = expected_shards
+        self.conclusion = None
+        self.counts = dict.fromkeys(COUNTED_LEVELS, 0)
+        self.shards = []
+        self.stats = AnnotationStats()
+
+    def annotations(self):
+        """
+        Iterate over the annotations of every shard, one shard at a time
+        Returns:
+            iterator: Annotation objects
+        """
+        for key in self.keys:
+            lines = self.store.iter_lines(key)
+            header = json.loads(next(lines))
+            self.conclusion = worst_conclusion(self.conclusion, header["conclusion"])
+            for level, count in header["counts"].items():
+                self.counts[level] = self.counts.get(level, 0) + count
+            self.shards.append(header)
+            for line in lines:
+                if line:
+                    annotation = json.loads(line)
+                    self.stats.update(annotation)
+                    yield annotation
+
+    def missing(self):
+        """Number of expected shards that did not write a result"""
+        if self.expected_shards is None:
+            return 0
+        return max(0, self.expected_shards - len(self.keys))
+
+    def final_conclusion(self):
+        """Conclusion of the check run, failure if a shard is missing"""
+        if self.missing():
+            return "failure"
+        return self.conclusion or "neutral"
+
+    def _missing_note(self):
+        return (
+            f"**{self.missing()} of {self.expected_shards} expected shards "
+            "did not write a result.**\n\n"
+        )
+
+    def summary(self):
+        note = self._missing_note() if self.missing() else ""
+        return f"{note}Merged {len(self.shards)} shards.\n\n" + render_summary(
+            self.stats
+        )
+
+    def text(self):
+        rows = [
+            "| Shard | Conclusion | " + " | ".join(COUNTED_LEVELS) + " |",
+            "|---|---|" + "---|" * len(COUNTED_LEVELS),
+        ]
+        for shard in self.shards:
+            counts = " | ".join(
+                str(shard["counts"].get(level, 0)) for level in COUNTED_LEVELS
+            )
+            rows.append(
+                f"| {shard['shard']} | {shard['conclusion'] or '-'} | {counts} |"
+            )
+        # summaryを指定された場合も、欠けたシャードがあることを示す
+        note = self._missing_note() if self.missing() else ""
+        return note + "\n".join(rows)
+
+
+def aggregate_shards(
+    client, store, name, head_sha, title=None, summary=None, expected_shards=None
+):
+    """
+    Post one consolidated check run from the shards in the store
+    Args:
+        client (ChecksClient): Checks API client
+        store (LocalStore/S3Store): Shared store
+        name (str): Name of the check
+        head_sha (str): Commit SHA
+        title (str): Output title (default: name)
+        summary (str): Output summary (default: generated from the counts)
+        expected_shards (int): Number of shards; fewer results conclude failure
+    Returns:
+        dict: Check run, or None if no shard was found
+    """
+    merger = ShardMerger(store, name, head_sha, expected_shards)
+    if not merger.keys:
+        return None
+    title = title or name
+
+    check_run = client.create(name, head_sha=head_sha, status="in_progress")
+    # アノテーションはシャード単位で読み込みながら50件ずつ送信する
+    client.add_annotations(
+        check_run["id"], merger.annotations(), title, "Aggregating shard results..."
+    )
+    client.complete(
+        check_run["id"],
+        merger.final_conclusion(),
+        title=title,
+        summary=summary or merger.summary(),
+        text=merger.text(),
+    )
+    if merger.missing():
+        logger.warning(f"{merger.missing()} of {expected_shards} shards are missing")
+    logger.info(f"Aggregated {len(merger.shards)} shards: {merger.final_conclusion()}")
+    return check_run
+
+
+def aggregate_main(options, args):
+    """Entry point of `prcb-checks aggregate <name> [title] [summary]`"""
+    if not args:
+        logger.error("Error: Not enough arguments provided.")
+        logger.info("Usage: %prog aggregate --shard-store URL <name> [title] [summary]")
+        sys.exit(1)
+    if not options.shard_store:
+        logger.error("Error: --shard-store is required for aggregate")
+        sys.exit(1)
+    if options.expected_shards is not None and options.expected_shards < 1:
+        logger.error("Error: --expected-shards must be at least 1")
+        sys.exit(1)
+
+    name = args[0]
+    title = args[1] if len(args) > 1 and args[1] else None
+    summary = args[2] if len(args) > 2 and args[2] else None
+    try:
+        head_sha = os.environ["CODEBUILD_RESOLVED_SOURCE_VERSION"]
+    except KeyError as e:
+        logger.error(f"Error: Required environment variable not found: {e}")
+        sys.exit(1)
+    store = get_store(options.shard_store)
+
+    if options.dry_run:
+        merger = ShardMerger(store, name, head_sha, options.expected_shards)
+        for _ in merger.annotations():
+            pass
+        print(merger.summary())
+        print(merger.text())
+        logger.info(f"Conclusion: {merger.final_conclusion()}")
+        return
+
+    try:
+        with ChecksClient() as client:
+            check_run = aggregate_shards(
+                client,
+                store,
+                name,
+                head_sha,
+                title,
+                summary,
+                options.expected_shards,
+            )
+    except ChecksClientError as e:
+        logger.error(f"Error aggregating shards: {e}")
+        sys.exit(1)
+    if check_run is None:
+        logger.error(f"Error: No shard results found for {name} ({head_sha})")
+        sys.exit(1)
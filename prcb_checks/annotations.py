@@ -0,0 +1,280 @@
+"""annotations.py: Compact columnar store of annotations."""
+
+# 数百万件のアノテーションを1件ずつdictで持つと、同じpath・annotation_level・titleの文字列と
+# dictのオーバーヘッドだけで数GBになる。文字列は辞書符号化して整数コードの配列に、
+# 行・列番号はarrayに格納し、1件分はアノテーションの位置だけを持つ__slots__のビューで参照する。
+# JSON配列は要素ごとに読み込んで取り込み時に検証するため、文書全体のdictのリストは作らない。
+
+import json
+import re
+from array import array
+from collections.abc import Mapping
+
+from prcb_checks.validator import validate_annotation
+
+READ_SIZE = 64 * 1024
+LEVELS = ("notice", "warning", "failure")
+# 行・列番号の配列(符号付き64ビット)に入らない値
+MAX_NUMBER = 2**63 - 1
+# 任意の行・列番号とtitleが無いことを表す値
+_MISSING = 0
+_NO_TITLE = -1
+
+_LEVEL_CODES = {level: code for code, level in enumerate(LEVELS)}
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_SEPARATOR = re.compile(r"[ \t\n\r]*,[ \t\n\r]*")
+
+
+class AnnotationView(Mapping):
+    """Read-only view of one annotation in an AnnotationStore"""
+
+    __slots__ = ("_store", "_index")
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, key):
+        return self._store._get(self._index, key)
+
+    def __iter__(self):
+        return iter(self._store._row(self._index))
+
+    def __len__(self):
+        return len(self._store._row(self._index))
+
+    def __repr__(self):
+        return f"AnnotationView({self._store._row(self._index)!r})"
+
+    def to_dict(self):
+        """
+        Copy the annotation into a dict
+        Returns:
+            dict: Annotation object
+        """
+        return self._store._row(self._index)
+
+
+class AnnotationStore:
+    """Validated annotations stored column by column"""
+
+    def __init__(self, annotations=()):
+        # path・titleで共有する文字列の辞書
+        self._strings = []
+        self._string_codes = {}
+        self._paths = array("I")
+        self._titles = array("i")
+        self._levels = array("B")
+        self._start_lines = array("q")
+        self._end_lines = array("q")
+        self._start_columns = array("q")
+        self._end_columns = array("q")
+        self._messages = []
+        # raw_detailsを持つアノテーションは少ないため、位置 -> 値で持つ
+        self._raw_details = {}
+        # 取り込もうとした件数(不正なものも含む)と、その検証エラー
+        self.parsed = 0
+        self.errors = []
+        for annotation in annotations:
+            self.append(annotation)
+
+    def _encode(self, value):
+        code = self._string_codes.get(value)
+        if code is None:
+            code = self._string_codes[value] = len(self._strings)
+            self._strings.append(value)
+        return code
+
+    def append(self, annotation):
+        """
+        Validate and add an annotation
+        Args:
+            annotation (dict): Annotation object
+        Returns:
+            bool: False if the annotation was invalid and recorded in errors
+        """
+        index = self.parsed
+        self.parsed += 1
+        errors = validate_annotation(annotation, index)
+        if not errors:
+            numbers = [
+                annotation.get(key, _MISSING)
+                for key in ("start_line", "end_line", "start_column", "end_column")
+            ]
+            if max(numbers) > MAX_NUMBER:
+                errors = [f"annotations[{index}]: line or column is too large"]
+        if errors:
+            self.errors.extend(errors)
+            return False
+
+        self._paths.append(self._encode(annotation["path"]))
+        title = annotation.get("title")
+        self._titles.append(_NO_TITLE if title is None else self._encode(title))
+        self._levels.append(_LEVEL_CODES[annotation["annotation_level"]])
+        self._start_lines.append(numbers[0])
+        self._end_lines.append(numbers[1])
+        self._start_columns.append(numbers[2])
+        self._end_columns.append(numbers[3])
+        self._messages.append(annotation["message"])
+        if "raw_details" in annotation:
+            self._raw_details[len(self._messages) - 1] = annotation["raw_details"]
+        return True
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield AnnotationView(self, index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [AnnotationView(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("annotation index out of range")
+        return AnnotationView(self, index)
+
+    def _row(self, index):
+        row = {
+            "path": self._strings[self._paths[index]],
+            "start_line": self._start_lines[index],
+            "end_line": self._end_lines[index],
+        }
+        if self._start_columns[index] != _MISSING:
+            row["start_column"] = self._start_columns[index]
+        if self._end_columns[index] != _MISSING:
+            row["end_column"] = self._end_columns[index]
+        row["annotation_level"] = LEVELS[self._levels[index]]
+        row["message"] = self._messages[index]
+        if self._titles[index] != _NO_TITLE:
+            row["title"] = self._strings[self._titles[index]]
+        if index in self._raw_details:
+            row["raw_details"] = self._raw_details[index]
+        return row
+
+    def _get(self, index, key):
+        # 1つのフィールドを読むためにdictを組み立てないよう、列を直接引く
+        if key == "path":
+            return self._strings[self._paths[index]]
+        if key == "annotation_level":
+            return LEVELS[self._levels[index]]
+        if key == "message":
+            return self._messages[index]
+        if key == "title" and self._titles[index] != _NO_TITLE:
+            return self._strings[self._titles[index]]
+        if key in ("start_line", "end_line"):
+            column = self._start_lines if key == "start_line" else self._end_lines
+            return column[index]
+        return self._row(index)[key]
+
+    def to_list(self):
+        """
+        Copy the annotations into dicts
+        Returns:
+            list: Annotation objects
+        """
+        return [self._row(index) for index in range(len(self))]
+
+
+def json_default(value):
+    """
+    `default` hook of the json module for AnnotationStore and AnnotationView
+    Args:
+        value (object): Object the json module cannot serialize
+    Returns:
+        list/dict: Serializable copy
+    """
+    if isinstance(value, AnnotationStore):
+        return value.to_list()
+    if isinstance(value, AnnotationView):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class _NotAnArray(Exception):
+    pass
+
+
+def _read_more(file, buffer, position, chunk_size):
+    # 1要素が読み込み単位より大きい場合に解析し直す回数が増えないよう、倍々に読む
+    chunk = file.read(max(chunk_size, len(buffer) - position))
+    return buffer[position:] + chunk, 0, not chunk
+
+
+def _iter_array(file, chunk_size):
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+    # start: "["の前, first: 最初の要素か"]"の前, value: 要素の前, after: ","か"]"の前, end: 終了後
+    state = "start"
+    while True:
+        position = _WHITESPACE.match(buffer, position).end()
+        if position == len(buffer) and not eof:
+            buffer, position, eof = _read_more(file, buffer, position, chunk_size)
+            continue
+        char = buffer[position : position + 1]
+
+        if state == "start":
+            if char != "[":
+                raise _NotAnArray
+            position += 1
+            state = "first"
+        elif state == "end":
+            if char:
+                raise json.JSONDecodeError("Extra data", buffer, position)
+            return
+        elif char == "]" and state in ("first", "after"):
+            position += 1
+            state = "end"
+        elif state == "after":
+            if char != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, position)
+            position += 1
+            state = "value"
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                buffer, position, eof = _read_more(file, buffer, position, chunk_size)
+                continue
+            # 数値などが読み込み単位の境界で切れているかもしれないので、続きを読んでから解析する
+            if end == len(buffer) and not eof:
+                buffer, position, eof = _read_more(file, buffer, position, chunk_size)
+                continue
+            # 区切りの","まで読み込み済みなら、次の要素の解析に直接進む
+            separator = _SEPARATOR.match(buffer, end)
+            if separator and separator.end() < len(buffer):
+                position = separator.end()
+                state = "value"
+            else:
+                position = end
+                state = "after"
+            yield value
+
+
+def parse_annotations(file, chunk_size=READ_SIZE):
+    """
+    Parse a JSON array of annotations into a store, one element at a time
+    Args:
+        file (file): Seekable text stream of the JSON document
+        chunk_size (int): Number of characters to read at a time
+    Returns:
+        AnnotationStore/object: Store, or the parsed document if it is not an array
+    Raises:
+        json.JSONDecodeError: The document is not valid JSON
+    """
+    store = AnnotationStore()
+    try:
+        for annotation in _iter_array(file, chunk_size):
+            store.append(annotation)
+    except (_NotAnArray, json.JSONDecodeError):
+        # 配列でなければそのまま返す。不正なJSONは文書全体での位置を報告するため、
+        # 標準のパーサーで読み直してエラーにする
+        file.seek(0)
+        return json.load(file)
+    return store
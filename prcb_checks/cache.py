@@ -0,0 +1,130 @@
+"""cache.py: Local cache directory for prcb-checks."""
+
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+# 有効期限の直前で失効しないよう、この秒数だけ早めにトークンを更新する
+TOKEN_REFRESH_MARGIN = 300
+
+# リポジトリ→インストールIDの索引を再利用する秒数
+INSTALLATION_INDEX_TTL = 24 * 60 * 60
+INSTALLATION_INDEX = ("installations", "index.json")
+
+
+def get_cache_dir(*parts):
+    """
+    Get (and create) a directory under the local cache directory
+    Args:
+        parts (str): Subdirectory names
+    Returns:
+        str: Path of the directory
+    """
+    # PRCB_CHECKS_CACHE_DIR > XDG_CACHE_HOME > ~/.cache
+    base = os.environ.get("PRCB_CHECKS_CACHE_DIR") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+        "prcb-checks",
+    )
+    directory = os.path.join(base, *parts)
+    # トークン等を置くため、本人以外は読めないようにする
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    return directory
+
+
+def read_json(directory, name):
+    """
+    Read a JSON file from the cache
+    Args:
+        directory (str): Subdirectory of the cache
+        name (str): File name
+    Returns:
+        dict: Content, or None if it does not exist or is broken
+    """
+    try:
+        with open(os.path.join(get_cache_dir(directory), name), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(directory, name, data, default=None):
+    """
+    Write a JSON file to the cache atomically, readable only by the owner
+    Args:
+        directory (str): Subdirectory of the cache
+        name (str): File name
+        data (dict): Content
+        default (callable): `default` hook of json.dump()
+    """
+    path = get_cache_dir(directory)
+    fd, tmp_path = tempfile.mkstemp(dir=path, prefix=".tmp-")
+    with os.fdopen(fd, "w", encoding="utf-8") as file:
+        json.dump(data, file, default=default)
+    os.replace(tmp_path, os.path.join(path, name))
+
+
+def load_access_token(installation_id):
+    """
+    Load a cached installation access token
+    Args:
+        installation_id (str): Installation ID of the GitHub App
+    Returns:
+        tuple: (token, expires_at epoch seconds), or None if missing or expiring
+    """
+    data = read_json("tokens", f"{installation_id}.json")
+    if not data or time.time() >= data["expires_at"] - TOKEN_REFRESH_MARGIN:
+        return None
+    return data["token"], data["expires_at"]
+
+
+def save_access_token(installation_id, token, expires_at):
+    """
+    Cache an installation access token
+    Args:
+        installation_id (str): Installation ID of the GitHub App
+        token (str): Installation access token
+        expires_at (str): Expiration time returned by GitHub (ISO 8601)
+    Returns:
+        float: Expiration time in epoch seconds
+    """
+    expires_at = datetime.fromisoformat(expires_at).timestamp()
+    write_json(
+        "tokens", f"{installation_id}.json", {"token": token, "expires_at": expires_at}
+    )
+    return expires_at
+
+
+def load_installation_id(repository):
+    """
+    Look up the installation of the GitHub App on a repository in the index
+    Args:
+        repository (str): "owner/repo"
+    Returns:
+        str: Installation ID, or None if unknown or expired
+    """
+    entry = (read_json(*INSTALLATION_INDEX) or {}).get(repository)
+    if not entry or time.time() >= entry["expires_at"]:
+        return None
+    return entry["id"]
+
+
+def save_installation_id(repository, installation_id, ttl=INSTALLATION_INDEX_TTL):
+    """
+    Record the installation of the GitHub App on a repository in the index
+    Args:
+        repository (str): "owner/repo"
+        installation_id (str): Installation ID, or None to forget the repository
+        ttl (float): Seconds the entry is valid for
+    """
+    now = time.time()
+    # 期限切れのエントリを捨てて、索引が大きくなり続けないようにする
+    index = {
+        name: entry
+        for name, entry in (read_json(*INSTALLATION_INDEX) or {}).items()
+        if entry["expires_at"] > now and name != repository
+    }
+    if installation_id is not None:
+        index[repository] = {"id": str(installation_id), "expires_at": now + ttl}
+    write_json(*INSTALLATION_INDEX, index)
@@ -0,0 +1,542 @@
+"""client.py: Importable GitHub Checks API client for prcb-checks."""
+
+# CLIを経由せずにプロセス内からチェックを報告するためのクライアント。
+# 認証(秘密鍵の取得・JWT・インストールアクセストークンの更新)とHTTPコネクションプールを保持する。
+#
+#   with ChecksClient() as client:
+#       check_run = client.create("pytest", status="in_progress")
+#       client.add_annotations(check_run["id"], annotations, "pytest", "Failures")
+#       client.complete(check_run["id"], "failure", "pytest", "3 failed")
+
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from botocore.exceptions import (
+    BotoCoreError,
+    ClientError,
+    ConnectTimeoutError,
+    ReadTimeoutError,
+)
+from requests.adapters import HTTPAdapter
+
+from prcb_checks.cache import (
+    TOKEN_REFRESH_MARGIN,
+    load_access_token,
+    load_installation_id,
+    save_access_token,
+    save_installation_id,
+)
+from prcb_checks.deadline import DeadlineExceeded
+from prcb_checks.logger import logger
+from prcb_checks.main import (
+    build_check_run_payload,
+    create_app_jwt,
+    discover_installation_id,
+    find_full_repository_name,
+    get_secret_value,
+    iter_payload_chunks,
+)
+from prcb_checks.validator import (
+    MAX_ANNOTATIONS_PER_REQUEST,
+    validate_check_run_payload,
+)
+
+GITHUB_API_URL = "https://api.github.com"
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_POOL_SIZE = 10
+
+
+class ChecksClientError(Exception):
+    """Error raised when a Checks API request fails"""
+
+    def __init__(self, message, status_code=None, errors=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.errors = errors or []
+
+
+class ChecksClientTimeout(ChecksClientError, DeadlineExceeded):
+    """Error raised when a request times out or the deadline has run out"""
+
+
+@contextmanager
+def _wrap_errors(action):
+    # requests・botocoreの例外をChecksClientErrorにする。タイムアウトは --on-deadline で
+    # 扱えるよう、DeadlineExceededでもあるChecksClientTimeoutにする
+    try:
+        yield
+    except requests.HTTPError as e:
+        raise ChecksClientError(str(e), status_code=e.response.status_code) from e
+    except (
+        requests.Timeout,
+        DeadlineExceeded,
+        ConnectTimeoutError,
+        ReadTimeoutError,
+    ) as e:
+        raise ChecksClientTimeout(f"Timed out {action}: {e}") from e
+    except (requests.RequestException, BotoCoreError, ClientError) as e:
+        raise ChecksClientError(f"Error {action}: {e}") from e
+    except (ValueError, KeyError, TypeError) as e:
+        # 2xxでもJSONでない・必要なキーがない応答は呼び出し側に漏らさない
+        raise ChecksClientError(f"Invalid response {action}: {e!r}") from e
+
+
+class TokenPool:
+    """Credentials of a GitHub App shared by clients of many repositories
+
+    Installation access tokens are kept per installation, and the
+    installation of each repository is kept in the persistent index, so
+    one process can report to many repositories without repeated lookups.
+    """
+
+    def __init__(self, app_id=None, private_key=None, secret_id=None):
+        """
+        Args:
+            app_id (str): GitHub App ID (default: GITHUB_APP_ID)
+            private_key (bytes): GitHub App private key (default: fetched from Secrets Manager)
+            secret_id (str): Secret ID of the private key (default: SECRETS_MANAGER_SECRETID)
+        """
+        self.app_id = app_id or os.environ.get("GITHUB_APP_ID")
+        self.secret_id = secret_id or os.environ.get("SECRETS_MANAGER_SECRETID")
+        self._private_key = private_key
+        # インストールID -> (トークン, 有効期限)
+        self._tokens = {}
+        # 401になったトークンはディスクのキャッシュからも読み込まない
+        self._rejected = set()
+        self.lock = threading.Lock()
+
+    def create_jwt(self, deadline=None):
+        """
+        Sign a JWT of the GitHub App
+        Args:
+            deadline (Deadline): Deadline of fetching the private key
+        Returns:
+            str: JWT
+        """
+        if not self.app_id:
+            raise ChecksClientError("GITHUB_APP_ID is required")
+        if self._private_key is None:
+            if not self.secret_id:
+                raise ChecksClientError("No private key or SECRETS_MANAGER_SECRETID")
+            if not os.environ.get("AWS_REGION"):
+                raise ChecksClientError(
+                    "AWS_REGION is required to fetch the private key"
+                )
+            with _wrap_errors("fetching the private key"):
+                self._private_key = get_secret_value(self.secret_id, deadline)
+        return create_app_jwt(self.app_id, self._private_key)
+
+    def get(self, installation_id):
+        """
+        Get a token that is not about to expire
+        Args:
+            installation_id (str): Installation ID
+        Returns:
+            str: Installation access token, or None
+        """
+        token, expires_at = self._tokens.get(installation_id, (None, 0.0))
+        if token and time.time() < expires_at - TOKEN_REFRESH_MARGIN:
+            return token
+        # `prcb-checks warm` や他のプロセスが取得したトークンを再利用する
+        if installation_id not in self._rejected:
+            cached = load_access_token(installation_id)
+            if cached is not None:
+                self._tokens[installation_id] = cached
+                return cached[0]
+        return None
+
+    def put(self, installation_id, token, expires_at):
+        """
+        Store a new token
+        Args:
+            installation_id (str): Installation ID
+            token (str): Installation access token
+            expires_at (str): Expiration time returned by GitHub (ISO 8601)
+        """
+        self._tokens[installation_id] = (
+            token,
+            save_access_token(installation_id, token, expires_at),
+        )
+
+    def reject(self, installation_id):
+        """Forget a token the API has rejected"""
+        self._tokens.pop(installation_id, None)
+        self._rejected.add(installation_id)
+
+
+class ChecksClient:
+    """Synchronous GitHub Checks API client"""
+
+    def __init__(
+        self,
+        repository=None,
+        app_id=None,
+        installation_id=None,
+        private_key=None,
+        secret_id=None,
+        pool_size=DEFAULT_POOL_SIZE,
+        timeout=DEFAULT_TIMEOUT,
+        session=None,
+        deadline=None,
+        token_pool=None,
+    ):
+        """
+        Args:
+            repository (str): "owner/repo" (default: resolved from CodeBuild environment)
+            app_id (str): GitHub App ID (default: GITHUB_APP_ID)
+            installation_id (str): Installation ID (default: GITHUB_APP_INSTALLATION_ID,
+                or discovered from the repository)
+            private_key (bytes): GitHub App private key (default: fetched from Secrets Manager)
+            secret_id (str): Secret ID of the private key (default: SECRETS_MANAGER_SECRETID)
+            pool_size (int): Maximum number of pooled connections
+            timeout (float): Timeout of each request in seconds
+            session (requests.Session): Session to use instead of creating one
+            deadline (Deadline): Deadline that caps the timeout of each request
+            token_pool (TokenPool): Credentials to share with other clients
+                (app_id, private_key and secret_id are ignored if given)
+        """
+        if repository is None:
+            try:
+                repository = find_full_repository_name()
+            except ValueError as e:
+                raise ChecksClientError(str(e)) from e
+        self.repository = repository
+        self.token_pool = token_pool or TokenPool(app_id, private_key, secret_id)
+        self.installation_id = installation_id or os.environ.get(
+            "GITHUB_APP_INSTALLATION_ID"
+        )
+        # インストールIDを索引から読んだか(失効していれば索引から消して探し直す)
+        self._indexed = False
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.deadline = deadline
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+        self.session = session
+
+    @property
+    def app_id(self):
+        return self.token_pool.app_id
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the underlying connection pool"""
+        self.session.close()
+
+    def for_repository(self, repository, installation_id=None):
+        """
+        Get a client of another repository sharing the credentials and the connection pool
+        Args:
+            repository (str): "owner/repo"
+            installation_id (str): Installation ID (default: discovered from the repository)
+        Returns:
+            ChecksClient: Client (close this client, not the returned one)
+        """
+        client = ChecksClient(
+            repository,
+            pool_size=self.pool_size,
+            timeout=self.timeout,
+            session=self.session,
+            deadline=self.deadline,
+            token_pool=self.token_pool,
+        )
+        # GITHUB_APP_INSTALLATION_ID は自分のリポジトリのものなので使わない
+        client.installation_id = installation_id
+        return client
+
+    def _timeout(self, phase):
+        if self.deadline is None:
+            return self.timeout
+        return self.deadline.timeout(phase)
+
+    def _get_installation_id(self):
+        if self.installation_id is None:
+            self.installation_id = load_installation_id(self.repository)
+            self._indexed = self.installation_id is not None
+        if self.installation_id is None:
+            jwt_token = self.token_pool.create_jwt(self.deadline)
+            with _wrap_errors("discovering the installation"):
+                self.installation_id = discover_installation_id(
+                    jwt_token, self.repository, self._timeout("token"), self.session
+                )
+        return self.installation_id
+
+    def _request_access_token(self, installation_id):
+        jwt_token = self.token_pool.create_jwt(self.deadline)
+        with _wrap_errors("getting access token"):
+            return self.session.post(
+                f"{GITHUB_API_URL}/app/installations/{installation_id}/access_tokens",
+                headers={
+                    "Authorization": f"Bearer {jwt_token}",
+                    "Accept": "application/vnd.github+json",
+                },
+                timeout=self._timeout("token"),
+            )
+
+    def get_token(self):
+        """
+        Get an installation access token, refreshing it when it is about to expire
+        Returns:
+            str: Installation access token
+        """
+        with self.token_pool.lock:
+            installation_id = self._get_installation_id()
+            token = self.token_pool.get(installation_id)
+            if token is not None:
+                return token
+
+            response = self._request_access_token(installation_id)
+            if response.status_code != 201 and self._indexed:
+                # アプリを入れ直すとインストールIDが変わるため、索引から消して探し直す
+                logger.debug(
+                    f"Installation {installation_id} was rejected: "
+                    f"{response.status_code}"
+                )
+                save_installation_id(self.repository, None)
+                self.installation_id = None
+                installation_id = self._get_installation_id()
+                response = self._request_access_token(installation_id)
+            if response.status_code != 201:
+                raise ChecksClientError(
+                    f"Error getting access token: {response.status_code}",
+                    status_code=response.status_code,
+                )
+            with _wrap_errors("getting access token"):
+                body = response.json()
+                token = body["token"]
+                self.token_pool.put(installation_id, token, body["expires_at"])
+            logger.debug("Refreshed installation access token.")
+            return token
+
+    def _request(self, method, path, payload=None, data=None):
+        url = f"{GITHUB_API_URL}/repos/{self.repository}/{path}"
+        for attempt in range(2):
+            token = self.get_token()
+            with _wrap_errors(f"calling {method} {path}"):
+                response = self.session.request(
+                    method,
+                    url,
+                    headers={
+                        "Authorization": f"Bearer {token}",
+                        "Accept": "application/vnd.github+json",
+                        "Content-Type": "application/json",
+                    },
+                    data=data if payload is None else iter_payload_chunks(payload),
+                    timeout=self._timeout("check_run"),
+                )
+            # トークンが失効していた場合は一度だけ更新して再送する
+            if response.status_code == 401 and attempt == 0:
+                self.token_pool.reject(self.installation_id)
+                continue
+            break
+
+        if response.status_code not in (200, 201):
+            logger.debug(response.text)
+            raise ChecksClientError(
+                f"Error calling {method} {path}: {response.status_code}",
+                status_code=response.status_code,
+            )
+        with _wrap_errors(f"calling {method} {path}"):
+            return response.json()
+
+    @staticmethod
+    def _validate(payload, update=False):
+        errors = validate_check_run_payload(payload, update=update)
+        if errors:
+            raise ChecksClientError(
+                f"Invalid check-run payload: {'; '.join(errors)}", errors=errors
+            )
+
+    def create(
+        self,
+        name,
+        head_sha=None,
+        status=None,
+        conclusion=None,
+        title=None,
+        summary=None,
+        text=None,
+        annotations=None,
+    ):
+        """
+        Create a check run
+        Args:
+            name (str): Name of the check
+            head_sha (str): Commit SHA (default: CODEBUILD_RESOLVED_SOURCE_VERSION)
+            status, conclusion, title, summary, text, annotations: Optional fields
+        Returns:
+            dict: Created check run
+        """
+        # 51件目以降のアノテーションは作成後に分割して追加する
+        annotations = list(annotations) if annotations is not None else None
+        rest = None
+        if annotations and len(annotations) > MAX_ANNOTATIONS_PER_REQUEST:
+            rest = annotations[MAX_ANNOTATIONS_PER_REQUEST:]
+            annotations = annotations[:MAX_ANNOTATIONS_PER_REQUEST]
+
+        try:
+            payload = build_check_run_payload(
+                name,
+                status=status,
+                conclusion=conclusion,
+                title=title,
+                summary=summary,
+                text=text,
+                annotations=annotations,
+                head_sha=head_sha,
+            )
+        except KeyError as e:
+            raise ChecksClientError(
+                f"Required environment variable not found: {e}"
+            ) from e
+        self._validate(payload)
+        check_run = self._request("POST", "check-runs", payload)
+        if rest:
+            self.add_annotations(check_run["id"], rest, title, summary)
+        return check_run
+
+    def create_serialized(self, body):
+        """
+        Create a check run from an already serialized (and validated) payload
+        Args:
+            body (bytes): JSON payload
+        Returns:
+            dict: Created check run
+        """
+        return self._request("POST", "check-runs", data=body)
+
+    def update_serialized(self, check_run_id, body):
+        """
+        Update a check run with an already serialized (and validated) payload
+        Args:
+            check_run_id (int): ID of the check run
+            body (bytes): JSON payload
+        Returns:
+            dict: Updated check run
+        """
+        return self._request("PATCH", f"check-runs/{check_run_id}", data=body)
+
+    def update(self, check_run_id, **fields):
+        """
+        Update a check run
+        Args:
+            check_run_id (int): ID of the check run
+            fields: name, status, conclusion, title, summary, text, annotations
+        Returns:
+            dict: Updated check run
+        """
+        payload = {}
+        for key in ("name", "status", "conclusion"):
+            if fields.get(key) is not None:
+                payload[key] = fields[key]
+        output = {}
+        for key in ("title", "summary", "text", "annotations"):
+            if fields.get(key) is not None:
+                output[key] = fields[key]
+        if output:
+            payload["output"] = output
+        self._validate(payload, update=True)
+        return self._request("PATCH", f"check-runs/{check_run_id}", payload)
+
+    def add_annotations(self, check_run_id, annotations, title, summary):
+        """
+        Append annotations to a check run in batches of 50
+        Args:
+            check_run_id (int): ID of the check run
+            annotations (iterable): Annotation objects
+            title (str): Output title (required by the API on every update)
+            summary (str): Output summary (required by the API on every update)
+        Returns:
+            int: Number of annotations sent
+        """
+        sent = 0
+        batch = []
+        for annotation in annotations:
+            batch.append(annotation)
+            if len(batch) == MAX_ANNOTATIONS_PER_REQUEST:
+                self.update(
+                    check_run_id, title=title, summary=summary, annotations=batch
+                )
+                sent += len(batch)
+                batch = []
+        if batch:
+            self.update(check_run_id, title=title, summary=summary, annotations=batch)
+            sent += len(batch)
+        return sent
+
+    def complete(self, check_run_id, conclusion, title=None, summary=None, text=None):
+        """
+        Complete a check run
+        Args:
+            check_run_id (int): ID of the check run
+            conclusion (str): Final conclusion of the check
+            title, summary, text: Optional output fields
+        Returns:
+            dict: Updated check run
+        """
+        return self.update(
+            check_run_id,
+            status="completed",
+            conclusion=conclusion,
+            title=title,
+            summary=summary,
+            text=text,
+        )
+
+
+class AsyncChecksClient:
+    """asyncio variant of ChecksClient
+
+    Requests are run on worker threads sharing one ChecksClient, so its
+    token cache and connection pool are shared across concurrent calls.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._client = ChecksClient(*args, **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @property
+    def repository(self):
+        return self._client.repository
+
+    async def close(self):
+        """Close the underlying connection pool"""
+        self._client.close()
+
+    async def get_token(self):
+        return await asyncio.to_thread(self._client.get_token)
+
+    async def create(self, name, **fields):
+        return await asyncio.to_thread(self._client.create, name, **fields)
+
+    async def update(self, check_run_id, **fields):
+        return await asyncio.to_thread(self._client.update, check_run_id, **fields)
+
+    async def add_annotations(self, check_run_id, annotations, title, summary):
+        return await asyncio.to_thread(
+            self._client.add_annotations, check_run_id, annotations, title, summary
+        )
+
+    async def complete(
+        self, check_run_id, conclusion, title=None, summary=None, text=None
+    ):
+        return await asyncio.to_thread(
+            self._client.complete, check_run_id, conclusion, title, summary, text
+        )
@@ -0,0 +1,124 @@
+"""deadline.py: Deadline-budgeted timeouts for prcb-checks."""
+
+# --deadline で指定した全体の持ち時間を、秘密鍵の取得・トークンの取得・チェックランの送信の
+# 各フェーズに配分する。各フェーズは最初のリクエストから数えて持ち時間のうち自分の割合までしか
+# 使えず、残り時間を超えることもない。タイムアウトはリクエストごとにその時点の残りから求め、
+# 接続と読み込みの合計が残りを超えないように配分する。
+
+import re
+import time
+
+from botocore.config import Config
+
+DEFAULT_CONNECT_TIMEOUT = 60.0
+DEFAULT_READ_TIMEOUT = 60.0
+
+# フェーズごとに使える全体の持ち時間の割合
+PHASE_SHARES = {
+    "secret": 0.3,
+    "token": 0.3,
+    "check_run": 1.0,
+}
+
+_DURATION_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(ms|s|m)?\s*$")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, None: 1.0}
+
+
+class DeadlineExceeded(Exception):
+    """Error raised when the budget of a phase has run out"""
+
+
+def parse_duration(value):
+    """
+    Parse a duration such as "10s", "500ms", "2m" or "10" (seconds)
+    Args:
+        value (str): Duration
+    Returns:
+        float: Seconds
+    """
+    match = _DURATION_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"Invalid duration: {value!r}")
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+class Deadline:
+    """Overall deadline split into per-phase timeouts"""
+
+    def __init__(
+        self,
+        total=None,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+    ):
+        """
+        Args:
+            total (float): Overall budget in seconds (None: no deadline)
+            connect_timeout (float): Connect timeout of each request in seconds
+            read_timeout (float): Read timeout of each request in seconds
+        """
+        self.total = total
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.started_at = time.monotonic()
+        # フェーズ -> 最初のリクエストの時刻
+        self._phase_started_at = {}
+
+    def remaining(self):
+        """Seconds left until the deadline (None: no deadline)"""
+        if self.total is None:
+            return None
+        return self.total - (time.monotonic() - self.started_at)
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def budget(self, phase):
+        """
+        Seconds the phase may still use
+        Args:
+            phase (str): One of PHASE_SHARES
+        Returns:
+            float: Budget (None: no deadline)
+        """
+        if self.total is None:
+            return None
+        now = time.monotonic()
+        started_at = self._phase_started_at.setdefault(phase, now)
+        phase_budget = self.total * PHASE_SHARES[phase] - (now - started_at)
+        return min(self.remaining(), phase_budget)
+
+    def timeout(self, phase):
+        """
+        Get the (connect, read) timeout of the next request in the phase
+        Args:
+            phase (str): One of PHASE_SHARES
+        Returns:
+            tuple: Timeout for requests
+        """
+        budget = self.budget(phase)
+        if budget is None:
+            return (self.connect_timeout, self.read_timeout)
+        if budget <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded before {phase}")
+        # 接続と読み込みで合わせて持ち時間を超えないよう、設定値の比で分ける
+        scale = min(1.0, budget / (self.connect_timeout + self.read_timeout))
+        return (self.connect_timeout * scale, self.read_timeout * scale)
+
+    def boto_config(self, phase):
+        """
+        Get the botocore configuration of a request in the phase
+        Args:
+            phase (str): One of PHASE_SHARES
+        Returns:
+            botocore.config.Config: Configuration
+        """
+        connect_timeout, read_timeout = self.timeout(phase)
+        # 期限がある場合、SDKの再試行で持ち時間を超えないようにする
+        retries = {"total_max_attempts": 1} if self.total is not None else None
+        return Config(
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            retries=retries,
+        )
@@ -0,0 +1,155 @@
+"""delta.py: Upload only the annotations not yet delivered to a check run."""
+
+# 成長し続けるアノテーションファイルで繰り返し呼び出される場合に、送信済みのアノテーションを
+# チェック名+SHAごとのローカルインデックスに記録し、差分だけを既存のチェックランに追加する。
+# インデックスはバイナリファイルで、先頭8バイトがチェックランID、以降は8バイトのフィンガープリントの列。
+
+import hashlib
+import os
+import sys
+
+from prcb_checks.cache import get_cache_dir
+from prcb_checks.client import ChecksClient, ChecksClientError, ChecksClientTimeout
+from prcb_checks.logger import logger
+from prcb_checks.validator import MAX_ANNOTATIONS_PER_REQUEST
+
+FINGERPRINT_SIZE = 8
+FINGERPRINT_FIELDS = ("path", "start_line", "end_line", "annotation_level", "message")
+
+
+def fingerprint(annotation):
+    """
+    Get the fingerprint of an annotation
+    Args:
+        annotation (dict): Annotation object
+    Returns:
+        bytes: 8-byte hash of path, lines, level and message
+    """
+    key = "\0".join(str(annotation.get(field)) for field in FINGERPRINT_FIELDS)
+    return hashlib.blake2b(key.encode(), digest_size=FINGERPRINT_SIZE).digest()
+
+
+class DeliveryIndex:
+    """Fingerprints of the annotations already delivered to a check run"""
+
+    def __init__(self, path):
+        self.path = path
+        self.check_run_id = None
+        self.fingerprints = set()
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return
+        self.check_run_id = int.from_bytes(data[:FINGERPRINT_SIZE], "big")
+        self.fingerprints = {
+            data[i : i + FINGERPRINT_SIZE]
+            for i in range(FINGERPRINT_SIZE, len(data), FINGERPRINT_SIZE)
+        }
+
+    @classmethod
+    def load(cls, name, head_sha):
+        """
+        Load the index of a check
+        Args:
+            name (str): Name of the check
+            head_sha (str): Commit SHA
+        Returns:
+            DeliveryIndex: Index (empty if the check has not been created yet)
+        """
+        name_hash = hashlib.sha256(name.encode()).hexdigest()[:16]
+        return cls(os.path.join(get_cache_dir("delta"), f"{name_hash}-{head_sha}.idx"))
+
+    def select_new(self, annotations):
+        """
+        Select the annotations that have not been delivered
+        Args:
+            annotations (iterable): Annotation objects
+        Returns:
+            list: (fingerprint, annotation) pairs, without duplicates
+        """
+        selected = []
+        seen = set()
+        for annotation in annotations:
+            fp = fingerprint(annotation)
+            if fp not in self.fingerprints and fp not in seen:
+                seen.add(fp)
+                selected.append((fp, annotation))
+        return selected
+
+    def set_check_run_id(self, check_run_id):
+        """Start a new index for a created check run"""
+        self.check_run_id = check_run_id
+        self.fingerprints = set()
+        with open(self.path, "wb") as file:
+            file.write(check_run_id.to_bytes(FINGERPRINT_SIZE, "big"))
+
+    def record(self, fingerprints):
+        """Append delivered fingerprints to the index"""
+        self.fingerprints.update(fingerprints)
+        with open(self.path, "ab") as file:
+            file.write(b"".join(fingerprints))
+
+
+def post_delta(client, check_run_payload, index):
+    """
+    Create or update the check run, sending only new annotations
+    Args:
+        client (ChecksClient): Checks API client
+        check_run_payload (dict): Validated check-run payload
+        index (DeliveryIndex): Index of the check
+    Returns:
+        int: Number of annotations sent
+    """
+    output = check_run_payload.get("output", {})
+    fresh = index.select_new(output.get("annotations") or [])
+    batches = [
+        fresh[i : i + MAX_ANNOTATIONS_PER_REQUEST]
+        for i in range(0, len(fresh), MAX_ANNOTATIONS_PER_REQUEST)
+    ] or [[]]
+
+    fields = {key: check_run_payload.get(key) for key in ("status", "conclusion")}
+    for key in ("title", "summary", "text"):
+        fields[key] = output.get(key)
+    first = [annotation for _, annotation in batches[0]] or None
+
+    if index.check_run_id is None:
+        check_run = client.create(
+            check_run_payload["name"],
+            head_sha=check_run_payload["head_sha"],
+            annotations=first,
+            **fields,
+        )
+        index.set_check_run_id(check_run["id"])
+    else:
+        client.update(index.check_run_id, annotations=first, **fields)
+    index.record([fp for fp, _ in batches[0]])
+
+    for batch in batches[1:]:
+        client.add_annotations(
+            index.check_run_id,
+            [annotation for _, annotation in batch],
+            fields["title"],
+            fields["summary"],
+        )
+        index.record([fp for fp, _ in batch])
+
+    logger.info(
+        f"Sent {len(fresh)} new annotations "
+        f"({len(index.fingerprints)} delivered to check run {index.check_run_id})"
+    )
+    return len(fresh)
+
+
+def delta_main(check_run_payload, deadline=None):
+    """Send a validated payload in delta mode (--delta)"""
+    index = DeliveryIndex.load(check_run_payload["name"], check_run_payload["head_sha"])
+    try:
+        with ChecksClient(deadline=deadline) as client:
+            post_delta(client, check_run_payload, index)
+    except ChecksClientTimeout:
+        # --on-deadline で扱う
+        raise
+    except ChecksClientError as e:
+        logger.error(f"Error sending check-run delta: {e}")
+        sys.exit(1)
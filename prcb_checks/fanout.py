@@ -0,0 +1,151 @@
+"""fanout.py: Post the same check run to several commits concurrently."""
+
+# マージキューやスタックされたPRでは、1回のビルドで複数のhead SHAを検証する。
+# ペイロードはhead_shaの部分を除いて一度だけシリアライズし、SHAごとに差し込んで
+# 共有のコネクションプールから並行に送信する。
+
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from prcb_checks.client import ChecksClient, ChecksClientError, ChecksClientTimeout
+from prcb_checks.logger import logger
+from prcb_checks.main import read_file_content, serialize_payload
+
+FILE_PREFIX = "file://"
+_HEAD_SHA_PLACEHOLDER = "__prcb_checks_head_sha__"
+
+
+class FanOutTimeout(ChecksClientTimeout):
+    """
+    Some SHAs of a fan-out timed out; head_shas holds only those SHAs,
+    and failed the number of SHAs that failed for another reason
+    """
+
+    def __init__(self, message, head_shas, failed=0):
+        super().__init__(message)
+        self.head_shas = head_shas
+        self.failed = failed
+
+
+def parse_head_shas(value):
+    """
+    Parse the --head-sha option
+    Args:
+        value (str): Comma separated SHAs, or file:// followed by a file with one SHA per line
+    Returns:
+        list: SHAs without duplicates, in the given order
+    """
+    if value.startswith(FILE_PREFIX):
+        # fmt: off
+        value = read_file_content(value[len(FILE_PREFIX):])
+        # fmt: on
+    head_shas = []
+    for sha in value.replace(",", "\n").split():
+        if sha not in head_shas:
+            head_shas.append(sha)
+    return head_shas
+
+
+def serialize_head_sha_template(check_run_payload):
+    """
+    Serialize the payload once, leaving out head_sha
+    Args:
+        check_run_payload (dict): Validated check-run payload
+    Returns:
+        tuple: (prefix, suffix) bytes to put a JSON encoded SHA between
+    """
+    template = serialize_payload(
+        dict(check_run_payload, head_sha=_HEAD_SHA_PLACEHOLDER)
+    ).encode("utf-8")
+    prefix, _, suffix = template.partition(
+        json.dumps(_HEAD_SHA_PLACEHOLDER).encode("utf-8")
+    )
+    return prefix, suffix
+
+
+def fill_head_sha(prefix, suffix, sha):
+    """Build the request body for a SHA from serialize_head_sha_template()"""
+    return prefix + json.dumps(sha).encode("utf-8") + suffix
+
+
+def serialize_for_head_shas(check_run_payload, head_shas):
+    """
+    Serialize the payload once and build the request body for each SHA
+    Args:
+        check_run_payload (dict): Validated check-run payload
+        head_shas (list): Commit SHAs
+    Returns:
+        iterator: (sha, body) pairs
+    """
+    prefix, suffix = serialize_head_sha_template(check_run_payload)
+    for sha in head_shas:
+        yield sha, fill_head_sha(prefix, suffix, sha)
+
+
+def fan_out(client, check_run_payload, head_shas):
+    """
+    Create the same check run on every SHA concurrently
+    Args:
+        client (ChecksClient): Checks API client
+        check_run_payload (dict): Validated check-run payload
+        head_shas (list): Commit SHAs
+    Returns:
+        list: (sha, check run or ChecksClientError) pairs in the order of head_shas
+    """
+    # 通信エラーやタイムアウトもChecksClientErrorとして返るため、1つのSHAの失敗で他を止めない
+    # 並行リクエストの前にトークンを取得しておく
+    client.get_token()
+
+    def create(item):
+        sha, body = item
+        try:
+            return sha, client.create_serialized(body)
+        except ChecksClientError as e:
+            return sha, e
+
+    bodies = serialize_for_head_shas(check_run_payload, head_shas)
+    with ThreadPoolExecutor(max_workers=client.pool_size) as executor:
+        return list(executor.map(create, bodies))
+
+
+def fanout_main(check_run_payload, head_shas, deadline=None):
+    """
+    Post a validated payload to several SHAs (--head-sha)
+    Raises:
+        FanOutTimeout: Some SHAs timed out; only those are left to --on-deadline
+    """
+    try:
+        with ChecksClient(
+            pool_size=min(len(head_shas), 32), deadline=deadline
+        ) as client:
+            results = fan_out(client, check_run_payload, head_shas)
+    except ChecksClientTimeout:
+        # --on-deadline で扱う
+        raise
+    except ChecksClientError as e:
+        logger.error(f"Error creating check-runs: {e}")
+        sys.exit(1)
+
+    failed = 0
+    timed_out = []
+    for sha, result in results:
+        if isinstance(result, ChecksClientTimeout):
+            timed_out.append(sha)
+            logger.warning(f"{sha}: {result}")
+        elif isinstance(result, ChecksClientError):
+            failed += 1
+            logger.error(f"{sha}: {result}")
+        else:
+            logger.info(f"{sha}: created check run {result['id']}")
+    if failed:
+        logger.error(f"Error: {failed} of {len(results)} check-runs failed")
+    if timed_out:
+        # 作成済みのSHAに重複して送らないよう、時間切れになったSHAだけを --on-deadline に渡す
+        raise FanOutTimeout(
+            f"{len(timed_out)} of {len(results)} check-runs timed out",
+            timed_out,
+            failed,
+        )
+    if failed:
+        sys.exit(1)
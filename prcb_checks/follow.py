@@ -0,0 +1,313 @@
+"""follow.py: Post annotations from a growing JSON Lines file (--follow)."""
+
+# 長時間動く解析ツールが1行1アノテーションで追記していくファイルを追いかけ、
+# 追記された完全な行だけを解析して、50件たまるか一定時間が経つごとにチェックランに追加する。
+# 保持するのは未送信の50件と統計だけなので、ファイルが大きくなってもメモリは一定。
+# 終了マーカー行 {"eof": true} が書かれるか、--follow-pid のプロセスが終了したら完了する。
+#
+#   analyzer --output findings.jsonl &
+#   prcb-checks --follow file://findings.jsonl --follow-pid $! \
+#       "Analyzer" completed neutral "Analyzer" "Findings"
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import sys
+import time
+
+from prcb_checks.client import ChecksClient, ChecksClientError
+from prcb_checks.deadline import parse_duration
+from prcb_checks.logger import logger
+from prcb_checks.summary import AnnotationStats, render_summary
+from prcb_checks.validator import MAX_ANNOTATIONS_PER_REQUEST, validate_annotation
+
+FILE_PREFIX = "file://"
+END_MARKER = "eof"
+DEFAULT_FLUSH_INTERVAL = 5.0
+# ファイルの変化が無くても、この間隔でプロデューサーの生存と送信時刻を確認する
+WAIT_INTERVAL = 1.0
+READ_SIZE = 64 * 1024
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVE_SELF = 0x00000800
+IN_DELETE_SELF = 0x00000400
+
+
+class PollingWatcher:
+    """Wait for changes of a file by sleeping"""
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Wait for changes of a file with Linux inotify"""
+
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVE_SELF | IN_DELETE_SELF
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if readable:
+            # イベントの中身は使わず、読み捨てて次の通知に備える
+            try:
+                while os.read(self.fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(path):
+    """
+    Get a watcher of a file, using inotify where available
+    Args:
+        path (str): File to watch
+    Returns:
+        InotifyWatcher/PollingWatcher: Watcher
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError, TypeError) as e:
+            logger.debug(f"inotify is not available, polling instead: {e}")
+    return PollingWatcher()
+
+
+def producer_alive(pid):
+    """
+    Check whether the producer of the file is still running
+    Args:
+        pid (int): Process ID, or None if unknown
+    Returns:
+        bool: False once the process has exited
+    """
+    if pid is None:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # 回収されていない終了済みのプロセスも終了とみなす
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as file:
+            return file.read().rpartition(b")")[2].split()[0] != b"Z"
+    except (OSError, IndexError):
+        return True
+
+
+class JsonLinesTail:
+    """Reader of the lines appended to a file"""
+
+    def __init__(self, file):
+        self.file = file
+        self.partial = b""
+
+    def read_lines(self):
+        """
+        Read the complete lines appended since the last call
+        Returns:
+            iterator: Lines (bytes); an incomplete last line is kept for later
+        """
+        while True:
+            data = self.file.read(READ_SIZE)
+            if not data:
+                return
+            lines = (self.partial + data).split(b"\n")
+            self.partial = lines.pop()
+            yield from lines
+
+
+def parse_line(line, line_number):
+    """
+    Parse a line of the findings file
+    Args:
+        line (bytes): Line
+        line_number (int): Line number used in warnings
+    Returns:
+        dict: Annotation, END_MARKER, or None if the line is blank or invalid
+    """
+    if not line.strip():
+        return None
+    try:
+        annotation = json.loads(line)
+    except ValueError as e:
+        logger.warning(f"Skipped line {line_number}: invalid JSON: {e}")
+        return None
+    if isinstance(annotation, dict) and annotation.get(END_MARKER) is True:
+        return END_MARKER
+    errors = validate_annotation(annotation)
+    if errors:
+        logger.warning(f"Skipped line {line_number}: {'; '.join(errors)}")
+        return None
+    return annotation
+
+
+def open_when_created(path, pid):
+    """
+    Wait until the file is created
+    Args:
+        path (str): File to follow
+        pid (int): Producer process ID
+    Returns:
+        file: Opened file, or None if the producer exited without creating it
+    """
+    while True:
+        # 存在確認より前に生存を確認し、終了直前に作られたファイルも読む
+        alive = producer_alive(pid)
+        try:
+            return open(path, "rb")
+        except FileNotFoundError:
+            if not alive:
+                return None
+        time.sleep(WAIT_INTERVAL)
+
+
+def follow(
+    client,
+    check_run_payload,
+    path,
+    pid=None,
+    flush_interval=DEFAULT_FLUSH_INTERVAL,
+    auto_summary=False,
+):
+    """
+    Create a check run and add the annotations appended to a file until it ends
+    Args:
+        client (ChecksClient): Checks API client
+        check_run_payload (dict): Validated payload of the final state of the check
+        path (str): JSON Lines file with one annotation per line
+        pid (int): Producer process ID; following stops when it exits
+        flush_interval (float): Seconds an annotation may wait for its batch to fill
+        auto_summary (bool): Append statistics of the annotations to the summary
+    Returns:
+        int: Number of annotations sent
+    """
+    output = check_run_payload["output"]
+    title, summary = output["title"], output["summary"]
+    check_run = client.create(
+        check_run_payload["name"],
+        head_sha=check_run_payload["head_sha"],
+        status="in_progress",
+        title=title,
+        summary=summary,
+        text=output.get("text"),
+    )
+    logger.info(f"Following {path} into check run {check_run['id']}")
+
+    stats = AnnotationStats()
+    batch = []
+    pending_since = None
+
+    def flush():
+        client.update(
+            check_run["id"], title=title, summary=summary, annotations=list(batch)
+        )
+        logger.debug(f"Sent {len(batch)} annotations ({stats.total} in total)")
+        batch.clear()
+
+    file = open_when_created(path, pid)
+    if file is None:
+        logger.warning(f"{path} was not created before the producer exited")
+    else:
+        watcher = create_watcher(path)
+        tail = JsonLinesTail(file)
+        line_number = 0
+        ended = False
+        try:
+            while True:
+                # 読み込みより前に生存を確認し、終了直前の追記も取りこぼさない
+                alive = producer_alive(pid)
+                for line in tail.read_lines():
+                    line_number += 1
+                    annotation = parse_line(line, line_number)
+                    if annotation is END_MARKER:
+                        ended = True
+                        break
+                    if annotation is None:
+                        continue
+                    stats.update(annotation)
+                    batch.append(annotation)
+                    if len(batch) == 1:
+                        pending_since = time.monotonic()
+                    if len(batch) == MAX_ANNOTATIONS_PER_REQUEST:
+                        flush()
+                if ended or not alive:
+                    break
+
+                # 50件たまらなくても、一定時間待ったものは送信する
+                timeout = WAIT_INTERVAL
+                if batch:
+                    waited = time.monotonic() - pending_since
+                    if waited >= flush_interval:
+                        flush()
+                    else:
+                        timeout = min(timeout, flush_interval - waited)
+                watcher.wait(timeout)
+        finally:
+            watcher.close()
+            file.close()
+        if not ended and tail.partial.strip():
+            logger.warning(f"Skipped an incomplete last line of {path}")
+
+    if auto_summary:
+        summary = summary + "\n\n" + render_summary(stats)
+    # 残りのアノテーションは最終状態の更新で一緒に送る
+    client.update(
+        check_run["id"],
+        status=check_run_payload.get("status"),
+        conclusion=check_run_payload.get("conclusion"),
+        title=title,
+        summary=summary,
+        annotations=batch or None,
+    )
+    logger.info(f"Sent {stats.total} annotations to check run {check_run['id']}")
+    return stats.total
+
+
+def follow_main(check_run_payload, options, deadline):
+    """Follow a findings file (--follow)"""
+    path = options.follow
+    if path.startswith(FILE_PREFIX):
+        # fmt: off
+        path = path[len(FILE_PREFIX):]
+        # fmt: on
+    try:
+        flush_interval = parse_duration(options.flush_interval)
+    except ValueError as e:
+        logger.error(f"Error: {e}")
+        sys.exit(1)
+    # ファイルを追いかける時間は読めないため、全体の期限は適用しない
+    timeout = (deadline.connect_timeout, deadline.read_timeout)
+    try:
+        with ChecksClient(timeout=timeout) as client:
+            follow(
+                client,
+                check_run_payload,
+                path,
+                pid=options.follow_pid,
+                flush_interval=flush_interval,
+                auto_summary=options.auto_summary,
+            )
+    except ChecksClientError as e:
+        logger.error(f"Error following {path}: {e}")
+        sys.exit(1)
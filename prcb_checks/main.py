@@ -15,6 +15,8 @@
 # text        : The details of the check run. This parameter supports Markdown.
 # annotations : JSON array of annotation objects. If starts with file://, read from file.
 
+import importlib
+import io
 import json
 import optparse
 import os
@@ -23,14 +25,36 @@ import sys
 
 import requests
 import boto3
-from botocore.exceptions import ClientError
+from botocore.exceptions import ClientError, ConnectTimeoutError, ReadTimeoutError
 import jwt
 
+from prcb_checks.annotations import AnnotationStore, json_default, parse_annotations
+from prcb_checks.cache import (
+    load_access_token,
+    load_installation_id,
+    save_access_token,
+    save_installation_id,
+)
+from prcb_checks.deadline import Deadline, DeadlineExceeded, parse_duration
 from prcb_checks.logger import logger, set_debug_mode
+from prcb_checks.summary import summarize_annotations
+from prcb_checks.validator import (
+    MAX_ANNOTATIONS_PER_REQUEST,
+    validate_check_run_payload,
+)
 
+# ストリーミング送信するリクエストボディのチャンクサイズ（バイト）
+STREAM_CHUNK_SIZE = 64 * 1024
 
-def get_full_repository_name():
-    """Get GitHub repository info from environment variable"""
+
+def find_full_repository_name():
+    """
+    Get GitHub repository info from environment variable
+    Returns:
+        str: "owner/repo"
+    Raises:
+        ValueError: The environment does not tell the repository
+    """
     try:
         # リポジトリの情報
         codebuild_initiator = os.environ["CODEBUILD_INITIATOR"]
@@ -44,32 +68,38 @@ def get_full_repository_name():
             )
             return full_repository_name
         else:
-            logger.error(
-                f"Error: Unsupported CODEBUILD_INITIATOR: {codebuild_initiator}"
-            )
-            sys.exit(1)
+            raise ValueError(f"Unsupported CODEBUILD_INITIATOR: {codebuild_initiator}")
     except KeyError as e:
-        logger.error(f"Error: Required environment variable not found: {e}")
+        raise ValueError(f"Required environment variable not found: {e}") from e
+
+
+def get_full_repository_name():
+    """Get GitHub repository info from environment variable, exiting if unknown"""
+    try:
+        return find_full_repository_name()
+    except ValueError as e:
+        logger.error(f"Error: {e}")
         sys.exit(1)
 
 
-def get_secrets_manager_client():
+def get_secrets_manager_client(deadline=None):
     """Get AWS Secrets Manager client"""
     try:
         session = boto3.session.Session()
         return session.client(
             service_name="secretsmanager",
             region_name=os.environ["AWS_REGION"],
+            config=deadline.boto_config("secret") if deadline else None,
         )
     except KeyError as e:
         logger.error(f"Error: Required environment variable not found: {e}")
         sys.exit(1)
 
 
-def get_secret_value(secret_id):
+def get_secret_value(secret_id, deadline=None):
     """Get secret value from AWS Secrets Manager"""
     try:
-        client = get_secrets_manager_client()
+        client = get_secrets_manager_client(deadline)
         response = client.get_secret_value(SecretId=secret_id)
         return response["SecretBinary"]
     except ClientError as e:
@@ -77,32 +107,269 @@ def get_secret_value(secret_id):
         raise e
 
 
-def get_access_token(private_key):
+def create_app_jwt(github_app_id, private_key):
+    """Create a JWT signed with the GitHub App private key"""
+    now = int(time.time())
+    payload = {
+        "iat": now - 60,
+        "exp": now + (10 * 60),  # 有効期間10分
+        "iss": github_app_id,
+    }
+    return jwt.encode(payload, private_key.decode(), algorithm="RS256")
+
+
+def discover_installation_id(jwt_token, repository, timeout=60.0, session=requests):
+    """
+    Ask GitHub for the installation of the GitHub App on a repository and record it in the index
+    Args:
+        jwt_token (str): JWT of the GitHub App
+        repository (str): "owner/repo"
+        timeout (float): Timeout of the request in seconds
+        session (requests.Session): Session to send the request with (default: requests)
+    Returns:
+        str: Installation ID
+    Raises:
+        requests.HTTPError: The GitHub App is not installed on the repository
+    """
+    response = session.get(
+        f"https://api.github.com/repos/{repository}/installation",
+        headers={
+            "Authorization": f"Bearer {jwt_token}",
+            "Accept": "application/vnd.github+json",
+        },
+        timeout=timeout,
+    )
+    if response.status_code != 200:
+        raise requests.HTTPError(
+            f"GitHub App is not installed on {repository}: {response.status_code}",
+            response=response,
+        )
+    installation_id = str(response.json()["id"])
+    save_installation_id(repository, installation_id)
+    logger.debug(f"Discovered installation {installation_id} for {repository}.")
+    return installation_id
+
+
+def phase_timeout(deadline, phase):
+    """
+    Get the timeout of the next request in a phase
+    Args:
+        deadline (Deadline): Deadline of the command (None: 60 seconds)
+        phase (str): One of deadline.PHASE_SHARES
+    Returns:
+        float/tuple: Timeout for requests
+    """
+    # 同じフェーズで続けて送る場合も持ち時間を超えないよう、リクエストごとに求める
+    return deadline.timeout(phase) if deadline else 60.0
+
+
+def request_access_token(jwt_token, installation_id, deadline=None):
+    """Exchange the JWT for an installation access token"""
+    token_url = (
+        f"https://api.github.com/app/installations/{installation_id}/access_tokens"
+    )
+    headers = {
+        "Authorization": f"Bearer {jwt_token}",
+        "Accept": "application/vnd.github+json",
+    }
+    return requests.post(
+        token_url, headers=headers, timeout=phase_timeout(deadline, "token")
+    )
+
+
+def get_access_token(private_key, deadline=None):
     """Get JWT access token from GitHub API request"""
     try:
         # GitHub Appの情報
         github_app_id = os.environ["GITHUB_APP_ID"]
-        github_app_installation_id = os.environ["GITHUB_APP_INSTALLATION_ID"]
-
-        now = int(time.time())
-        payload = {
-            "iat": now - 60,
-            "exp": now + (10 * 60),  # 有効期間10分
-            "iss": github_app_id,
-        }
-        jwt_token = jwt.encode(payload, private_key.decode(), algorithm="RS256")
 
+        jwt_token = create_app_jwt(github_app_id, private_key)
         # インストールアクセストークンの取得
-        token_url = f"https://api.github.com/app/installations/{github_app_installation_id}/access_tokens"
-        headers = {
-            "Authorization": f"Bearer {jwt_token}",
-            "Accept": "application/vnd.github+json",
-        }
-        response = requests.post(token_url, headers=headers, timeout=60.0)
-        return response.json()["token"]
+        github_app_installation_id = os.environ.get("GITHUB_APP_INSTALLATION_ID")
+        response = None
+        if github_app_installation_id:
+            response = request_access_token(
+                jwt_token, github_app_installation_id, deadline
+            )
+        else:
+            # インストールIDが指定されていなければ、索引かリポジトリから探す
+            repository = get_full_repository_name()
+            github_app_installation_id = load_installation_id(repository)
+            if github_app_installation_id is not None:
+                response = request_access_token(
+                    jwt_token, github_app_installation_id, deadline
+                )
+                if response.status_code != 201:
+                    # アプリを入れ直すとインストールIDが変わるため、索引から消して探し直す
+                    logger.debug(
+                        f"Installation {github_app_installation_id} was rejected: "
+                        f"{response.status_code}"
+                    )
+                    save_installation_id(repository, None)
+            if response is None or response.status_code != 201:
+                github_app_installation_id = discover_installation_id(
+                    jwt_token, repository, phase_timeout(deadline, "token")
+                )
+                response = request_access_token(
+                    jwt_token, github_app_installation_id, deadline
+                )
+        if response.status_code != 201:
+            logger.error(
+                f"Error: Could not get an access token: {response.status_code}"
+            )
+            sys.exit(1)
+        body = response.json()
+        if "expires_at" in body:
+            save_access_token(
+                github_app_installation_id, body["token"], body["expires_at"]
+            )
+        return body["token"]
     except KeyError as e:
         logger.error(f"Error: Required environment variable not found: {e}")
         sys.exit(1)
+    except requests.HTTPError as e:
+        logger.error(f"Error: {e}")
+        sys.exit(1)
+
+
+def get_installation_token(deadline=None):
+    """
+    Get an installation access token, reusing a cached one if still valid
+    Args:
+        deadline (Deadline): Deadline of the secret fetch and the token exchange
+    Returns:
+        str: Installation access token
+    """
+    installation_id = os.environ.get(
+        "GITHUB_APP_INSTALLATION_ID"
+    ) or load_installation_id(get_full_repository_name())
+    cached = load_access_token(installation_id) if installation_id else None
+    if cached is not None:
+        logger.debug("Using cached installation access token.")
+        return cached[0]
+    try:
+        secret_id = os.environ["SECRETS_MANAGER_SECRETID"]
+    except KeyError as e:
+        logger.error(f"Error: Required environment variable not found: {e}")
+        sys.exit(1)
+    return get_access_token(get_secret_value(secret_id, deadline), deadline)
+
+
+def build_check_run_payload(
+    name,
+    status=None,
+    conclusion=None,
+    title=None,
+    summary=None,
+    text=None,
+    annotations=None,
+    head_sha=None,
+):
+    """
+    Build the check-run payload from the given fields
+    Args:
+        name (str): Name of the check
+        status, conclusion, title, summary, text, annotations: Optional fields
+        head_sha (str): Commit SHA (default: CODEBUILD_RESOLVED_SOURCE_VERSION)
+    Returns:
+        dict: Payload for the Check Runs API
+    """
+    check_run_payload = {
+        "name": name,
+        "head_sha": head_sha or os.environ["CODEBUILD_RESOLVED_SOURCE_VERSION"],
+    }
+    if status is not None:
+        check_run_payload["status"] = status
+    if conclusion is not None:
+        check_run_payload["conclusion"] = conclusion
+
+    # titleが無くてもsummary等は落とさずに残し、検証でエラーとして報告する
+    output = {}
+    for key, value in (
+        ("title", title),
+        ("summary", summary),
+        ("text", text),
+        ("annotations", annotations),
+    ):
+        if value is not None:
+            output[key] = value
+    if output:
+        check_run_payload["output"] = output
+    return check_run_payload
+
+
+def ensure_valid_payload(check_run_payload, **kwargs):
+    """
+    Validate the payload locally and exit if there are any violations
+    Args:
+        check_run_payload (dict): Payload for the Check Runs API
+        kwargs: Passed to validate_check_run_payload()
+    """
+    errors = validate_check_run_payload(check_run_payload, **kwargs)
+    if errors:
+        for error in errors:
+            logger.error(f"Invalid check-run payload: {error}")
+        sys.exit(1)
+
+
+def serialize_payload(check_run_payload):
+    """
+    Serialize the payload into the JSON document sent to the API
+    Args:
+        check_run_payload (dict): Payload for the Check Runs API
+    Returns:
+        str: Serialized JSON
+    """
+    return json.dumps(check_run_payload, allow_nan=False, default=json_default)
+
+
+def iter_payload_chunks(check_run_payload, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Serialize the payload incrementally, without building the whole document
+    Args:
+        check_run_payload (dict): Payload for the Check Runs API
+        chunk_size (int): Approximate size of each chunk in bytes
+    Returns:
+        iterator: UTF-8 chunks of the same JSON as serialize_payload()
+    """
+    # 全体を1つの文字列・バイト列にせず、バッファ単位でコネクションに書き込む
+    encoder = json.JSONEncoder(allow_nan=False, default=json_default)
+    buffer = []
+    size = 0
+    for piece in encoder.iterencode(check_run_payload):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(buffer).encode("utf-8")
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def post_check_run(access_token, check_run_payload, deadline=None):
+    """Check Runsを作成するリクエストを送信する (作成できた場合はTrueを返す)"""
+    full_repository_name = get_full_repository_name()
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Accept": "application/vnd.github+json",
+        "Content-Type": "application/json",
+    }
+
+    response = requests.post(
+        f"https://api.github.com/repos/{full_repository_name}/check-runs",
+        headers=headers,
+        data=iter_payload_chunks(check_run_payload),
+        timeout=phase_timeout(deadline, "check_run"),
+    )
+
+    if response.status_code == 201:
+        logger.debug("Succeeded create check-runs.")
+        logger.debug(response.json())
+        return True
+    logger.error(f"Error creating check-runs: {response.status_code}")
+    logger.debug(response.json())
+    return False
 
 
 def create_check_runs(
@@ -117,51 +384,110 @@ def create_check_runs(
 ):
     """Check Runsを作成する"""
     try:
-        full_repository_name = get_full_repository_name()
-        check_run_payload = {
-            "name": name,
-            "head_sha": os.environ["CODEBUILD_RESOLVED_SOURCE_VERSION"],
-        }
-        if status is not None:
-            check_run_payload["status"] = status
-        if conclusion is not None:
-            check_run_payload["conclusion"] = conclusion
-        if title is not None:
-            check_run_payload["output"] = {"title": title}
-        if summary is not None:
-            if "output" in check_run_payload:
-                check_run_payload["output"]["summary"] = summary
-        if text is not None:
-            if "output" in check_run_payload:
-                check_run_payload["output"]["text"] = text
-        if annotations is not None:
-            if "output" in check_run_payload:
-                check_run_payload["output"]["annotations"] = annotations
-
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Accept": "application/vnd.github+json",
-            "Content-Type": "application/json",
-        }
-
-        response = requests.post(
-            f"https://api.github.com/repos/{full_repository_name}/check-runs",
-            headers=headers,
-            json=check_run_payload,
-            timeout=60.0,
+        check_run_payload = build_check_run_payload(
+            name,
+            status=status,
+            conclusion=conclusion,
+            title=title,
+            summary=summary,
+            text=text,
+            annotations=annotations,
         )
-
-        if response.status_code == 201:
-            logger.debug("Succeeded create check-runs.")
-            logger.debug(response.json())
-        else:
-            logger.error(f"Error creating check-runs: {response.status_code}")
-            logger.debug(response.json())
+        ensure_valid_payload(check_run_payload)
+        post_check_run(access_token, check_run_payload)
     except KeyError as e:
         logger.error(f"Error: Required environment variable not found: {e}")
         sys.exit(1)
 
 
+def send_check_run(check_run_payload, head_shas=None, delta=False, deadline=None):
+    """
+    Send a validated payload
+    Args:
+        check_run_payload (dict): Validated check-run payload
+        head_shas (list): Commit SHAs to fan out to (--head-sha)
+        delta (bool): Send only new annotations (--delta)
+        deadline (Deadline): Deadline of the whole sending
+    Returns:
+        bool: False if GitHub did not create the check run
+    """
+    # 差分・fan-outは失敗するとそれぞれ終了する
+    if delta:
+        from prcb_checks.delta import delta_main
+
+        delta_main(check_run_payload, deadline)
+        return True
+    if head_shas and len(head_shas) > 1:
+        from prcb_checks.fanout import fanout_main
+
+        fanout_main(check_run_payload, head_shas, deadline)
+        return True
+    access_token = get_installation_token(deadline)
+    return post_check_run(access_token, check_run_payload, deadline)
+
+
+def narrow_to_timed_out(record, error):
+    """
+    Narrow a record of send_check_run() down to the SHAs that timed out
+    Args:
+        record (dict): payload, head_shas and delta of send_check_run()
+        error (Exception): Timeout error
+    Returns:
+        dict: Record to spool
+    """
+    # fan-outで一部のSHAだけが時間切れになった場合、作成済みのSHAには再送しない
+    timed_out = getattr(error, "head_shas", None)
+    if not timed_out:
+        return record
+    return dict(
+        record,
+        payload=dict(record["payload"], head_sha=timed_out[0]),
+        head_shas=timed_out,
+    )
+
+
+def create_deadline(options):
+    """
+    Create the deadline from the command line options
+    Args:
+        options: Parsed options
+    Returns:
+        Deadline: Deadline
+    """
+    try:
+        total = parse_duration(options.deadline) if options.deadline else None
+        connect_timeout = parse_duration(options.connect_timeout)
+        read_timeout = parse_duration(options.read_timeout)
+    except ValueError as e:
+        logger.error(f"Error: {e}")
+        sys.exit(1)
+    return Deadline(total, connect_timeout, read_timeout)
+
+
+def handle_deadline_exceeded(policy, error, record):
+    """
+    Apply the --on-deadline policy
+    Args:
+        policy (str): fail, skip or spool
+        error (Exception): Timeout error
+        record (dict): Arguments of send_check_run() to spool
+    """
+    if policy == "skip":
+        logger.warning(f"Deadline exceeded, skipped reporting the check: {error}")
+        return
+    if policy == "spool":
+        from prcb_checks.spool import spool_check_run
+
+        spool_check_run(record)
+        logger.warning(
+            f"Deadline exceeded, spooled the check: {error} "
+            "(send it later with `prcb-checks flush`)"
+        )
+        return
+    logger.error(f"Error: Deadline exceeded: {error}")
+    sys.exit(1)
+
+
 def read_file_content(file_path):
     """
     Read file content from a file path
@@ -178,20 +504,40 @@ def read_file_content(file_path):
         sys.exit(1)
 
 
-def parse_json_file(file_path):
+def parse_annotations_file(file_path):
     """
-    Parse JSON content from a file
+    Parse a JSON array of annotations from a file without loading it as a whole
     Args:
         file_path (str): Path of the JSON file to read
     Returns:
-        dict/list: Parsed JSON content
+        AnnotationStore: Validated annotations (the parsed content if not an array)
     """
     try:
-        content = read_file_content(file_path)
-        return json.loads(content)
+        with open(file_path, "r", encoding="utf-8") as file:
+            return parse_annotations(file)
     except json.JSONDecodeError as e:
         logger.error(f"Error parsing JSON in file {file_path}: {e}")
         sys.exit(1)
+    except Exception as e:
+        print(f"Error reading file {file_path}: {e}")
+        sys.exit(1)
+
+
+# サブコマンド名 -> (モジュール, 関数)
+SUBCOMMANDS = {
+    "aggregate": ("prcb_checks.aggregate", "aggregate_main"),
+    "flush": ("prcb_checks.spool", "flush_main"),
+    "run": ("prcb_checks.reuse", "run_main"),
+    "warm": ("prcb_checks.warm", "warm_main"),
+}
+
+# 持ち時間を使い切ったとみなすエラー
+DEADLINE_ERRORS = (
+    DeadlineExceeded,
+    requests.Timeout,
+    ConnectTimeoutError,
+    ReadTimeoutError,
+)
 
 
 def parse_options():
@@ -204,23 +550,191 @@ def parse_options():
         default=False,
         help="Enable debug mode with verbose output",
     )
+    parser.add_option(
+        "--dry-run",
+        action="store_true",
+        dest="dry_run",
+        default=False,
+        help="Validate and print the payload without calling any API",
+    )
+    parser.add_option(
+        "--auto-summary",
+        action="store_true",
+        dest="auto_summary",
+        default=False,
+        help="Generate the summary from annotation statistics "
+        "(appended to the given summary, if any)",
+    )
+    parser.add_option(
+        "--deadline",
+        dest="deadline",
+        default=None,
+        metavar="DURATION",
+        help="Overall time budget for reporting the check (e.g. 10s, 500ms, 1m)",
+    )
+    parser.add_option(
+        "--connect-timeout",
+        dest="connect_timeout",
+        default="60s",
+        metavar="DURATION",
+        help="Connect timeout of each request (default: 60s)",
+    )
+    parser.add_option(
+        "--read-timeout",
+        dest="read_timeout",
+        default="60s",
+        metavar="DURATION",
+        help="Read timeout of each request (default: 60s)",
+    )
+    parser.add_option(
+        "--on-deadline",
+        dest="on_deadline",
+        type="choice",
+        choices=["fail", "skip", "spool"],
+        default="fail",
+        help="What to do when the deadline or a timeout is hit: fail, skip, or "
+        "spool the check for `prcb-checks flush` (default: fail)",
+    )
+    parser.add_option(
+        "--head-sha",
+        dest="head_sha",
+        default=None,
+        metavar="SHAS",
+        help="Post the check to these commits instead of "
+        "CODEBUILD_RESOLVED_SOURCE_VERSION (comma separated, or file:// "
+        "with one SHA per line)",
+    )
+    parser.add_option(
+        "--delta",
+        action="store_true",
+        dest="delta",
+        default=False,
+        help="Update the check run created by a previous call for the same name "
+        "and commit, sending only annotations not delivered yet",
+    )
+    parser.add_option(
+        "--shard-store",
+        dest="shard_store",
+        default=None,
+        metavar="URL",
+        help="Write the result as a shard to URL (s3://bucket/prefix or a directory) "
+        "instead of posting it; merge the shards with `aggregate`",
+    )
+    parser.add_option(
+        "--shard-id",
+        dest="shard_id",
+        default=None,
+        help="Shard identifier (default: CODEBUILD_BATCH_BUILD_IDENTIFIER)",
+    )
+    parser.add_option(
+        "--expected-shards",
+        dest="expected_shards",
+        type="int",
+        default=None,
+        metavar="N",
+        help="Number of shards `aggregate` expects; fewer shard results "
+        "conclude failure",
+    )
+    parser.add_option(
+        "--follow",
+        dest="follow",
+        default=None,
+        metavar="FILE",
+        help="Follow a growing JSON Lines file of annotations (file://path) and "
+        'add them to the check as they are appended, until a {"eof": true} line',
+    )
+    parser.add_option(
+        "--follow-pid",
+        dest="follow_pid",
+        type="int",
+        default=None,
+        metavar="PID",
+        help="Stop following when this process (the writer of the file) exits",
+    )
+    parser.add_option(
+        "--flush-interval",
+        dest="flush_interval",
+        default="5s",
+        metavar="DURATION",
+        help="Longest time a followed annotation waits for its batch of 50 "
+        "(default: 5s)",
+    )
+    parser.add_option(
+        "--inputs",
+        dest="inputs",
+        default=None,
+        metavar="GLOBS",
+        help="Comma separated globs of the files a `run` check depends on "
+        "(default: every file)",
+    )
+    parser.add_option(
+        "--result-store",
+        dest="result_store",
+        default=None,
+        metavar="URL",
+        help="Store of `run` results (s3://bucket/prefix or a directory; "
+        "default: the local cache directory)",
+    )
+    parser.add_option(
+        "--annotations-file",
+        dest="annotations_file",
+        default=None,
+        metavar="FILE",
+        help="Annotations file written by the command of `run`",
+    )
+    parser.add_option(
+        "--profile",
+        dest="profile",
+        type="choice",
+        choices=["cpu", "mem", "both"],
+        default=None,
+        help="Profile the run with cProfile (cpu), tracemalloc (mem) or both, "
+        "and log the top hot spots",
+    )
+    parser.add_option(
+        "--profile-dir",
+        dest="profile_dir",
+        default="prcb-checks-profile",
+        metavar="DIR",
+        help="Directory of the --profile reports (default: prcb-checks-profile)",
+    )
 
     return parser.parse_args()
 
 
 def main():
     """Main entry point."""
-    TEXT_FILE_PREFIX = "file://"
-
     options, args = parse_options()
 
     set_debug_mode(options.debug)
     logger.debug(f"ARGS: {args}")
+    if options.profile:
+        from prcb_checks.profiling import run_profiled
 
-    try:
-        private_key = get_secret_value(os.environ["SECRETS_MANAGER_SECRETID"])
-        access_token = get_access_token(private_key)
+        run_profiled(options.profile, options.profile_dir, run_command, options, args)
+    else:
+        run_command(options, args)
 
+
+def run_command(options, args):
+    """
+    Run the check-run command or subcommand given on the command line
+    Args:
+        options (optparse.Values): Parsed options
+        args (list): Positional arguments
+    """
+    TEXT_FILE_PREFIX = "file://"
+
+    deadline = create_deadline(options)
+
+    # サブコマンドは循環importを避けるため、使うときにだけimportする
+    if args and args[0] in SUBCOMMANDS:
+        module_name, function_name = SUBCOMMANDS[args[0]]
+        module = importlib.import_module(module_name)
+        getattr(module, function_name)(options, args[1:])
+        return
+
+    try:
         kwargs = {}
         kwargs["name"] = args[0]
         if len(args) > 1 and args[1]:
@@ -241,24 +755,126 @@ def main():
             else:
                 # 通常のテキスト
                 kwargs["text"] = text_arg
-                
+
         # Handle annotations parameter if provided
         if len(args) > 6 and args[6]:
             annotations_arg = args[6]
             if annotations_arg.startswith(TEXT_FILE_PREFIX):
                 # Read annotations from file
-                file_path = annotations_arg[len(TEXT_FILE_PREFIX):]
-                annotations = parse_json_file(file_path)
-                kwargs["annotations"] = annotations
+                file_path = annotations_arg[len(TEXT_FILE_PREFIX) :]
+                kwargs["annotations"] = parse_annotations_file(file_path)
             else:
                 # Parse JSON string directly
                 try:
-                    kwargs["annotations"] = json.loads(annotations_arg)
+                    kwargs["annotations"] = parse_annotations(
+                        io.StringIO(annotations_arg)
+                    )
                 except json.JSONDecodeError as e:
                     logger.error(f"Error parsing annotations JSON: {e}")
                     sys.exit(1)
 
-        create_check_runs(access_token, **kwargs)
+        head_shas = []
+        if options.head_sha:
+            from prcb_checks.fanout import parse_head_shas
+
+            head_shas = parse_head_shas(options.head_sha)
+            if not head_shas:
+                logger.error("Error: No SHA given by --head-sha")
+                sys.exit(1)
+            if len(head_shas) > 1 and (options.delta or options.shard_store):
+                logger.error(
+                    "Error: Multiple --head-sha cannot be combined with "
+                    "--delta or --shard-store"
+                )
+                sys.exit(1)
+            kwargs["head_sha"] = head_shas[0]
+
+        if options.follow and (
+            options.delta
+            or options.shard_store
+            or len(head_shas) > 1
+            or "annotations" in kwargs
+        ):
+            logger.error(
+                "Error: --follow cannot be combined with --delta, --shard-store, "
+                "multiple --head-sha or the annotations argument"
+            )
+            sys.exit(1)
+        # 作成時の経過表示に使うため、追いかける場合はtitleとsummaryが必須
+        if options.follow and not ("title" in kwargs and "summary" in kwargs):
+            logger.error("Error: --follow requires the title and summary arguments")
+            logger.info(
+                "Usage: %prog --follow file://<path> <name> <status> <conclusion> "
+                "<title> <summary>"
+            )
+            sys.exit(1)
+
+        # 追いかけるファイルのサマリーは完了時に生成する
+        if options.auto_summary and not options.follow:
+            # 配列でないアノテーションは集計せず、検証でエラーとして報告する
+            annotations = kwargs.get("annotations")
+            if not isinstance(annotations, AnnotationStore):
+                annotations = []
+            generated = summarize_annotations(annotations)
+            if "summary" in kwargs:
+                generated = kwargs["summary"] + "\n\n" + generated
+            kwargs["summary"] = generated
+
+        # ネットワークI/Oの前にペイロードを検証する
+        # シャード・差分モードでは50件ずつ分けて送信するので件数の上限は無い
+        check_run_payload = build_check_run_payload(**kwargs)
+        batched = options.shard_store or options.delta
+        ensure_valid_payload(
+            check_run_payload,
+            max_annotations=None if batched else MAX_ANNOTATIONS_PER_REQUEST,
+        )
+
+        if options.shard_store:
+            from prcb_checks.aggregate import get_shard_id, write_shard
+            from prcb_checks.store import get_store
+
+            shard_id = options.shard_id or get_shard_id()
+            if not options.dry_run:
+                write_shard(get_store(options.shard_store), check_run_payload, shard_id)
+                return
+
+        if options.dry_run:
+            body = serialize_payload(check_run_payload)
+            print(body)
+            logger.info(f"Payload size: {len(body.encode('utf-8'))} bytes")
+            if len(head_shas) > 1:
+                logger.info(f"Would be posted to {len(head_shas)} commits")
+            return
+
+        if options.follow:
+            from prcb_checks.follow import follow_main
+
+            follow_main(check_run_payload, options, deadline)
+            return
+
+        record = {
+            "payload": check_run_payload,
+            "head_shas": head_shas,
+            "delta": options.delta,
+        }
+        try:
+            sent = send_check_run(check_run_payload, head_shas, options.delta, deadline)
+        except DEADLINE_ERRORS as e:
+            handle_deadline_exceeded(
+                options.on_deadline, e, narrow_to_timed_out(record, e)
+            )
+            # fan-outで時間切れ以外に失敗したSHAがあれば、ポリシーによらず失敗にする
+            if getattr(e, "failed", 0):
+                sys.exit(1)
+            return
+        if sent:
+            from prcb_checks.spool import record_sent
+
+            # 保存済みの古いチェックがflushでこのチェックを上書きしないようにする
+            record_sent(record)
+    except KeyError as e:
+        logger.error(f"Error: Required environment variable not found: {e}")
+        sys.exit(1)
     except IndexError:
         logger.error("Error: Not enough arguments provided.")
         logger.info(
@@ -268,4 +884,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()  # pragma: no cover
\ No newline at end of file
+    main()  # pragma: no cover
@@ -0,0 +1,142 @@
+"""profiling.py: Profile a run with cProfile and tracemalloc (--profile)."""
+
+# 大きなレポートで遅い・メモリを使う呼び出しを、本番の環境のままで調べるためのオプション。
+# 実行全体をcProfile・tracemalloc(またはその両方)で計測し、レポートを --profile-dir に書き出して、
+# 上位のホットスポットだけをログに出す。CodeBuildではディレクトリをアーティファクトに指定する。
+#
+#   prcb-checks --profile both --profile-dir profile "Lint" completed failure ... file://lint.json
+#
+# 書き出すファイル (<prefix> は prcb-checks-<時刻>-<PID>):
+#   <prefix>.pstats      : cProfileの統計 (python -m pstats や snakeviz で開く)
+#   <prefix>-cpu.txt     : 累積時間順の統計
+#   <prefix>.tracemalloc : tracemallocのスナップショット (tracemalloc.Snapshot.load で開く)
+#   <prefix>-mem.txt     : 確保したメモリの多い行
+
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+
+from prcb_checks.logger import logger
+
+# ログに出すホットスポットの件数
+SUMMARY_TOP = 5
+# テキストレポートに出す件数
+REPORT_TOP = 50
+# 確保したメモリごとに記録するスタックの深さ(深いほど遅くなるため、確保した行だけを記録する)
+TRACEMALLOC_FRAMES = 1
+
+# 計測自体の確保はレポートから除く
+_MEMORY_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def report_prefix(directory):
+    """
+    Get the path prefix of the report files of this run
+    Args:
+        directory (str): Directory of the reports
+    Returns:
+        str: Path without extension
+    """
+    timestamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    return os.path.join(directory, f"prcb-checks-{timestamp}-{os.getpid()}")
+
+
+def write_cpu_report(profiler, prefix):
+    """
+    Write the cProfile reports and log the functions taking the most time
+    Args:
+        profiler (cProfile.Profile): Finished profiler
+        prefix (str): report_prefix()
+    """
+    profiler.dump_stats(prefix + ".pstats")
+    text = io.StringIO()
+    stats = pstats.Stats(profiler, stream=text)
+    stats.sort_stats("cumulative").print_stats(REPORT_TOP)
+    with open(prefix + "-cpu.txt", "w", encoding="utf-8") as file:
+        file.write(text.getvalue())
+
+    # 子関数を含まない時間(tottime)の長い順
+    entries = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)
+    logger.info(f"CPU profile: {stats.total_tt:.3f}s in total ({prefix}.pstats)")
+    for (filename, line, function), entry in entries[:SUMMARY_TOP]:
+        _, calls, tottime, cumtime, _ = entry
+        location = function if filename == "~" else f"{filename}:{line}({function})"
+        logger.info(
+            f"  {tottime:8.3f}s self {cumtime:8.3f}s total {calls:>8} calls  {location}"
+        )
+
+
+def write_memory_report(snapshot, peak, prefix):
+    """
+    Write the tracemalloc reports and log the lines allocating the most memory
+    Args:
+        snapshot (tracemalloc.Snapshot): Snapshot taken at the end of the run
+        peak (int): Peak size of the traced memory in bytes
+        prefix (str): report_prefix()
+    """
+    snapshot = snapshot.filter_traces(_MEMORY_FILTERS)
+    snapshot.dump(prefix + ".tracemalloc")
+    statistics = snapshot.statistics("lineno")
+    with open(prefix + "-mem.txt", "w", encoding="utf-8") as file:
+        file.write(f"Peak: {peak} bytes\n")
+        for stat in statistics[:REPORT_TOP]:
+            file.write(f"{stat}\n")
+
+    logger.info(
+        f"Memory profile: {peak / 1024 / 1024:.1f} MiB at peak "
+        f"({prefix}.tracemalloc)"
+    )
+    for stat in statistics[:SUMMARY_TOP]:
+        frame = stat.traceback[0]
+        logger.info(
+            f"  {stat.size / 1024:10.1f} KiB {stat.count:>8} blocks  "
+            f"{frame.filename}:{frame.lineno}"
+        )
+
+
+def run_profiled(mode, directory, function, *args):
+    """
+    Call a function under cProfile and/or tracemalloc and write the reports
+    Args:
+        mode (str): "cpu", "mem" or "both"
+        directory (str): Directory of the reports
+        function (callable): Function to profile
+        args: Arguments of the function
+    Returns:
+        object: Return value of the function
+    """
+    profiler = cProfile.Profile() if mode in ("cpu", "both") else None
+    trace_memory = mode in ("mem", "both")
+    if trace_memory:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    if profiler is not None:
+        profiler.enable()
+    # sys.exit()で終了する場合もレポートを書き出す
+    try:
+        return function(*args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        # レポートを書けなくても、計測した処理の結果は変えない
+        try:
+            os.makedirs(directory, exist_ok=True)
+            prefix = report_prefix(directory)
+            if profiler is not None:
+                write_cpu_report(profiler, prefix)
+            if trace_memory:
+                write_memory_report(snapshot, peak, prefix)
+        except OSError as e:
+            logger.warning(f"Could not write the profile to {directory}: {e}")
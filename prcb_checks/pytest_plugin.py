@@ -0,0 +1,188 @@
+"""pytest_plugin.py: pytest plugin streaming test failures into a check run."""
+
+# pytest --prcb-check "Unit Tests" で有効になる。
+# セッション開始時にin_progressのチェックランを作成し、失敗したテストをアノテーションとして
+# バックグラウンドスレッドから50件単位で送信する。セッション終了時に件数とともに完了させる。
+# 報告の失敗ではテストの実行を止めず、警告だけを出す。
+# pytest-xdistではコントローラーに結果が集まるため、ワーカーでは報告しない。
+
+import os
+import queue
+import threading
+import time
+
+import pytest
+
+from prcb_checks.logger import logger
+from prcb_checks.validator import (
+    MAX_ANNOTATION_TEXT_BYTES,
+    MAX_ANNOTATION_TITLE_LENGTH,
+    MAX_ANNOTATIONS_PER_REQUEST,
+)
+
+# 失敗が50件に満たなくても、最も古い未送信の失敗がこの秒数だけ待ったら送信する
+FLUSH_INTERVAL = 5.0
+
+_STOP = object()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("prcb-checks")
+    group.addoption(
+        "--prcb-check",
+        action="store",
+        dest="prcb_check",
+        default=None,
+        metavar="NAME",
+        help="Report test results to the GitHub check run NAME while the session runs",
+    )
+
+
+def pytest_configure(config):
+    name = config.getoption("prcb_check")
+    if name and not hasattr(config, "workerinput"):
+        config.pluginmanager.register(ChecksReporter(config, name), "prcb-checks")
+
+
+def _truncate(value, max_length):
+    if len(value) <= max_length:
+        return value
+    return value[: max_length - 3] + "..."
+
+
+def _truncate_bytes(value, max_bytes):
+    encoded = value.encode("utf-8")
+    if len(encoded) <= max_bytes:
+        return value
+    # 途中で切れた文字は捨てる
+    return encoded[: max_bytes - 3].decode("utf-8", "ignore") + "..."
+
+
+class ChecksReporter:
+    """Reports the results of a pytest session to a check run"""
+
+    def __init__(self, config, name, client=None, flush_interval=FLUSH_INTERVAL):
+        self.config = config
+        self.name = name
+        self.flush_interval = flush_interval
+        self.client = client
+        self.check_run_id = None
+        self.passed = 0
+        self.failed = 0
+        self.skipped = 0
+        self._queue = queue.Queue()
+        self._worker = None
+
+    def _summary(self):
+        return f"{self.passed} passed, {self.failed} failed, {self.skipped} skipped"
+
+    def pytest_sessionstart(self, session):
+        try:
+            if self.client is None:
+                # boto3等の読み込みは、--prcb-checkが指定された場合だけにする
+                from prcb_checks.client import ChecksClient
+
+                self.client = ChecksClient()
+            check_run = self.client.create(self.name, status="in_progress")
+        except Exception as e:
+            logger.warning(f"prcb-checks: could not create check run: {e}")
+            return
+        self.check_run_id = check_run["id"]
+        self._worker = threading.Thread(
+            target=self._run, name="prcb-checks", daemon=True
+        )
+        self._worker.start()
+
+    def _annotation(self, report):
+        path, lineno = None, None
+        crash = getattr(report.longrepr, "reprcrash", None)
+        if crash is not None:
+            relative = os.path.relpath(crash.path, self.config.rootpath)
+            if not relative.startswith(".."):
+                path, lineno = relative, crash.lineno
+            message = crash.message
+        else:
+            message = str(report.longrepr).strip().splitlines()[-1]
+        if path is None:
+            # トレースバックがリポジトリ外を指す場合はテスト自体の位置を使う
+            path, location_lineno, _ = report.location
+            lineno = (location_lineno or 0) + 1
+
+        return {
+            "path": path.replace(os.sep, "/"),
+            "start_line": lineno,
+            "end_line": lineno,
+            "annotation_level": "failure",
+            "message": _truncate_bytes(
+                message or report.nodeid, MAX_ANNOTATION_TEXT_BYTES
+            ),
+            "title": _truncate(report.nodeid, MAX_ANNOTATION_TITLE_LENGTH),
+            "raw_details": _truncate_bytes(
+                report.longreprtext, MAX_ANNOTATION_TEXT_BYTES
+            ),
+        }
+
+    def pytest_runtest_logreport(self, report):
+        if report.passed:
+            if report.when == "call":
+                self.passed += 1
+        elif report.skipped:
+            self.skipped += 1
+        elif report.failed:
+            self.failed += 1
+            if self.check_run_id is not None:
+                self._queue.put(self._annotation(report))
+
+    def _flush(self, batch):
+        try:
+            self.client.add_annotations(
+                self.check_run_id, batch, self.name, self._summary()
+            )
+        except Exception as e:
+            logger.warning(f"prcb-checks: could not send annotations: {e}")
+
+    def _run(self):
+        batch = []
+        # 失敗が続けて届いても待ち時間が延びないよう、最も古い失敗から期限を数える
+        flush_at = None
+        while True:
+            timeout = None
+            if flush_at is not None:
+                timeout = max(0.0, flush_at - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if item is not None:
+                batch.append(item)
+                if flush_at is None:
+                    flush_at = time.monotonic() + self.flush_interval
+            if len(batch) >= MAX_ANNOTATIONS_PER_REQUEST or (
+                batch and time.monotonic() >= flush_at
+            ):
+                self._flush(batch)
+                batch = []
+                flush_at = None
+        if batch:
+            self._flush(batch)
+
+    def pytest_sessionfinish(self, session, exitstatus):
+        if self.check_run_id is None:
+            return
+        self._queue.put(_STOP)
+        self._worker.join()
+        succeeded = exitstatus in (
+            pytest.ExitCode.OK,
+            pytest.ExitCode.NO_TESTS_COLLECTED,
+        )
+        conclusion = "success" if succeeded and not self.failed else "failure"
+        try:
+            self.client.complete(
+                self.check_run_id, conclusion, title=self.name, summary=self._summary()
+            )
+        except Exception as e:
+            logger.warning(f"prcb-checks: could not complete check run: {e}")
+        finally:
+            self.client.close()
@@ -0,0 +1,297 @@
+"""reuse.py: Reuse check results across commits with identical inputs (`prcb-checks run`)."""
+
+# リベースや空のマージ、ビルドの再実行では、SHAが変わっても対象のファイルは同じことが多い。
+# 対象ファイルのツリーハッシュ・チェック名・コマンドをキーに送信したリクエストボディを保存し、
+# 同じキーのコミットではツールを実行せず、アノテーションも解析し直さずにそのまま送信する。
+# 保存形式はJSON Lines: 1行目がメタデータ、2行目がhead_shaを除いた作成リクエスト、
+# 3行目以降が残りのアノテーションを追加する更新リクエスト。
+
+import glob
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+
+from prcb_checks.annotations import AnnotationStore
+from prcb_checks.cache import get_cache_dir
+from prcb_checks.client import ChecksClient, ChecksClientError
+from prcb_checks.fanout import fill_head_sha, serialize_head_sha_template
+from prcb_checks.logger import logger
+from prcb_checks.main import (
+    DEADLINE_ERRORS,
+    build_check_run_payload,
+    create_deadline,
+    ensure_valid_payload,
+    handle_deadline_exceeded,
+    parse_annotations_file,
+    serialize_payload,
+)
+from prcb_checks.store import LocalStore, get_store
+from prcb_checks.summary import summarize_annotations
+from prcb_checks.validator import MAX_ANNOTATIONS_PER_REQUEST
+
+RESULT_PREFIX = "results/"
+_TEMPLATE_SEPARATOR = b"\0"
+
+
+def parse_globs(value):
+    """
+    Parse the --inputs option
+    Args:
+        value (str): Comma separated path globs, or None for every file
+    Returns:
+        list: Globs
+    """
+    return [pattern.strip() for pattern in (value or "").split(",") if pattern.strip()]
+
+
+def tree_hash(globs):
+    """
+    Hash the files matching the globs
+    Args:
+        globs (list): Path globs relative to the current directory (empty: every file)
+    Returns:
+        str: Hex digest, or None if no file matches
+    """
+    # Gitの作業ツリーでは、インデックスのblobハッシュを使うためファイルを読まずに済む
+    pathspecs = [f":(glob){pattern}" for pattern in globs]
+    try:
+        listing = subprocess.run(
+            ["git", "ls-files", "-s", "-z", "--", *pathspecs],
+            check=True,
+            capture_output=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        # CodePipelineのソースアーティファクトなど、Gitの作業ツリーでない場合
+        listing = _hash_files(globs)
+    # 一致するファイルが無いとどのコミットでも同じハッシュになるため、再利用させない
+    if not listing:
+        return None
+    return hashlib.sha256(listing).hexdigest()
+
+
+def _hash_files(globs):
+    paths = set()
+    for pattern in globs or ["**"]:
+        paths.update(
+            path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path)
+        )
+    if not paths:
+        return b""
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        with open(path, "rb") as file:
+            digest.update(
+                path.encode() + b"\0" + hashlib.file_digest(file, "sha256").digest()
+            )
+    return digest.digest()
+
+
+def result_key(name, command, digest):
+    """
+    Get the store key of a result
+    Args:
+        name (str): Name of the check
+        command (list): Command line of the tool
+        digest (str): tree_hash() of the inputs
+    Returns:
+        str: Object key
+    """
+    key = json.dumps({"name": name, "command": command, "inputs": digest})
+    return f"{RESULT_PREFIX}{hashlib.sha256(key.encode()).hexdigest()}.jsonl"
+
+
+def serialize_result(check_run_payload, returncode):
+    """
+    Serialize a validated payload into the requests to replay
+    Args:
+        check_run_payload (dict): Validated check-run payload
+        returncode (int): Exit status of the tool
+    Returns:
+        bytes: JSON Lines
+    """
+    output = check_run_payload["output"]
+    annotations = output.get("annotations") or []
+    first = dict(output)
+    first.pop("annotations", None)
+    if annotations:
+        first["annotations"] = annotations[:MAX_ANNOTATIONS_PER_REQUEST]
+    prefix, suffix = serialize_head_sha_template(dict(check_run_payload, output=first))
+
+    meta = {"head_sha": check_run_payload["head_sha"], "returncode": returncode}
+    lines = [
+        json.dumps(meta).encode("utf-8"),
+        prefix + _TEMPLATE_SEPARATOR + suffix,
+    ]
+    for i in range(
+        MAX_ANNOTATIONS_PER_REQUEST, len(annotations), MAX_ANNOTATIONS_PER_REQUEST
+    ):
+        update = {
+            "output": {
+                "title": output["title"],
+                "summary": output["summary"],
+                "annotations": annotations[i : i + MAX_ANNOTATIONS_PER_REQUEST],
+            }
+        }
+        lines.append(serialize_payload(update).encode("utf-8"))
+    return b"\n".join(lines)
+
+
+def replay_result(client, result, head_sha):
+    """
+    Create a check run on a commit from a serialized result
+    Args:
+        client (ChecksClient): Checks API client
+        result (bytes): serialize_result() output
+        head_sha (str): Commit SHA
+    Returns:
+        dict: Metadata of the result (head_sha it was produced on, returncode)
+    """
+    lines = result.split(b"\n")
+    meta = json.loads(lines[0])
+    prefix, _, suffix = lines[1].partition(_TEMPLATE_SEPARATOR)
+    check_run = client.create_serialized(fill_head_sha(prefix, suffix, head_sha))
+    for body in lines[2:]:
+        client.update_serialized(check_run["id"], body)
+    return meta
+
+
+def result_record(result, head_sha):
+    """
+    Rebuild the send_check_run() arguments of a serialized result (--on-deadline spool)
+    Args:
+        result (bytes): serialize_result() output
+        head_sha (str): Commit SHA
+    Returns:
+        dict: payload, head_shas and delta
+    """
+    lines = result.split(b"\n")
+    prefix, _, suffix = lines[1].partition(_TEMPLATE_SEPARATOR)
+    payload = json.loads(fill_head_sha(prefix, suffix, head_sha))
+    for body in lines[2:]:
+        payload["output"]["annotations"].extend(
+            json.loads(body)["output"]["annotations"]
+        )
+    # 50件を超える場合は、flushで差分モードとして50件ずつ送信する
+    annotations = payload["output"].get("annotations") or []
+    return {
+        "payload": payload,
+        "head_shas": [head_sha],
+        "delta": len(annotations) > MAX_ANNOTATIONS_PER_REQUEST,
+    }
+
+
+def run_check(name, command, annotations_file, head_sha):
+    """
+    Run the tool and build the check-run payload from its result
+    Args:
+        name (str): Name of the check
+        command (list): Command line of the tool
+        annotations_file (str): Annotations file written by the tool, or None
+        head_sha (str): Commit SHA
+    Returns:
+        tuple: (payload, returncode)
+    """
+    logger.info(f"Running {shlex.join(command)}")
+    try:
+        returncode = subprocess.run(command).returncode
+    except OSError as e:
+        logger.error(f"Error: Could not run {command[0]}: {e}")
+        sys.exit(1)
+
+    annotations = None
+    if annotations_file and os.path.exists(annotations_file):
+        annotations = parse_annotations_file(annotations_file) or None
+    # 配列でないアノテーションは集計せず、検証でエラーとして報告する
+    if isinstance(annotations, AnnotationStore) and annotations:
+        summary = summarize_annotations(annotations)
+    else:
+        summary = f"`{shlex.join(command)}` exited with {returncode}."
+
+    check_run_payload = build_check_run_payload(
+        name,
+        status="completed",
+        conclusion="success" if returncode == 0 else "failure",
+        title=name,
+        summary=summary,
+        annotations=annotations,
+        head_sha=head_sha,
+    )
+    ensure_valid_payload(check_run_payload, max_annotations=None)
+    return check_run_payload, returncode
+
+
+def run_main(options, args):
+    """Entry point of `prcb-checks run <name> -- <command>...`"""
+    if len(args) < 2:
+        logger.error("Error: Not enough arguments provided.")
+        logger.info(
+            "Usage: %prog run [--inputs GLOBS] [--result-store URL] "
+            "[--annotations-file FILE] <name> -- <command>..."
+        )
+        sys.exit(1)
+
+    name, command = args[0], args[1:]
+    try:
+        head_sha = os.environ["CODEBUILD_RESOLVED_SOURCE_VERSION"]
+    except KeyError as e:
+        logger.error(f"Error: Required environment variable not found: {e}")
+        sys.exit(1)
+    if options.result_store:
+        store = get_store(options.result_store)
+    else:
+        store = LocalStore(get_cache_dir())
+
+    digest = tree_hash(parse_globs(options.inputs))
+    if digest is None:
+        logger.warning(
+            f"No file matches --inputs {options.inputs!r}; "
+            "running the tool without reusing results"
+        )
+        key = result = None
+    else:
+        key = result_key(name, command, digest)
+        result = store.get(key)
+    if options.dry_run:
+        if key is not None:
+            logger.info(
+                f"Result {key}: {'reusable' if result is not None else 'not found'}"
+            )
+        return
+
+    if result is None:
+        check_run_payload, returncode = run_check(
+            name, command, options.annotations_file, head_sha
+        )
+        result = serialize_result(check_run_payload, returncode)
+        # 起動や実行環境の失敗かもしれないため、アノテーションなしの失敗は保存しない
+        stored = returncode == 0 or check_run_payload["output"].get("annotations")
+        if key is not None and stored:
+            store.put(key, result)
+    else:
+        logger.info(f"Reusing the result of {name} for identical inputs")
+
+    meta = json.loads(result.split(b"\n", 1)[0])
+    try:
+        with ChecksClient(deadline=create_deadline(options)) as client:
+            replay_result(client, result, head_sha)
+    except DEADLINE_ERRORS as e:
+        # 時間切れでもツールの終了ステータスは下で返す
+        handle_deadline_exceeded(
+            options.on_deadline, e, result_record(result, head_sha)
+        )
+    except ChecksClientError as e:
+        logger.error(f"Error creating check-runs: {e}")
+        sys.exit(1)
+    else:
+        from prcb_checks.spool import record_sent
+
+        # 保存済みの古いチェックがflushでこの結果を上書きしないようにする
+        record_sent({"payload": {"name": name}, "head_shas": [head_sha]})
+    if meta["head_sha"] != head_sha:
+        logger.info(f"Copied the result of {meta['head_sha']} to {head_sha}")
+    # ツールと同じ終了ステータスで終了する
+    if meta["returncode"]:
+        sys.exit(meta["returncode"])
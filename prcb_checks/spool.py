@@ -0,0 +1,144 @@
+"""spool.py: Keep check runs that missed the deadline and send them later."""
+
+# --on-deadline=spool の場合、時間内に送れなかったペイロードをローカルキャッシュに保存する。
+# 後続のフェーズ（post_build等）で `prcb-checks flush` を実行すると、保存した順に再送する。
+# 保存した後に同じ名前・SHAのチェックを直接送った場合、古い保存分を再送すると新しい結果を
+# 上書きしてしまうため、送信した時刻を記録しておき、それより前に保存したものは捨てる。
+
+import os
+import sys
+import time
+
+from prcb_checks.annotations import json_default
+from prcb_checks.cache import get_cache_dir, read_json, write_json
+from prcb_checks.logger import logger
+from prcb_checks.main import (
+    DEADLINE_ERRORS,
+    create_deadline,
+    narrow_to_timed_out,
+    send_check_run,
+)
+
+SPOOL_DIR = "spool"
+# (SHA, チェック名) -> 最後に直接送信した時刻
+SENT_INDEX = ("sent", "index.json")
+
+
+def _record_shas(record):
+    return record["head_shas"] or [record["payload"]["head_sha"]]
+
+
+def _sent_key(sha, name):
+    return f"{sha}/{name}"
+
+
+def spool_check_run(record):
+    """
+    Save a check run that could not be sent
+    Args:
+        record (dict): payload, head_shas and delta of send_check_run()
+    Returns:
+        str: File name of the record
+    """
+    # 保存した順に再送できるよう、時刻を先頭に付ける
+    name = f"{time.time_ns():020d}-{os.getpid()}.json"
+    write_json(SPOOL_DIR, name, record, default=json_default)
+    return name
+
+
+def list_spooled():
+    """
+    List the spooled check runs
+    Returns:
+        list: File names in the order they were spooled
+    """
+    return sorted(
+        name
+        for name in os.listdir(get_cache_dir(SPOOL_DIR))
+        if name.endswith(".json") and not name.startswith(".")
+    )
+
+
+def record_sent(record):
+    """
+    Remember that a check run was sent, so that older spooled ones are not sent after it
+    Args:
+        record (dict): payload, head_shas and delta of send_check_run()
+    """
+    # 保存分が無ければ、後で追い越す心配も無い
+    if not list_spooled():
+        return
+    index = read_json(*SENT_INDEX) or {}
+    now = time.time_ns()
+    for sha in _record_shas(record):
+        index[_sent_key(sha, record["payload"]["name"])] = now
+    write_json(*SENT_INDEX, index)
+
+
+def drop_superseded(record, name):
+    """
+    Leave out the SHAs that got the same check directly after it was spooled
+    Args:
+        record (dict): Spooled record
+        name (str): File name of the record
+    Returns:
+        dict: Record to send, or None if every SHA got a later check
+    """
+    spooled_at = int(name.split("-", 1)[0])
+    index = read_json(*SENT_INDEX) or {}
+    check_name = record["payload"]["name"]
+    head_shas = [
+        sha
+        for sha in _record_shas(record)
+        if index.get(_sent_key(sha, check_name), 0) < spooled_at
+    ]
+    if not head_shas:
+        return None
+    if head_shas == _record_shas(record):
+        return record
+    return dict(
+        record,
+        payload=dict(record["payload"], head_sha=head_shas[0]),
+        head_shas=head_shas,
+    )
+
+
+def flush_main(options, args):
+    """Entry point of `prcb-checks flush`"""
+    deadline = create_deadline(options)
+    names = list_spooled()
+    for name in names:
+        record = read_json(SPOOL_DIR, name)
+        if record is None:
+            logger.warning(f"Skipped a broken spooled check run: {name}")
+            continue
+        path = os.path.join(get_cache_dir(SPOOL_DIR), name)
+        check_name = record["payload"]["name"]
+        record = drop_superseded(record, name)
+        if record is None:
+            os.remove(path)
+            logger.warning(
+                f"Dropped spooled check run {check_name}: "
+                "a later check with the same name was sent"
+            )
+            continue
+        try:
+            sent = send_check_run(
+                record["payload"], record["head_shas"], record["delta"], deadline
+            )
+        except DEADLINE_ERRORS as e:
+            # 残りは次回のflushで再送する。送信済みのSHAには再送しない
+            write_json(
+                SPOOL_DIR, name, narrow_to_timed_out(record, e), default=json_default
+            )
+            logger.error(f"Error: Deadline exceeded while flushing {name}: {e}")
+            sys.exit(1)
+        if not sent:
+            # 後の保存分が追い越さないよう、ここで止めて次回のflushで再送する
+            logger.error(f"Error: Could not send spooled check run {check_name}")
+            sys.exit(1)
+        os.remove(path)
+        logger.info(f"Sent spooled check run {check_name}")
+    # 保存分をすべて送ったら、送信の記録は要らない
+    write_json(*SENT_INDEX, {})
+    logger.info(f"Flushed {len(names)} spooled check runs")
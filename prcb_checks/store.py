@@ -0,0 +1,139 @@
+"""store.py: Shared result stores (local filesystem / Amazon S3) for prcb-checks."""
+
+# 並列ビルド間で結果を受け渡すためのキー/値ストア。
+#   file:///path/to/dir または /path/to/dir : ローカルファイルシステム
+#   s3://bucket/prefix                      : Amazon S3
+
+import os
+import tempfile
+
+import boto3
+from botocore.exceptions import ClientError
+
+FILE_PREFIX = "file://"
+S3_PREFIX = "s3://"
+
+
+class LocalStore:
+    """Store backed by a local (or shared) directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, *key.split("/"))
+
+    def put(self, key, data):
+        """
+        Write an object atomically
+        Args:
+            key (str): Object key ("/" separated)
+            data (bytes): Content
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        """
+        Read an object
+        Args:
+            key (str): Object key
+        Returns:
+            bytes: Content, or None if the object does not exist
+        """
+        try:
+            with open(self._path(key), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def iter_lines(self, key):
+        """
+        Stream an object line by line
+        Args:
+            key (str): Object key
+        Returns:
+            iterator: Lines (bytes) without line endings
+        """
+        with open(self._path(key), "rb") as file:
+            for line in file:
+                yield line.rstrip(b"\r\n")
+
+    def list(self, prefix):
+        """
+        List object keys under a prefix
+        Args:
+            prefix (str): Key prefix ending with "/"
+        Returns:
+            list: Sorted object keys
+        """
+        directory = self._path(prefix)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            prefix + entry
+            for entry in os.listdir(directory)
+            if not entry.startswith(".tmp-")
+            and os.path.isfile(os.path.join(directory, entry))
+        )
+
+
+class S3Store:
+    """Store backed by an Amazon S3 bucket"""
+
+    def __init__(self, bucket, prefix=""):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.client = boto3.session.Session().client("s3")
+
+    def put(self, key, data):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+    def get(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise e
+        return response["Body"].read()
+
+    def iter_lines(self, key):
+        response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        yield from response["Body"].iter_lines()
+
+    def list(self, prefix):
+        keys = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(
+            Bucket=self.bucket, Prefix=self.prefix + prefix, Delimiter="/"
+        ):
+            for item in page.get("Contents", []):
+                # fmt: off
+                keys.append(item["Key"][len(self.prefix):])
+                # fmt: on
+        return sorted(keys)
+
+
+def get_store(url):
+    """
+    Get a store from its URL
+    Args:
+        url (str): s3://bucket/prefix, file:///path or a directory path
+    Returns:
+        LocalStore/S3Store: Store
+    """
+    if url.startswith(S3_PREFIX):
+        # fmt: off
+        bucket, _, prefix = url[len(S3_PREFIX):].partition("/")
+        # fmt: on
+        return S3Store(bucket, prefix)
+    if url.startswith(FILE_PREFIX):
+        # fmt: off
+        url = url[len(FILE_PREFIX):]
+        # fmt: on
+    return LocalStore(url)
@@ -0,0 +1,165 @@
+"""summary.py: Streaming Markdown summary of annotation statistics."""
+
+# アノテーションを1回だけ走査して、レベル別の件数と件数の多いファイル・ルールを集計する。
+# ファイルとルールはSpace-Savingアルゴリズムで上位のみを保持するため、
+# 数百万件のアノテーションでもメモリ使用量は容量(capacity)で抑えられる。
+
+import heapq
+
+from prcb_checks.validator import MAX_OUTPUT_LENGTH
+
+DEFAULT_CAPACITY = 100
+DEFAULT_TOP = 10
+LEVELS = ("failure", "warning", "notice")
+# Markdownの表に載せる値の最大長
+MAX_CELL_LENGTH = 120
+
+
+class SpaceSaving:
+    """Space-Saving heavy hitters sketch with a bounded number of counters"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        # key -> [count, error]
+        self.counters = {}
+        # 最小のカウンタを探すためのヒープ。古いエントリは取り出すときに読み捨てる
+        self._heap = []
+
+    def _push(self, key, count):
+        heapq.heappush(self._heap, (count, key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c[0], k) for k, c in self.counters.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        while True:
+            count, key = heapq.heappop(self._heap)
+            counter = self.counters.get(key)
+            if counter is not None and counter[0] == count:
+                return key, counter
+
+    def update(self, key):
+        """
+        Count one occurrence of key
+        Args:
+            key (str): Item to count
+        """
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += 1
+        elif len(self.counters) < self.capacity:
+            counter = self.counters[key] = [1, 0]
+        else:
+            # 最小のカウンタを置き換え、その値を誤差の上限として引き継ぐ
+            evicted, (count, _) = self._pop_min()
+            del self.counters[evicted]
+            counter = self.counters[key] = [count + 1, count]
+        self._push(key, counter[0])
+
+    def top(self, n=DEFAULT_TOP):
+        """
+        Get the most frequent items
+        Args:
+            n (int): Number of items
+        Returns:
+            list: (key, count, error) tuples, most frequent first
+        """
+        items = sorted(self.counters.items(), key=lambda item: (-item[1][0], item[0]))
+        return [(key, count, error) for key, (count, error) in items[:n]]
+
+
+class AnnotationStats:
+    """One-pass statistics over an annotation stream"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.total = 0
+        self.levels = dict.fromkeys(LEVELS, 0)
+        self.files = SpaceSaving(capacity)
+        self.rules = SpaceSaving(capacity)
+
+    def update(self, annotation):
+        """
+        Add one annotation to the statistics
+        Args:
+            annotation (dict): Annotation object
+        """
+        self.total += 1
+        level = annotation.get("annotation_level")
+        self.levels[level] = self.levels.get(level, 0) + 1
+        self.files.update(annotation.get("path", ""))
+        rule = annotation.get("title")
+        if rule:
+            self.rules.update(rule)
+
+
+def _cell(value):
+    value = str(value).replace("|", "\\|").replace("\n", " ")
+    if len(value) > MAX_CELL_LENGTH:
+        value = "…" + value[-(MAX_CELL_LENGTH - 1) :]
+    return f"`{value}`"
+
+
+def _count(count, error):
+    # Space-Savingの件数は過大評価になりうるので、誤差がある場合は概数として表示する
+    return f"~{count}" if error else str(count)
+
+
+def _top_table(header, sketch, top):
+    rows = [f"| {header} | Count |", "|---|---:|"]
+    rows.extend(
+        f"| {_cell(key)} | {_count(count, error)} |"
+        for key, count, error in sketch.top(top)
+    )
+    return rows
+
+
+def render_summary(stats, top=DEFAULT_TOP, max_length=MAX_OUTPUT_LENGTH):
+    """
+    Render the statistics as a compact Markdown summary
+    Args:
+        stats (AnnotationStats): Collected statistics
+        top (int): Number of files and rules to list
+        max_length (int): Maximum length of the summary
+    Returns:
+        str: Markdown summary
+    """
+    if stats.total == 0:
+        return "No annotations."
+
+    levels = ", ".join(
+        f"{count} {level}" for level, count in stats.levels.items() if count
+    )
+    sections = [
+        [f"**{stats.total} annotations** ({levels})"],
+        ["| Level | Count |", "|---|---:|"]
+        + [f"| {level} | {count} |" for level, count in stats.levels.items()],
+        ["#### Top files", ""] + _top_table("File", stats.files, top),
+    ]
+    if stats.rules.counters:
+        sections.append(["#### Top rules", ""] + _top_table("Rule", stats.rules, top))
+
+    lines = []
+    length = 0
+    for section in sections:
+        for line in section + [""]:
+            # GitHubのサイズ上限を超える行は出力しない
+            if length + len(line) + 1 > max_length:
+                return "\n".join(lines).rstrip()
+            lines.append(line)
+            length += len(line) + 1
+    return "\n".join(lines).rstrip()
+
+
+def summarize_annotations(annotations, top=DEFAULT_TOP):
+    """
+    Build a Markdown summary from annotations in one pass
+    Args:
+        annotations (iterable): Annotation objects
+        top (int): Number of files and rules to list
+    Returns:
+        str: Markdown summary
+    """
+    stats = AnnotationStats()
+    for annotation in annotations:
+        stats.update(annotation)
+    return render_summary(stats, top)
@@ -0,0 +1,227 @@
+"""validator.py: Local validation of check-run payloads for prcb-checks."""
+
+# https://docs.github.com/en/rest/checks/runs?apiVersion=2022-11-28#create-a-check-run
+# GitHubが422で弾くペイロードをネットワークI/Oの前に検出する。
+# 検証ルールはモジュール読み込み時に一度だけ組み立て、呼び出し毎には表を引くだけにする。
+
+from collections.abc import Mapping
+
+STATUSES = frozenset(
+    ("queued", "in_progress", "completed", "waiting", "requested", "pending")
+)
+# GitHub Actionsだけが設定できるstatus (GitHub Appでは422になる)
+ACTIONS_ONLY_STATUSES = frozenset(("waiting", "requested", "pending"))
+CONCLUSIONS = frozenset(
+    (
+        "action_required",
+        "cancelled",
+        "failure",
+        "neutral",
+        "success",
+        "skipped",
+        "stale",
+        "timed_out",
+    )
+)
+ANNOTATION_LEVELS = frozenset(("notice", "warning", "failure"))
+
+MAX_ANNOTATIONS_PER_REQUEST = 50
+MAX_OUTPUT_LENGTH = 65535
+MAX_ANNOTATION_TITLE_LENGTH = 255
+# messageとraw_detailsの上限は文字数ではなくUTF-8のバイト数
+MAX_ANNOTATION_TEXT_BYTES = 64 * 1024
+
+
+def _string(max_length=None):
+    def check(value):
+        if not isinstance(value, str):
+            return "must be a string"
+        if max_length is not None and len(value) > max_length:
+            return f"must be at most {max_length} characters (got {len(value)})"
+        return None
+
+    return check
+
+
+def _utf8(max_bytes):
+    def check(value):
+        if not isinstance(value, str):
+            return "must be a string"
+        size = len(value.encode("utf-8"))
+        if size > max_bytes:
+            return f"must be at most {max_bytes} bytes in UTF-8 (got {size})"
+        return None
+
+    return check
+
+
+def _positive_int(value):
+    # boolはintのサブクラスなので明示的に除外する
+    if not isinstance(value, int) or isinstance(value, bool):
+        return "must be an integer"
+    if value < 1:
+        return f"must be >= 1 (got {value})"
+    return None
+
+
+def _one_of(choices):
+    allowed = ", ".join(sorted(choices))
+
+    def check(value):
+        if value not in choices:
+            return f"{value!r} is not one of {allowed}"
+        return None
+
+    return check
+
+
+# (key, required, check)
+_ANNOTATION_FIELDS = (
+    ("path", True, _string()),
+    ("start_line", True, _positive_int),
+    ("end_line", True, _positive_int),
+    ("start_column", False, _positive_int),
+    ("end_column", False, _positive_int),
+    ("annotation_level", True, _one_of(ANNOTATION_LEVELS)),
+    ("message", True, _utf8(MAX_ANNOTATION_TEXT_BYTES)),
+    ("title", False, _string(MAX_ANNOTATION_TITLE_LENGTH)),
+    ("raw_details", False, _utf8(MAX_ANNOTATION_TEXT_BYTES)),
+)
+
+_OUTPUT_FIELDS = (
+    ("title", True, _string()),
+    ("summary", True, _string(MAX_OUTPUT_LENGTH)),
+    ("text", False, _string(MAX_OUTPUT_LENGTH)),
+)
+
+_PAYLOAD_FIELDS = (
+    ("name", True, _string()),
+    ("head_sha", True, _string()),
+    ("status", False, _one_of(STATUSES)),
+    ("conclusion", False, _one_of(CONCLUSIONS)),
+)
+
+# 更新(PATCH)ではname/head_shaは任意
+_UPDATE_PAYLOAD_FIELDS = (
+    ("name", False, _string()),
+    ("status", False, _one_of(STATUSES)),
+    ("conclusion", False, _one_of(CONCLUSIONS)),
+)
+
+
+def _check_fields(obj, fields, prefix):
+    errors = []
+    for key, required, check in fields:
+        if key not in obj:
+            if required:
+                errors.append(f"{prefix}{key}: is required")
+            continue
+        message = check(obj[key])
+        if message is not None:
+            errors.append(f"{prefix}{key}: {message}")
+    return errors
+
+
+def validate_annotation(annotation, index=None):
+    """
+    Validate a single annotation object
+
+    Args:
+        annotation (dict/Mapping): Annotation object
+        index (int): Position of the annotation, used in error messages
+    Returns:
+        list: Violation messages (empty if valid)
+    """
+    label = "annotation" if index is None else f"annotations[{index}]"
+    if not isinstance(annotation, Mapping):
+        return [f"{label}: must be an object"]
+    prefix = f"{label}."
+
+    errors = _check_fields(annotation, _ANNOTATION_FIELDS, prefix)
+
+    start_line = annotation.get("start_line")
+    end_line = annotation.get("end_line")
+    lines_valid = _positive_int(start_line) is None and _positive_int(end_line) is None
+    if lines_valid and end_line < start_line:
+        errors.append(f"{prefix}end_line: must be >= start_line")
+
+    has_columns = "start_column" in annotation or "end_column" in annotation
+    if has_columns and lines_valid and start_line != end_line:
+        errors.append(
+            f"{prefix}start_column/end_column: "
+            "only allowed when start_line equals end_line"
+        )
+    start_column = annotation.get("start_column")
+    end_column = annotation.get("end_column")
+    columns_valid = (
+        _positive_int(start_column) is None and _positive_int(end_column) is None
+    )
+    if columns_valid and end_column < start_column:
+        errors.append(f"{prefix}end_column: must be >= start_column")
+
+    return errors
+
+
+def validate_check_run_payload(
+    payload, update=False, max_annotations=MAX_ANNOTATIONS_PER_REQUEST
+):
+    """
+    Validate a check-run payload and report every violation at once
+
+    Args:
+        payload (dict): Payload to be sent to the Check Runs API
+        update (bool): Validate as an update (PATCH) payload
+        max_annotations (int): Maximum number of annotations (None: unlimited)
+    Returns:
+        list: Violation messages (empty if valid)
+    """
+    fields = _UPDATE_PAYLOAD_FIELDS if update else _PAYLOAD_FIELDS
+    errors = _check_fields(payload, fields, "")
+
+    # conclusionを指定するとGitHubがstatusをcompletedにするため、他のstatusとの組み合わせは許す
+    status = payload.get("status")
+    conclusion = payload.get("conclusion")
+    if status in ACTIONS_ONLY_STATUSES:
+        errors.append(f"status: {status!r} can only be set by GitHub Actions")
+    if conclusion == "stale":
+        errors.append("conclusion: 'stale' can only be set by GitHub")
+    if status == "completed" and conclusion is None:
+        errors.append("conclusion: is required when status is 'completed'")
+
+    if "output" not in payload:
+        return errors
+
+    output = payload["output"]
+    if not isinstance(output, dict):
+        errors.append("output: must be an object")
+        return errors
+    errors.extend(_check_fields(output, _OUTPUT_FIELDS, "output."))
+
+    annotations = output.get("annotations")
+    if annotations is None:
+        return errors
+    # 循環importを避けるため、使うときにだけimportする
+    from prcb_checks.annotations import AnnotationStore
+
+    if isinstance(annotations, AnnotationStore):
+        # 各アノテーションは取り込み時に検証済み
+        if max_annotations is not None and annotations.parsed > max_annotations:
+            errors.append(
+                f"output.annotations: at most {max_annotations} "
+                f"annotations per request (got {annotations.parsed})"
+            )
+        errors.extend(f"output.{message}" for message in annotations.errors)
+        return errors
+    if not isinstance(annotations, list):
+        errors.append("output.annotations: must be an array")
+        return errors
+    if max_annotations is not None and len(annotations) > max_annotations:
+        errors.append(
+            f"output.annotations: at most {max_annotations} "
+            f"annotations per request (got {len(annotations)})"
+        )
+    for index, annotation in enumerate(annotations):
+        for message in validate_annotation(annotation, index):
+            errors.append(f"output.{message}")
+
+    return errors
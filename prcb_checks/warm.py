@@ -0,0 +1,52 @@
+"""warm.py: Prefetch credentials into the local cache (`prcb-checks warm`)."""
+
+# installフェーズでバックグラウンド実行しておくと、秘密鍵の取得・JWTの署名・
+# インストールアクセストークンの取得がpre_build以降のクリティカルパスから外れる。
+#   nohup prcb-checks warm > /dev/null 2>&1 &
+
+import os
+import sys
+
+from prcb_checks.cache import load_access_token, load_installation_id
+from prcb_checks.logger import logger
+from prcb_checks.main import (
+    get_access_token,
+    get_full_repository_name,
+    get_secret_value,
+)
+
+
+def warm_main(options, args):
+    """Entry point of `prcb-checks warm`"""
+    # 環境変数の不足をpre_buildより前に検出する
+    repository = get_full_repository_name()
+    try:
+        secret_id = os.environ["SECRETS_MANAGER_SECRETID"]
+    except KeyError as e:
+        logger.error(f"Error: Required environment variable not found: {e}")
+        sys.exit(1)
+
+    if get_cached_token(repository) is not None:
+        logger.info(f"Already warm for {repository}")
+        return
+
+    # インストールIDが未指定なら、トークンと一緒に索引にも保存される
+    get_access_token(get_secret_value(secret_id))
+    if get_cached_token(repository) is None:
+        logger.error("Error: Could not cache the installation access token")
+        sys.exit(1)
+    logger.info(f"Cached installation access token for {repository}")
+
+
+def get_cached_token(repository):
+    """
+    Get the cached token of the repository
+    Args:
+        repository (str): "owner/repo"
+    Returns:
+        tuple: (token, expires_at), or None
+    """
+    installation_id = os.environ.get(
+        "GITHUB_APP_INSTALLATION_ID"
+    ) or load_installation_id(repository)
+    return load_access_token(installation_id) if installation_id else None
@@ -1,10 +1,29 @@
 """テスト用の共通フィクスチャを定義するファイル"""
 
+import json
 import os
 import pytest
 from unittest.mock import patch, MagicMock
 
 
+def sent_payload(mock_call):
+    """ストリーミング送信されたリクエストボディを読み込む"""
+    return json.loads(b"".join(mock_call[1]["data"]))
+
+
+def make_annotation(line=1, **fields):
+    """テスト用のアノテーション (fieldsで各フィールドを上書きする)"""
+    annotation = {
+        "path": "src/main.py",
+        "start_line": line,
+        "end_line": line,
+        "annotation_level": "warning",
+        "message": f"Issue at line {line}",
+    }
+    annotation.update(fields)
+    return annotation
+
+
 @pytest.fixture
 def mock_environ():
     """テスト用の環境変数のモック"""
@@ -58,3 +77,11 @@ def mock_jwt():
     with patch("jwt.encode") as mock_encode:
         mock_encode.return_value = "mock-jwt-token"
         yield mock_encode
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """ローカルキャッシュをテストごとの一時ディレクトリにする"""
+    directory = tmp_path / "cache"
+    monkeypatch.setenv("PRCB_CHECKS_CACHE_DIR", str(directory))
+    return directory
@@ -0,0 +1,236 @@
+"""aggregate.pyのテスト"""
+
+import json
+import os
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from prcb_checks.aggregate import (
+    ShardMerger,
+    aggregate_main,
+    aggregate_shards,
+    get_shard_id,
+    worst_conclusion,
+    write_shard,
+)
+from prcb_checks.client import ChecksClientError
+from prcb_checks.store import LocalStore
+from tests.conftest import make_annotation
+
+
+def make_payload(conclusion, annotations):
+    return {
+        "name": "Lint",
+        "head_sha": "abcdef1234567890",
+        "status": "completed",
+        "conclusion": conclusion,
+        "output": {"title": "Lint", "summary": "s", "annotations": annotations},
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    """3シャード分の結果を書き込んだストア"""
+    store = LocalStore(str(tmp_path))
+    write_shard(store, make_payload("success", []), "shard-1")
+    write_shard(
+        store,
+        make_payload(
+            "failure",
+            [make_annotation(i, annotation_level="failure") for i in range(1, 31)],
+        ),
+        "shard-2",
+    )
+    write_shard(
+        store,
+        make_payload("neutral", [make_annotation(i) for i in range(1, 41)]),
+        "shard-3",
+    )
+    return store
+
+
+def make_options(**overrides):
+    options = {"shard_store": None, "dry_run": False, "expected_shards": None}
+    options.update(overrides)
+    return SimpleNamespace(**options)
+
+
+class TestConclusion:
+    """worst_conclusion関数のテスト"""
+
+    @pytest.mark.parametrize(
+        "current, conclusion, expected",
+        [
+            (None, "success", "success"),
+            ("failure", None, "failure"),
+            ("success", "neutral", "neutral"),
+            ("action_required", "failure", "action_required"),
+            ("timed_out", "cancelled", "timed_out"),
+        ],
+    )
+    def test_worst_conclusion(self, current, conclusion, expected):
+        assert worst_conclusion(current, conclusion) == expected
+
+
+class TestShardId:
+    """get_shard_id関数のテスト"""
+
+    @patch.dict(os.environ, {"CODEBUILD_BATCH_BUILD_IDENTIFIER": "lint_1"})
+    def test_batch_identifier(self):
+        assert get_shard_id() == "lint_1"
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_missing(self):
+        with pytest.raises(SystemExit):
+            get_shard_id()
+
+
+class TestShardMerger:
+    """シャードのマージのテスト"""
+
+    def test_merge(self, store):
+        """アノテーションを順に読み出しながらヘッダをマージするケース"""
+        merger = ShardMerger(store, "Lint", "abcdef1234567890")
+        annotations = list(merger.annotations())
+
+        assert len(annotations) == 70
+        assert merger.conclusion == "failure"
+        assert merger.counts == {"failure": 30, "warning": 40, "notice": 0}
+        assert merger.summary().startswith(
+            "Merged 3 shards.\n\n**70 annotations** (30 failure, 40 warning)"
+        )
+        assert "| shard-2 | failure | 30 | 0 | 0 |" in merger.text()
+
+    @pytest.mark.parametrize("expected_shards", [3, 2])
+    def test_expected_shards_present(self, store, expected_shards):
+        """期待した数以上のシャードがあればシャードのconclusionを使うケース"""
+        merger = ShardMerger(store, "Lint", "abcdef1234567890", expected_shards)
+        list(merger.annotations())
+
+        assert merger.missing() == 0
+        assert merger.final_conclusion() == "failure"
+        assert "expected shards" not in merger.text()
+
+    def test_missing_shard(self, tmp_path):
+        """結果を書く前に落ちたシャードがあれば、他が成功してもfailureにするケース"""
+        store = LocalStore(str(tmp_path))
+        write_shard(store, make_payload("success", []), "shard-1")
+        write_shard(store, make_payload("success", []), "shard-2")
+        merger = ShardMerger(store, "Lint", "abcdef1234567890", 3)
+        list(merger.annotations())
+
+        assert merger.conclusion == "success"
+        assert merger.missing() == 1
+        assert merger.final_conclusion() == "failure"
+        assert merger.summary().startswith(
+            "**1 of 3 expected shards did not write a result.**"
+        )
+        assert "did not write a result" in merger.text()
+
+    def test_no_conclusion(self, tmp_path):
+        store = LocalStore(str(tmp_path))
+        write_shard(store, {"name": "Lint", "head_sha": "sha"}, "shard-1")
+        merger = ShardMerger(store, "Lint", "sha")
+        list(merger.annotations())
+
+        assert merger.final_conclusion() == "neutral"
+
+    def test_other_check_is_ignored(self, store):
+        merger = ShardMerger(store, "Other", "abcdef1234567890")
+        assert merger.keys == []
+
+
+class TestAggregateShards:
+    """aggregate_shards関数のテスト"""
+
+    def test_aggregate(self, store):
+        """1つのチェックランにまとめて送信するケース"""
+        client = MagicMock()
+        client.create.return_value = {"id": 1}
+        client.add_annotations.side_effect = lambda _id, it, *_: len(list(it))
+
+        check_run = aggregate_shards(client, store, "Lint", "abcdef1234567890")
+
+        assert check_run == {"id": 1}
+        client.create.assert_called_once_with(
+            "Lint", head_sha="abcdef1234567890", status="in_progress"
+        )
+        kwargs = client.complete.call_args[1]
+        assert client.complete.call_args[0] == (1, "failure")
+        assert kwargs["title"] == "Lint"
+        assert kwargs["summary"].startswith("Merged 3 shards.")
+
+    def test_no_shards(self, tmp_path):
+        client = MagicMock()
+        assert (
+            aggregate_shards(client, LocalStore(str(tmp_path)), "Lint", "sha") is None
+        )
+        client.create.assert_not_called()
+
+
+class TestAggregateMain:
+    """aggregateサブコマンドのテスト"""
+
+    def test_aggregate(self, mock_environ, store):
+        with patch("prcb_checks.aggregate.ChecksClient") as mock_client_class:
+            client = mock_client_class.return_value.__enter__.return_value
+            client.create.return_value = {"id": 1}
+            aggregate_main(
+                make_options(shard_store=store.directory), ["Lint", "Title", "Sum"]
+            )
+
+        assert client.complete.call_args[1]["summary"] == "Sum"
+        assert client.complete.call_args[1]["title"] == "Title"
+
+    def test_dry_run(self, mock_environ, store, capsys):
+        with patch("prcb_checks.aggregate.ChecksClient") as mock_client_class:
+            aggregate_main(
+                make_options(shard_store=store.directory, dry_run=True), ["Lint"]
+            )
+
+        mock_client_class.assert_not_called()
+        assert "| shard-3 | neutral | 0 | 40 | 0 |" in capsys.readouterr().out
+
+    def test_no_shards(self, mock_environ, tmp_path):
+        with patch("prcb_checks.aggregate.ChecksClient") as mock_client_class:
+            mock_client_class.return_value.__enter__.return_value.create.return_value = {
+                "id": 1
+            }
+            with pytest.raises(SystemExit):
+                aggregate_main(make_options(shard_store=str(tmp_path)), ["Lint"])
+
+    def test_expected_shards(self, mock_environ, store, caplog):
+        options = make_options(shard_store=store.directory, expected_shards=4)
+        with patch("prcb_checks.aggregate.ChecksClient") as mock_client_class:
+            client = mock_client_class.return_value.__enter__.return_value
+            client.create.return_value = {"id": 1}
+            aggregate_main(options, ["Lint", "Title", "Sum"])
+
+        assert client.complete.call_args[0] == (1, "failure")
+        assert client.complete.call_args[1]["text"].startswith("**1 of 4 expected")
+        assert "1 of 4 shards are missing" in caplog.text
+
+    def test_client_error(self, mock_environ, store):
+        with patch("prcb_checks.aggregate.ChecksClient") as mock_client_class:
+            mock_client_class.side_effect = ChecksClientError("boom")
+            with pytest.raises(SystemExit):
+                aggregate_main(make_options(shard_store=store.directory), ["Lint"])
+
+    @pytest.mark.parametrize(
+        "options, args",
+        [
+            (make_options(shard_store="/tmp"), []),
+            (make_options(), ["Lint"]),
+            (make_options(shard_store="/tmp", expected_shards=0), ["Lint"]),
+        ],
+    )
+    def test_usage_errors(self, options, args):
+        with pytest.raises(SystemExit):
+            aggregate_main(options, args)
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_missing_head_sha(self, tmp_path):
+        with pytest.raises(SystemExit):
+            aggregate_main(make_options(shard_store=str(tmp_path)), ["Lint"])
@@ -0,0 +1,182 @@
+"""annotations.pyのテスト"""
+
+import io
+import json
+
+import pytest
+
+from prcb_checks.annotations import (
+    AnnotationStore,
+    AnnotationView,
+    json_default,
+    parse_annotations,
+)
+from prcb_checks.main import parse_annotations_file, serialize_payload
+from prcb_checks.validator import validate_check_run_payload
+from tests.conftest import make_annotation
+
+FULL_ANNOTATION = make_annotation(
+    3,
+    start_column=2,
+    end_column=8,
+    annotation_level="failure",
+    title="E501",
+    raw_details="line too long",
+)
+
+
+class TestAnnotationStore:
+    """AnnotationStoreクラスのテスト"""
+
+    def test_round_trip(self):
+        """取り込んだアノテーションをそのまま取り出せるケース"""
+        annotations = [make_annotation(1), FULL_ANNOTATION, make_annotation(2)]
+        store = AnnotationStore(annotations)
+
+        assert len(store) == 3
+        assert store.to_list() == annotations
+        assert list(store) == annotations
+        assert json.loads(json.dumps(store, default=json_default)) == annotations
+
+    def test_shared_strings(self):
+        """同じpath・titleの文字列は1つだけ保持するケース"""
+        store = AnnotationStore(
+            make_annotation(i, title="E501") for i in range(1, 1001)
+        )
+
+        assert len(store._strings) == 2
+        assert store[999]["path"] == "src/main.py"
+        assert store[999]["title"] == "E501"
+
+    def test_view(self):
+        store = AnnotationStore([make_annotation(1), FULL_ANNOTATION])
+        view = store[-1]
+
+        assert isinstance(view, AnnotationView)
+        assert view == FULL_ANNOTATION
+        assert view.to_dict() == FULL_ANNOTATION
+        assert len(view) == len(FULL_ANNOTATION)
+        assert view["start_line"] == view["end_line"] == 3
+        assert view["annotation_level"] == "failure"
+        assert view["message"] == "Issue at line 3"
+        assert view["raw_details"] == "line too long"
+        assert view.get("title") == "E501"
+        assert store[0].get("start_column") is None
+        assert "E501" in repr(view)
+        with pytest.raises(AttributeError):
+            view.extra = 1
+
+    def test_slice(self):
+        store = AnnotationStore(make_annotation(i) for i in range(1, 121))
+
+        assert [len(store[i : i + 50]) for i in range(0, 120, 50)] == [50, 50, 20]
+        assert store[100:][0]["start_line"] == 101
+        with pytest.raises(IndexError):
+            store[120]
+
+    def test_invalid(self):
+        """不正なアノテーションは取り込まずにエラーを記録するケース"""
+        store = AnnotationStore(
+            [
+                make_annotation(1),
+                {"path": "a.py"},
+                make_annotation(2**63),
+                "not an object",
+            ]
+        )
+
+        assert len(store) == 1
+        assert store.parsed == 4
+        assert "annotations[1].start_line: is required" in store.errors
+        assert "annotations[2]: line or column is too large" in store.errors
+        assert "annotations[3]: must be an object" in store.errors
+
+    def test_json_default_error(self):
+        with pytest.raises(TypeError):
+            json_default(object())
+
+
+class TestParseAnnotations:
+    """parse_annotations関数のテスト"""
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+    def test_chunks(self, chunk_size):
+        """要素や数値が読み込み単位の境界で切れても同じ結果になるケース"""
+        annotations = [make_annotation(i) for i in range(1, 30)] + [FULL_ANNOTATION]
+        document = json.dumps(annotations, indent=2)
+
+        store = parse_annotations(io.StringIO(document), chunk_size)
+
+        assert store.to_list() == annotations
+
+    @pytest.mark.parametrize("document", ["[]", " [ ] \n", "[\n]"])
+    def test_empty(self, document):
+        store = parse_annotations(io.StringIO(document), 1)
+
+        assert len(store) == 0
+        assert store.parsed == 0
+
+    def test_not_an_array(self):
+        """配列でない場合はそのまま返し、検証でエラーにするケース"""
+        assert parse_annotations(io.StringIO('{"path": "a.py"}')) == {"path": "a.py"}
+
+    @pytest.mark.parametrize(
+        "document", ["", "[", "[1,]", "[1 2]", "[1] x", '[{"path": }]', "[tru"]
+    )
+    def test_invalid_json(self, document):
+        """標準のパーサーと同じエラーになるケース"""
+        with pytest.raises(json.JSONDecodeError) as expected:
+            json.loads(document)
+        with pytest.raises(json.JSONDecodeError) as e:
+            parse_annotations(io.StringIO(document), 2)
+
+        assert str(e.value) == str(expected.value)
+
+    def test_validation(self):
+        """検証結果はペイロードの検証で報告するケース"""
+        document = json.dumps([make_annotation(i) for i in range(1, 52)] + [{}])
+        payload = {
+            "name": "Lint",
+            "head_sha": "abc",
+            "output": {
+                "title": "Lint",
+                "summary": "s",
+                "annotations": parse_annotations(io.StringIO(document)),
+            },
+        }
+
+        errors = validate_check_run_payload(payload)
+
+        assert "output.annotations: at most 50 annotations per request (got 52)" in (
+            errors
+        )
+        assert "output.annotations[51].path: is required" in errors
+        assert validate_check_run_payload(payload, max_annotations=None) == [
+            e for e in errors if "at most" not in e
+        ]
+        assert json.loads(serialize_payload(payload))["output"]["annotations"][0] == (
+            make_annotation(1)
+        )
+
+
+class TestParseAnnotationsFile:
+    """parse_annotations_file関数のテスト"""
+
+    def test_file(self, tmp_path):
+        path = tmp_path / "annotations.json"
+        path.write_text(json.dumps([FULL_ANNOTATION]))
+
+        assert parse_annotations_file(str(path)).to_list() == [FULL_ANNOTATION]
+
+    def test_invalid_json(self, tmp_path, caplog):
+        path = tmp_path / "annotations.json"
+        path.write_text("[{")
+
+        with pytest.raises(SystemExit):
+            parse_annotations_file(str(path))
+        assert "Error parsing JSON in file" in caplog.text
+
+    def test_missing(self, tmp_path, capsys):
+        with pytest.raises(SystemExit):
+            parse_annotations_file(str(tmp_path / "missing.json"))
+        assert "Error reading file" in capsys.readouterr().out
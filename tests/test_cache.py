@@ -0,0 +1,92 @@
+"""cache.pyのテスト"""
+
+import os
+import stat
+import time
+
+from prcb_checks.cache import (
+    get_cache_dir,
+    load_access_token,
+    load_installation_id,
+    read_json,
+    save_access_token,
+    save_installation_id,
+    write_json,
+)
+
+
+class TestGetCacheDir:
+    """get_cache_dir関数のテスト"""
+
+    def test_cache_dir_from_environment(self, cache_dir):
+        """PRCB_CHECKS_CACHE_DIRの下にディレクトリを作成するケース"""
+        directory = get_cache_dir("delta")
+
+        assert directory == str(cache_dir / "delta")
+        assert os.path.isdir(directory)
+        assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+
+    def test_xdg_cache_home(self, monkeypatch, tmp_path):
+        """XDG_CACHE_HOMEを使うケース"""
+        monkeypatch.delenv("PRCB_CHECKS_CACHE_DIR")
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+
+        assert get_cache_dir() == str(tmp_path / "xdg" / "prcb-checks")
+
+
+class TestJsonCache:
+    """read_json/write_json関数のテスト"""
+
+    def test_roundtrip(self, cache_dir):
+        write_json("index", "a.json", {"key": "value"})
+
+        assert read_json("index", "a.json") == {"key": "value"}
+        assert stat.S_IMODE(os.stat(cache_dir / "index" / "a.json").st_mode) == 0o600
+
+    def test_missing_or_broken(self, cache_dir):
+        assert read_json("index", "missing.json") is None
+        (cache_dir / "index" / "broken.json").write_text("{")
+        assert read_json("index", "broken.json") is None
+
+
+class TestAccessTokenCache:
+    """トークンのキャッシュのテスト"""
+
+    def test_valid_token(self):
+        expires_at = save_access_token("67890", "token", "2099-01-01T00:00:00Z")
+
+        assert load_access_token("67890") == ("token", expires_at)
+        assert load_access_token("other") is None
+
+    def test_expiring_token(self):
+        """有効期限が近いトークンは使わないケース"""
+        expires_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 60))
+        save_access_token("67890", "token", expires_at)
+
+        assert load_access_token("67890") is None
+
+
+class TestInstallationIndex:
+    """リポジトリ→インストールIDの索引のテスト"""
+
+    def test_roundtrip(self):
+        save_installation_id("org-a/repo", 111)
+        save_installation_id("org-b/repo", "222")
+
+        assert load_installation_id("org-a/repo") == "111"
+        assert load_installation_id("org-b/repo") == "222"
+        assert load_installation_id("org-c/repo") is None
+
+    def test_expired_entry(self):
+        """TTLを過ぎたエントリは使わず、次の書き込みで捨てるケース"""
+        save_installation_id("org-a/repo", "111", ttl=-1)
+        assert load_installation_id("org-a/repo") is None
+
+        save_installation_id("org-b/repo", "222")
+        assert list(read_json("installations", "index.json")) == ["org-b/repo"]
+
+    def test_forget(self):
+        save_installation_id("org-a/repo", "111")
+        save_installation_id("org-a/repo", None)
+
+        assert load_installation_id("org-a/repo") is None
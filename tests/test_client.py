@@ -0,0 +1,498 @@
+"""client.pyのテスト"""
+
+import asyncio
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+from botocore.exceptions import ClientError, NoCredentialsError, ReadTimeoutError
+
+from prcb_checks.cache import load_installation_id, save_installation_id
+from prcb_checks.client import (
+    AsyncChecksClient,
+    ChecksClient,
+    ChecksClientError,
+    ChecksClientTimeout,
+)
+from prcb_checks.deadline import Deadline, DeadlineExceeded
+from tests.conftest import make_annotation, sent_payload
+
+
+def make_response(status_code, body):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = body
+    return response
+
+
+def token_response(expires_in=3600):
+    expires_at = time.strftime(
+        "%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + expires_in)
+    )
+    return make_response(201, {"token": "mock-token", "expires_at": expires_at})
+
+
+@pytest.fixture
+def mock_session():
+    """requests.Sessionのモック"""
+    session = MagicMock()
+    session.post.return_value = token_response()
+    session.request.return_value = make_response(201, {"id": 12345})
+    return session
+
+
+@pytest.fixture
+def client(mock_environ, mock_jwt, mock_session):
+    """テスト用のクライアント"""
+    return ChecksClient(private_key=b"mock-private-key", session=mock_session)
+
+
+class TestChecksClientAuth:
+    """認証まわりのテスト"""
+
+    def test_defaults_from_environment(self, client):
+        """環境変数から設定を読み込むケース"""
+        assert client.repository == "test-owner/test-repo"
+        assert client.app_id == "12345"
+        assert client.installation_id == "67890"
+
+    def test_token_is_cached(self, client, mock_session):
+        """有効期限内のトークンは再利用されるケース"""
+        assert client.get_token() == "mock-token"
+        assert client.get_token() == "mock-token"
+
+        mock_session.post.assert_called_once()
+        assert mock_session.post.call_args[0][0] == (
+            "https://api.github.com/app/installations/67890/access_tokens"
+        )
+
+    def test_token_is_shared_through_cache(self, mock_environ, mock_jwt, mock_session):
+        """他のクライアント(プロセス)が取得したトークンを再利用するケース"""
+        ChecksClient(private_key=b"k", session=mock_session).get_token()
+        other = ChecksClient(private_key=b"k", session=mock_session)
+
+        assert other.get_token() == "mock-token"
+        mock_session.post.assert_called_once()
+
+    def test_token_is_refreshed_before_expiry(self, client, mock_session):
+        """有効期限が近いトークンは更新されるケース"""
+        mock_session.post.return_value = token_response(expires_in=60)
+
+        client.get_token()
+        client.get_token()
+
+        assert mock_session.post.call_count == 2
+
+    def test_private_key_from_secrets_manager(
+        self, mock_environ, mock_jwt, mock_boto3_client, mock_session
+    ):
+        """秘密鍵をSecrets Managerから一度だけ取得するケース"""
+        client = ChecksClient(session=mock_session)
+        client.get_token()
+
+        mock_boto3_client.get_secret_value.assert_called_once_with(
+            SecretId="github-app-private-key"
+        )
+        assert mock_jwt.call_args[0][1] == "mock-private-key"
+
+    def test_missing_private_key(self, mock_session):
+        """秘密鍵もシークレットIDも無いケース"""
+        with patch.dict("os.environ", {}, clear=True):
+            client = ChecksClient(
+                repository="o/r", app_id="1", installation_id="2", session=mock_session
+            )
+        with pytest.raises(ChecksClientError):
+            client.get_token()
+
+    def test_missing_app_id(self, mock_session):
+        """GitHub AppのIDが無いケース"""
+        with patch.dict("os.environ", {}, clear=True):
+            client = ChecksClient(
+                repository="o/r", private_key=b"k", session=mock_session
+            )
+        with pytest.raises(ChecksClientError):
+            client.get_token()
+
+    def test_token_error(self, client, mock_session):
+        """トークンの取得に失敗するケース"""
+        mock_session.post.return_value = make_response(401, {})
+
+        with pytest.raises(ChecksClientError) as excinfo:
+            client.get_token()
+
+        assert excinfo.value.status_code == 401
+
+    def test_retry_once_on_unauthorized(self, client, mock_session):
+        """401の場合はトークンを更新して一度だけ再送するケース"""
+        mock_session.request.side_effect = [
+            make_response(401, {}),
+            make_response(201, {"id": 1}),
+        ]
+
+        assert client.create("test-check") == {"id": 1}
+        assert mock_session.post.call_count == 2
+        assert mock_session.request.call_count == 2
+
+    def test_default_session_and_close(self, mock_environ):
+        """セッションを生成し、closeで閉じるケース"""
+        with patch("requests.Session") as mock_session_class:
+            with ChecksClient(private_key=b"k") as client:
+                pass
+
+        mock_session_class.return_value.mount.assert_called_once()
+        client.session.close.assert_called_once()
+
+    def test_discover_installation(self, mock_environ, mock_jwt, mock_session):
+        """インストールIDを探し、索引に保存して再利用するケース"""
+        mock_session.get.return_value = make_response(200, {"id": 424242})
+        with patch.dict("os.environ"):
+            del os.environ["GITHUB_APP_INSTALLATION_ID"]
+            client = ChecksClient(private_key=b"k", session=mock_session)
+            client.get_token()
+            other = ChecksClient(private_key=b"k", session=mock_session)
+
+        assert mock_session.get.call_args[0][0] == (
+            "https://api.github.com/repos/test-owner/test-repo/installation"
+        )
+        assert mock_session.post.call_args[0][0] == (
+            "https://api.github.com/app/installations/424242/access_tokens"
+        )
+        assert load_installation_id("test-owner/test-repo") == "424242"
+        assert other.get_token() == "mock-token"
+        mock_session.get.assert_called_once()
+        mock_session.post.assert_called_once()
+
+    def test_not_installed(self, mock_environ, mock_jwt, mock_session):
+        """GitHub Appがインストールされていないケース"""
+        mock_session.get.return_value = make_response(404, {})
+        client = ChecksClient("o/r", private_key=b"k", session=mock_session)
+        client.installation_id = None
+
+        with pytest.raises(ChecksClientError) as excinfo:
+            client.get_token()
+
+        assert excinfo.value.status_code == 404
+        assert load_installation_id("o/r") is None
+
+    def test_stale_index(self, mock_environ, mock_jwt, mock_session):
+        """索引のインストールIDが失効していれば、索引から消して探し直すケース"""
+        save_installation_id("o/r", "111")
+        mock_session.get.return_value = make_response(200, {"id": 424242})
+        mock_session.post.side_effect = [make_response(404, {}), token_response()]
+        client = ChecksClient("o/r", private_key=b"k", session=mock_session)
+        client.installation_id = None
+
+        assert client.get_token() == "mock-token"
+
+        assert [args[0][0] for args in mock_session.post.call_args_list] == [
+            "https://api.github.com/app/installations/111/access_tokens",
+            "https://api.github.com/app/installations/424242/access_tokens",
+        ]
+        assert load_installation_id("o/r") == "424242"
+
+    def test_for_repository(self, client, mock_session):
+        """複数のリポジトリでトークンプールと接続を共有するケース"""
+        mock_session.get.side_effect = [
+            make_response(200, {"id": 1}),
+            make_response(200, {"id": 2}),
+        ]
+        a = client.for_repository("org-a/repo")
+        b = client.for_repository("org-b/repo")
+        a2 = client.for_repository("org-a/repo")
+
+        for repo_client in (a, b, a2, client):
+            repo_client.create("test-check", head_sha="abc")
+
+        assert a.session is client.session
+        assert a.token_pool is client.token_pool
+        assert mock_session.get.call_count == 2
+        assert [c[0][0].split("/")[-2] for c in mock_session.post.call_args_list] == [
+            "1",
+            "2",
+            "67890",
+        ]
+        assert mock_session.request.call_args_list[1][0][1] == (
+            "https://api.github.com/repos/org-b/repo/check-runs"
+        )
+
+    def test_deadline_caps_timeout(self, mock_environ, mock_jwt, mock_session):
+        """期限で各リクエストのタイムアウトを頭打ちにするケース"""
+        client = ChecksClient(
+            private_key=b"mock-private-key",
+            session=mock_session,
+            deadline=Deadline(10.0, 1.0, 30.0),
+        )
+        client.create("test-check", status="in_progress")
+
+        assert mock_session.post.call_args[1]["timeout"][1] <= 3.0
+        assert 3.0 < mock_session.request.call_args[1]["timeout"][1] <= 10.0
+
+
+class TestChecksClientErrors:
+    """ライブラリとしてChecksClientErrorだけを送出することのテスト"""
+
+    @patch.dict("os.environ", {}, clear=True)
+    def test_unknown_repository(self):
+        """リポジトリが分からなくてもプロセスを終了しないケース"""
+        with pytest.raises(ChecksClientError, match="CODEBUILD_INITIATOR"):
+            ChecksClient()
+
+    def test_unsupported_initiator(self, mock_environ):
+        with patch.dict("os.environ", {"CODEBUILD_INITIATOR": "user/me"}):
+            with pytest.raises(ChecksClientError, match="Unsupported"):
+                ChecksClient()
+
+    @pytest.mark.parametrize(
+        "error",
+        [
+            ClientError({"Error": {"Code": "AccessDeniedException"}}, "GetSecretValue"),
+            NoCredentialsError(),
+        ],
+    )
+    def test_secrets_manager_error(
+        self, mock_environ, mock_boto3_client, mock_session, error
+    ):
+        mock_boto3_client.get_secret_value.side_effect = error
+        client = ChecksClient(session=mock_session)
+
+        with pytest.raises(ChecksClientError) as excinfo:
+            client.get_token()
+        assert excinfo.value.__cause__ is error
+
+    def test_secrets_manager_timeout(
+        self, mock_environ, mock_boto3_client, mock_session
+    ):
+        error = ReadTimeoutError(endpoint_url="https://secretsmanager")
+        mock_boto3_client.get_secret_value.side_effect = error
+        client = ChecksClient(session=mock_session)
+
+        with pytest.raises(ChecksClientTimeout):
+            client.get_token()
+
+    def test_missing_region(self, mock_environ, mock_session):
+        with patch.dict("os.environ", {"AWS_REGION": ""}):
+            client = ChecksClient(session=mock_session)
+            with pytest.raises(ChecksClientError, match="AWS_REGION"):
+                client.get_token()
+
+    def test_token_connection_error(self, client, mock_session):
+        error = requests.ConnectionError("refused")
+        mock_session.post.side_effect = error
+
+        with pytest.raises(ChecksClientError) as excinfo:
+            client.get_token()
+        assert excinfo.value.__cause__ is error
+
+    def test_discovery_connection_error(self, mock_environ, mock_jwt, mock_session):
+        mock_session.get.side_effect = requests.ConnectionError("refused")
+        client = ChecksClient("o/r", private_key=b"k", session=mock_session)
+        client.installation_id = None
+
+        with pytest.raises(ChecksClientError, match="discovering the installation"):
+            client.get_token()
+
+    def test_request_connection_error(self, client, mock_session):
+        mock_session.request.side_effect = requests.ConnectionError("reset")
+
+        with pytest.raises(ChecksClientError) as excinfo:
+            client.create("test-check")
+        assert not isinstance(excinfo.value, ChecksClientTimeout)
+
+    def test_request_timeout(self, client, mock_session):
+        """タイムアウトは期限切れとしても扱えるケース"""
+        mock_session.request.side_effect = requests.ReadTimeout("slow")
+
+        with pytest.raises(ChecksClientTimeout) as excinfo:
+            client.create("test-check")
+        assert isinstance(excinfo.value, DeadlineExceeded)
+
+    @pytest.mark.parametrize(
+        "body",
+        [{"token": "mock-token"}, {"expires_at": "2030-01-01T00:00:00Z"}, []],
+    )
+    def test_token_malformed_response(self, client, mock_session, body):
+        """201でも必要なキーがない応答はChecksClientErrorにするケース"""
+        mock_session.post.return_value = make_response(201, body)
+
+        with pytest.raises(ChecksClientError, match="Invalid response"):
+            client.get_token()
+
+    def test_request_invalid_json(self, client, mock_session):
+        response = make_response(201, None)
+        response.json.side_effect = ValueError("Expecting value")
+        mock_session.request.return_value = response
+
+        with pytest.raises(ChecksClientError, match="Invalid response"):
+            client.create("test-check")
+
+    def test_deadline_exceeded(self, mock_environ, mock_jwt, mock_session):
+        client = ChecksClient(
+            private_key=b"k", session=mock_session, deadline=Deadline(0.0)
+        )
+
+        with pytest.raises(ChecksClientTimeout):
+            client.create("test-check")
+
+
+class TestChecksClientOperations:
+    """チェックラン操作のテスト"""
+
+    def test_create(self, client, mock_session):
+        """チェックランを作成するケース"""
+        result = client.create("test-check", status="in_progress")
+
+        assert result == {"id": 12345}
+        method, url = mock_session.request.call_args[0]
+        assert method == "POST"
+        assert url == "https://api.github.com/repos/test-owner/test-repo/check-runs"
+        kwargs = mock_session.request.call_args[1]
+        assert kwargs["headers"]["Authorization"] == "Bearer mock-token"
+        assert sent_payload(mock_session.request.call_args) == {
+            "name": "test-check",
+            "head_sha": "abcdef1234567890",
+            "status": "in_progress",
+        }
+
+    def test_create_with_head_sha(self, client, mock_session):
+        """head_shaを指定してチェックランを作成するケース"""
+        client.create("test-check", head_sha="fedcba")
+
+        assert sent_payload(mock_session.request.call_args)["head_sha"] == "fedcba"
+
+    def test_create_splits_annotations(self, client, mock_session):
+        """50件を超えるアノテーションを分割して送信するケース"""
+        annotations = [make_annotation(i) for i in range(1, 121)]
+
+        client.create(
+            "test-check",
+            conclusion="failure",
+            title="Title",
+            summary="Summary",
+            annotations=annotations,
+        )
+
+        calls = mock_session.request.call_args_list
+        assert [c[0][0] for c in calls] == ["POST", "PATCH", "PATCH"]
+        sent = [a for c in calls for a in sent_payload(c)["output"]["annotations"]]
+        assert sent == annotations
+        assert calls[1][0][1].endswith("/check-runs/12345")
+
+    def test_create_invalid_payload(self, client, mock_session):
+        """不正なペイロードは送信前にエラーになるケース"""
+        with pytest.raises(ChecksClientError) as excinfo:
+            client.create("test-check", status="completed", summary="Summary")
+
+        assert "conclusion: is required when status is 'completed'" in (
+            excinfo.value.errors
+        )
+        assert "output.title: is required" in excinfo.value.errors
+        mock_session.request.assert_not_called()
+
+    def test_create_missing_head_sha(self, mock_jwt, mock_session):
+        """head_shaが解決できないケース"""
+        with patch.dict("os.environ", {}, clear=True):
+            client = ChecksClient(
+                repository="o/r", private_key=b"k", session=mock_session
+            )
+            with pytest.raises(ChecksClientError):
+                client.create("test-check")
+
+    def test_update(self, client, mock_session):
+        """チェックランを更新するケース"""
+        mock_session.request.return_value = make_response(200, {"id": 12345})
+
+        client.update(12345, status="in_progress", title="Title", summary="Summary")
+
+        method, url = mock_session.request.call_args[0]
+        assert method == "PATCH"
+        assert url.endswith("/check-runs/12345")
+        assert sent_payload(mock_session.request.call_args) == {
+            "status": "in_progress",
+            "output": {"title": "Title", "summary": "Summary"},
+        }
+
+    def test_update_serialized(self, client, mock_session):
+        """シリアライズ済みのボディでチェックランを更新するケース"""
+        mock_session.request.return_value = make_response(200, {"id": 12345})
+
+        client.update_serialized(12345, b'{"status": "completed"}')
+
+        assert mock_session.request.call_args[0] == (
+            "PATCH",
+            "https://api.github.com/repos/test-owner/test-repo/check-runs/12345",
+        )
+        assert mock_session.request.call_args[1]["data"] == b'{"status": "completed"}'
+
+    def test_add_annotations(self, client, mock_session):
+        """アノテーションを50件ずつ追加するケース"""
+        mock_session.request.return_value = make_response(200, {"id": 12345})
+        annotations = (make_annotation(i) for i in range(1, 101))
+
+        assert client.add_annotations(12345, annotations, "Title", "Summary") == 100
+        assert mock_session.request.call_count == 2
+
+    def test_complete(self, client, mock_session):
+        """チェックランを完了するケース"""
+        mock_session.request.return_value = make_response(200, {"id": 12345})
+
+        client.complete(12345, "success", title="Title", summary="Summary")
+
+        payload = sent_payload(mock_session.request.call_args)
+        assert payload["status"] == "completed"
+        assert payload["conclusion"] == "success"
+
+    def test_api_error(self, client, mock_session):
+        """APIがエラーを返すケース"""
+        mock_session.request.return_value = make_response(422, {})
+
+        with pytest.raises(ChecksClientError) as excinfo:
+            client.create("test-check")
+
+        assert excinfo.value.status_code == 422
+
+
+class TestAsyncChecksClient:
+    """AsyncChecksClientのテスト"""
+
+    def test_complete_positional_output(self, mock_environ, mock_jwt, mock_session):
+        """同期版と同じく出力を位置引数で渡せるケース"""
+
+        async def run():
+            async with AsyncChecksClient(
+                private_key=b"k", session=mock_session
+            ) as client:
+                await client.complete(1, "failure", "Unit Tests", "3 failures")
+
+        asyncio.run(run())
+
+        payload = sent_payload(mock_session.request.call_args)
+        assert payload["conclusion"] == "failure"
+        assert payload["output"] == {"title": "Unit Tests", "summary": "3 failures"}
+
+    def test_concurrent_checks(self, mock_environ, mock_jwt, mock_session):
+        """複数のチェックを並行して報告するケース"""
+
+        async def run():
+            async with AsyncChecksClient(
+                private_key=b"k", session=mock_session
+            ) as client:
+                assert client.repository == "test-owner/test-repo"
+                assert await client.get_token() == "mock-token"
+                check_runs = await asyncio.gather(
+                    *(client.create(f"check-{i}") for i in range(5))
+                )
+                await client.update(12345, status="in_progress")
+                await client.add_annotations(
+                    12345, [make_annotation(1)], "Title", "Summary"
+                )
+                await client.complete(12345, "success")
+                return check_runs
+
+        check_runs = asyncio.run(run())
+
+        assert len(check_runs) == 5
+        # トークンは共有され、一度だけ取得される
+        mock_session.post.assert_called_once()
+        mock_session.close.assert_called_once()
@@ -0,0 +1,144 @@
+"""deadline.pyのテスト"""
+
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from prcb_checks.deadline import Deadline, DeadlineExceeded, parse_duration
+from prcb_checks.main import get_access_token, main
+
+
+class TestParseDuration:
+    """parse_duration関数のテスト"""
+
+    @pytest.mark.parametrize(
+        "value,expected",
+        [("10", 10.0), ("10s", 10.0), ("500ms", 0.5), ("2m", 120.0), ("1.5s", 1.5)],
+    )
+    def test_valid(self, value, expected):
+        assert parse_duration(value) == expected
+
+    @pytest.mark.parametrize("value", ["", "ten", "10h", "-1s"])
+    def test_invalid(self, value):
+        with pytest.raises(ValueError):
+            parse_duration(value)
+
+
+class TestDeadline:
+    """Deadlineクラスのテスト"""
+
+    def test_no_deadline(self):
+        """期限がない場合は設定したタイムアウトをそのまま使うケース"""
+        deadline = Deadline(connect_timeout=3.0, read_timeout=7.0)
+
+        assert deadline.remaining() is None
+        assert not deadline.expired()
+        assert deadline.timeout("token") == (3.0, 7.0)
+        config = deadline.boto_config("secret")
+        assert config.connect_timeout == 3.0
+        assert config.read_timeout == 7.0
+
+    @patch("time.monotonic")
+    def test_phase_budget(self, mock_monotonic):
+        """フェーズの割合と残り時間でタイムアウトを頭打ちにするケース"""
+        mock_monotonic.return_value = 100.0
+        deadline = Deadline(10.0)
+
+        assert deadline.timeout("secret") == (1.5, 1.5)
+        assert deadline.boto_config("secret").retries == {"total_max_attempts": 1}
+
+        mock_monotonic.return_value = 108.0
+        assert deadline.timeout("token") == (1.0, 1.0)
+        assert deadline.timeout("check_run") == (1.0, 1.0)
+
+    @patch("time.monotonic")
+    def test_split_budget(self, mock_monotonic):
+        """接続・読み込みの合計が持ち時間を超えないよう、設定値の比で分けるケース"""
+        mock_monotonic.return_value = 100.0
+        deadline = Deadline(100.0, 1.0, 5.0)
+
+        assert deadline.timeout("token") == (1.0, 5.0)
+        assert deadline.timeout("check_run") == (1.0, 5.0)
+        assert sum(Deadline(10.0, 1.0, 5.0).timeout("token")) == pytest.approx(3.0)
+
+    @patch("time.monotonic")
+    def test_phase_counted_from_first_request(self, mock_monotonic):
+        """同じフェーズで続けて送る場合は、最初のリクエストからの経過時間を差し引くケース"""
+        mock_monotonic.return_value = 100.0
+        deadline = Deadline(10.0, 1.0, 5.0)
+        assert sum(deadline.timeout("token")) == pytest.approx(3.0)
+
+        mock_monotonic.return_value = 102.0
+        assert sum(deadline.timeout("token")) == pytest.approx(1.0)
+
+        mock_monotonic.return_value = 103.5
+        with pytest.raises(DeadlineExceeded):
+            deadline.timeout("token")
+        assert sum(deadline.timeout("check_run")) == pytest.approx(6.0)
+
+    @patch("time.monotonic")
+    def test_expired(self, mock_monotonic):
+        """持ち時間を使い切った場合は送信前にエラーにするケース"""
+        mock_monotonic.return_value = 100.0
+        deadline = Deadline(1.0)
+        mock_monotonic.return_value = 101.0
+
+        assert deadline.expired()
+        with pytest.raises(DeadlineExceeded):
+            deadline.timeout("check_run")
+
+    def test_access_token_timeout(self, mock_environ, mock_jwt, mock_requests):
+        """トークン取得のリクエストに期限を反映するケース"""
+        mock_post, _ = mock_requests
+
+        get_access_token(b"mock-private-key", Deadline(10.0, 1.0, 5.0))
+
+        connect_timeout, read_timeout = mock_post.call_args[1]["timeout"]
+        assert connect_timeout == pytest.approx(0.5, abs=0.01)
+        assert 2.45 < read_timeout <= 2.5
+
+
+ARGV = [
+    "prcb-checks",
+    "--deadline",
+    "10s",
+    "test-check",
+    "completed",
+    "success",
+    "Test Title",
+    "Test Summary",
+]
+
+
+class TestOnDeadline:
+    """--on-deadlineオプションのテスト"""
+
+    @patch("sys.argv", ARGV)
+    def test_fail(self, mock_environ, mock_boto3_client, mock_jwt, mock_requests):
+        """既定ではタイムアウトで失敗するケース"""
+        mock_post, _ = mock_requests
+        mock_post.side_effect = requests.ConnectTimeout("timed out")
+
+        with pytest.raises(SystemExit) as e:
+            main()
+        assert e.value.code == 1
+
+    @patch("sys.argv", ARGV + ["--on-deadline", "skip"])
+    def test_skip(
+        self, mock_environ, mock_boto3_client, mock_jwt, mock_requests, caplog
+    ):
+        """チェックの報告を諦めてビルドを続けるケース"""
+        mock_post, _ = mock_requests
+        mock_post.side_effect = requests.ReadTimeout("timed out")
+
+        main()
+
+        assert "skipped reporting the check" in caplog.text
+
+    @patch("sys.argv", ["prcb-checks", "--deadline", "soon", "test-check"])
+    def test_invalid_deadline(self):
+        """期限の形式が不正なケース"""
+        with pytest.raises(SystemExit) as e:
+            main()
+        assert e.value.code == 1
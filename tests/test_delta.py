@@ -0,0 +1,179 @@
+"""delta.pyのテスト"""
+
+import json
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from prcb_checks.client import ChecksClientError, ChecksClientTimeout
+from prcb_checks.delta import (
+    DeliveryIndex,
+    delta_main,
+    fingerprint,
+    post_delta,
+)
+from prcb_checks.main import main
+from tests.conftest import make_annotation
+
+
+def make_payload(annotations, **fields):
+    payload = {
+        "name": "Lint",
+        "head_sha": "abcdef1234567890",
+        "status": "in_progress",
+        "output": {"title": "Lint", "summary": "s", "annotations": annotations},
+    }
+    payload.update(fields)
+    return payload
+
+
+@pytest.fixture
+def client():
+    client = MagicMock()
+    client.create.return_value = {"id": 12345}
+    return client
+
+
+class TestFingerprint:
+    """fingerprint関数のテスト"""
+
+    def test_fingerprint(self):
+        """位置・レベル・メッセージが同じなら同じ値になるケース"""
+        annotation = make_annotation(1)
+        assert len(fingerprint(annotation)) == 8
+        assert fingerprint(annotation) == fingerprint(dict(annotation, title="t"))
+        assert fingerprint(annotation) != fingerprint(
+            make_annotation(1, message="other")
+        )
+        assert fingerprint(annotation) != fingerprint(make_annotation(2))
+
+
+class TestDeliveryIndex:
+    """DeliveryIndexのテスト"""
+
+    def test_persisted(self, cache_dir):
+        """チェック名+SHAごとに保存され、次回読み込めるケース"""
+        index = DeliveryIndex.load("Lint", "sha1")
+        assert index.check_run_id is None
+        index.set_check_run_id(12345)
+        index.record([fingerprint(make_annotation(1)), fingerprint(make_annotation(2))])
+
+        reloaded = DeliveryIndex.load("Lint", "sha1")
+        assert reloaded.check_run_id == 12345
+        assert reloaded.fingerprints == index.fingerprints
+        assert DeliveryIndex.load("Lint", "sha2").check_run_id is None
+        assert DeliveryIndex.load("Other", "sha1").check_run_id is None
+
+    def test_select_new(self):
+        """送信済みと重複を除くケース"""
+        index = DeliveryIndex.load("Lint", "sha1")
+        index.set_check_run_id(1)
+        index.record([fingerprint(make_annotation(1))])
+
+        selected = index.select_new(
+            [make_annotation(1), make_annotation(2), make_annotation(2)]
+        )
+
+        assert [annotation for _, annotation in selected] == [make_annotation(2)]
+
+
+class TestPostDelta:
+    """post_delta関数のテスト"""
+
+    def test_first_call_creates(self, client):
+        """初回はチェックランを作成し、51件目以降を追加するケース"""
+        index = DeliveryIndex.load("Lint", "abcdef1234567890")
+        annotations = [make_annotation(i) for i in range(1, 121)]
+
+        assert post_delta(client, make_payload(annotations), index) == 120
+
+        kwargs = client.create.call_args[1]
+        assert client.create.call_args[0] == ("Lint",)
+        assert kwargs["head_sha"] == "abcdef1234567890"
+        assert kwargs["status"] == "in_progress"
+        assert kwargs["annotations"] == annotations[:50]
+        assert client.add_annotations.call_count == 2
+        assert client.add_annotations.call_args[0][1] == annotations[100:]
+        assert len(DeliveryIndex.load("Lint", "abcdef1234567890").fingerprints) == 120
+
+    def test_next_call_sends_only_new(self, client):
+        """2回目以降は差分だけを既存のチェックランに送信するケース"""
+        post_delta(
+            client,
+            make_payload([make_annotation(i) for i in range(1, 11)]),
+            DeliveryIndex.load("Lint", "abcdef1234567890"),
+        )
+
+        sent = post_delta(
+            client,
+            make_payload(
+                [make_annotation(i) for i in range(1, 16)],
+                status="completed",
+                conclusion="failure",
+            ),
+            DeliveryIndex.load("Lint", "abcdef1234567890"),
+        )
+
+        assert sent == 5
+        client.create.assert_called_once()
+        check_run_id = client.update.call_args[0][0]
+        kwargs = client.update.call_args[1]
+        assert check_run_id == 12345
+        assert kwargs["conclusion"] == "failure"
+        assert kwargs["annotations"] == [make_annotation(i) for i in range(11, 16)]
+
+    def test_nothing_new(self, client):
+        """新しいアノテーションが無い場合は状態だけ更新するケース"""
+        index = DeliveryIndex.load("Lint", "abcdef1234567890")
+        index.set_check_run_id(12345)
+
+        assert post_delta(client, make_payload([]), index) == 0
+        assert client.update.call_args[1]["annotations"] is None
+
+
+class TestDeltaMain:
+    """--deltaオプションのテスト"""
+
+    def test_delta_option(self, mock_environ, mock_requests):
+        """--deltaでは差分モードで送信するケース"""
+        mock_post, _ = mock_requests
+        annotations = [make_annotation(i) for i in range(1, 61)]
+
+        with (
+            patch("prcb_checks.delta.post_delta") as mock_post_delta,
+            patch("prcb_checks.delta.ChecksClient"),
+            patch.object(
+                sys,
+                "argv",
+                [
+                    "prcb-checks",
+                    "--delta",
+                    "Lint",
+                    "in_progress",
+                    "",
+                    "Lint",
+                    "s",
+                    "",
+                    json.dumps(annotations),
+                ],
+            ),
+        ):
+            main()
+
+        payload = mock_post_delta.call_args[0][1]
+        assert payload["output"]["annotations"].to_list() == annotations
+        mock_post.assert_not_called()
+
+    def test_client_error(self, mock_environ):
+        with patch("prcb_checks.delta.ChecksClient") as mock_client_class:
+            mock_client_class.side_effect = ChecksClientError("boom")
+            with pytest.raises(SystemExit):
+                delta_main(make_payload([]))
+
+    def test_timeout(self, mock_environ):
+        """タイムアウトは --on-deadline で扱うため終了しないケース"""
+        with patch("prcb_checks.delta.ChecksClient") as mock_client_class:
+            mock_client_class.side_effect = ChecksClientTimeout("slow")
+            with pytest.raises(ChecksClientTimeout):
+                delta_main(make_payload([]))
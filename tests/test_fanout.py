@@ -0,0 +1,287 @@
+"""fanout.pyのテスト"""
+
+import json
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from prcb_checks.cache import read_json
+from prcb_checks.client import ChecksClient, ChecksClientError, ChecksClientTimeout
+from prcb_checks.fanout import (
+    FanOutTimeout,
+    fan_out,
+    fanout_main,
+    parse_head_shas,
+    serialize_for_head_shas,
+)
+from prcb_checks.main import main
+from prcb_checks.spool import list_spooled
+from tests.conftest import sent_payload
+
+PAYLOAD = {
+    "name": "Build",
+    "head_sha": "sha-1",
+    "status": "completed",
+    "conclusion": "success",
+    "output": {"title": "Build", "summary": "OK ✅"},
+}
+
+
+class TestParseHeadShas:
+    """parse_head_shas関数のテスト"""
+
+    def test_comma_separated(self):
+        assert parse_head_shas("sha-1, sha-2,sha-1") == ["sha-1", "sha-2"]
+
+    def test_file(self, tmp_path):
+        sha_file = tmp_path / "shas.txt"
+        sha_file.write_text("sha-1\nsha-2\n\nsha-3\n")
+
+        assert parse_head_shas(f"file://{sha_file}") == ["sha-1", "sha-2", "sha-3"]
+
+
+class TestSerializeForHeadShas:
+    """serialize_for_head_shas関数のテスト"""
+
+    def test_bodies(self):
+        """SHAだけが差し替えられたボディを生成するケース"""
+        bodies = dict(serialize_for_head_shas(PAYLOAD, ["sha-1", "sha-2"]))
+
+        for sha, body in bodies.items():
+            assert json.loads(body) == dict(PAYLOAD, head_sha=sha)
+
+
+class TestFanOut:
+    """fan_out関数のテスト"""
+
+    def test_fan_out(self, mock_environ, mock_jwt):
+        """共有のセッションから並行に送信し、SHAごとの結果を返すケース"""
+        session = MagicMock()
+        session.post.return_value.status_code = 201
+        session.post.return_value.json.return_value = {
+            "token": "mock-token",
+            "expires_at": "2099-01-01T00:00:00Z",
+        }
+
+        def request(method, url, **kwargs):
+            sha = json.loads(kwargs["data"])["head_sha"]
+            response = MagicMock()
+            response.status_code = 422 if sha == "bad" else 201
+            response.json.return_value = {"id": sha}
+            return response
+
+        session.request.side_effect = request
+        client = ChecksClient(private_key=b"k", session=session, pool_size=4)
+        head_shas = [f"sha-{i}" for i in range(10)] + ["bad"]
+
+        results = fan_out(client, PAYLOAD, head_shas)
+
+        assert [sha for sha, _ in results] == head_shas
+        assert results[0][1] == {"id": "sha-0"}
+        assert isinstance(results[-1][1], ChecksClientError)
+        assert session.request.call_count == 11
+        session.post.assert_called_once()
+
+    def test_transport_errors(self, mock_environ, mock_jwt):
+        """通信エラーやタイムアウトもSHAごとの結果として返すケース"""
+        session = MagicMock()
+        session.post.return_value.status_code = 201
+        session.post.return_value.json.return_value = {
+            "token": "mock-token",
+            "expires_at": "2099-01-01T00:00:00Z",
+        }
+
+        def request(method, url, **kwargs):
+            sha = json.loads(kwargs["data"])["head_sha"]
+            if sha == "down":
+                raise requests.ConnectionError("refused")
+            if sha == "slow":
+                raise requests.ReadTimeout("timed out")
+            response = MagicMock()
+            response.status_code = 201
+            response.json.return_value = {"id": sha}
+            return response
+
+        session.request.side_effect = request
+        client = ChecksClient(private_key=b"k", session=session, pool_size=4)
+
+        results = dict(fan_out(client, PAYLOAD, ["sha-1", "down", "slow"]))
+
+        assert results["sha-1"] == {"id": "sha-1"}
+        assert type(results["down"]) is ChecksClientError
+        assert isinstance(results["slow"], ChecksClientTimeout)
+
+
+class TestFanOutMain:
+    """--head-shaオプションのテスト"""
+
+    def test_results(self, mock_environ):
+        """SHAごとの結果を報告するケース"""
+        with (
+            patch("prcb_checks.fanout.ChecksClient"),
+            patch(
+                "prcb_checks.fanout.fan_out",
+                return_value=[("sha-1", {"id": 1}), ("sha-2", {"id": 2})],
+            ),
+        ):
+            fanout_main(PAYLOAD, ["sha-1", "sha-2"])
+
+    def test_partial_failure(self, mock_environ):
+        """失敗したSHAがある場合は終了コード1で終了するケース"""
+        with (
+            patch("prcb_checks.fanout.ChecksClient"),
+            patch(
+                "prcb_checks.fanout.fan_out",
+                return_value=[("sha-1", {"id": 1}), ("sha-2", ChecksClientError("x"))],
+            ),
+        ):
+            with pytest.raises(SystemExit):
+                fanout_main(PAYLOAD, ["sha-1", "sha-2"])
+
+    def test_partial_timeout(self, mock_environ, caplog):
+        """時間切れになったSHAだけを --on-deadline に渡すケース"""
+        results = [
+            ("sha-1", {"id": 1}),
+            ("sha-2", ChecksClientTimeout("slow")),
+            ("sha-3", ChecksClientError("x")),
+        ]
+        with (
+            patch("prcb_checks.fanout.ChecksClient"),
+            patch("prcb_checks.fanout.fan_out", return_value=results),
+        ):
+            with pytest.raises(FanOutTimeout) as e:
+                fanout_main(PAYLOAD, ["sha-1", "sha-2", "sha-3"])
+
+        assert e.value.head_shas == ["sha-2"]
+        assert e.value.failed == 1
+        assert "1 of 3 check-runs failed" in caplog.text
+
+    @pytest.mark.parametrize("policy", ["skip", "spool"])
+    def test_main_failed_and_timed_out(self, mock_environ, policy):
+        """失敗したSHAがあれば、時間切れの扱いによらず終了コード1で終了するケース"""
+        results = [
+            ("sha-1", ChecksClientError("x")),
+            ("sha-2", ChecksClientTimeout("slow")),
+        ]
+        argv = ["prcb-checks", "--on-deadline", policy, "--head-sha", "sha-1,sha-2"]
+        argv += ["Build", "completed", "success"]
+        with (
+            patch("sys.argv", argv),
+            patch("prcb_checks.fanout.ChecksClient"),
+            patch("prcb_checks.fanout.fan_out", return_value=results),
+        ):
+            with pytest.raises(SystemExit) as e:
+                main()
+
+        assert e.value.code == 1
+        assert len(list_spooled()) == (1 if policy == "spool" else 0)
+
+    @patch(
+        "sys.argv",
+        [
+            "prcb-checks",
+            "--on-deadline",
+            "spool",
+            "--head-sha",
+            "sha-1,sha-2,sha-3",
+            "Build",
+            "completed",
+            "success",
+        ],
+    )
+    def test_main_spools_timed_out(self, mock_environ):
+        """作成済みのSHAは保存せず、flushで重複して送らないケース"""
+        results = [
+            ("sha-1", {"id": 1}),
+            ("sha-2", ChecksClientTimeout("slow")),
+            ("sha-3", ChecksClientTimeout("slow")),
+        ]
+        with (
+            patch("prcb_checks.fanout.ChecksClient"),
+            patch("prcb_checks.fanout.fan_out", return_value=results),
+        ):
+            main()
+
+        [name] = list_spooled()
+        record = read_json("spool", name)
+        assert record["head_shas"] == ["sha-2", "sha-3"]
+        assert record["payload"]["head_sha"] == "sha-2"
+
+        # flushでも時間切れになったSHAだけを残す
+        with (
+            patch("sys.argv", ["prcb-checks", "flush"]),
+            patch("prcb_checks.fanout.ChecksClient"),
+            patch(
+                "prcb_checks.fanout.fan_out",
+                return_value=[
+                    ("sha-2", ChecksClientTimeout("slow")),
+                    ("sha-3", {"id": 3}),
+                ],
+            ),
+        ):
+            with pytest.raises(SystemExit):
+                main()
+
+        record = read_json("spool", name)
+        assert record["head_shas"] == ["sha-2"]
+
+    def test_client_error(self, mock_environ):
+        with patch("prcb_checks.fanout.ChecksClient") as mock_client_class:
+            mock_client_class.side_effect = ChecksClientError("boom")
+            with pytest.raises(SystemExit):
+                fanout_main(PAYLOAD, ["sha-1", "sha-2"])
+
+    def test_timeout(self, mock_environ):
+        """タイムアウトは --on-deadline で扱うため終了しないケース"""
+        with patch("prcb_checks.fanout.ChecksClient") as mock_client_class:
+            mock_client_class.side_effect = ChecksClientTimeout("slow")
+            with pytest.raises(ChecksClientTimeout):
+                fanout_main(PAYLOAD, ["sha-1", "sha-2"])
+
+    @patch(
+        "sys.argv",
+        ["prcb-checks", "--head-sha", "sha-1,sha-2", "Build", "completed", "success"],
+    )
+    def test_main_multiple(self, mock_environ, mock_requests):
+        """複数のSHAを指定した場合はfan-outするケース"""
+        mock_post, _ = mock_requests
+        with patch("prcb_checks.fanout.fanout_main") as mock_fanout_main:
+            main()
+
+        payload, head_shas, _ = mock_fanout_main.call_args[0]
+        assert head_shas == ["sha-1", "sha-2"]
+        assert payload["head_sha"] == "sha-1"
+        mock_post.assert_not_called()
+
+    @patch("sys.argv", ["prcb-checks", "--head-sha", "sha-9", "Build", "queued"])
+    def test_main_single(
+        self, mock_environ, mock_boto3_client, mock_jwt, mock_requests
+    ):
+        """SHAが1つの場合は通常どおり送信するケース"""
+        mock_post, _ = mock_requests
+        main()
+
+        assert sent_payload(mock_post.call_args)["head_sha"] == "sha-9"
+
+    @patch(
+        "sys.argv",
+        ["prcb-checks", "--dry-run", "--head-sha", "a,b", "Build", "queued"],
+    )
+    def test_main_dry_run(self, mock_environ, caplog):
+        main()
+
+        assert "Would be posted to 2 commits" in caplog.text
+
+    @pytest.mark.parametrize(
+        "argv",
+        [
+            ["prcb-checks", "--head-sha", ",", "Build"],
+            ["prcb-checks", "--delta", "--head-sha", "a,b", "Build"],
+        ],
+    )
+    def test_main_errors(self, mock_environ, argv):
+        with patch.object(sys, "argv", argv):
+            with pytest.raises(SystemExit):
+                main()
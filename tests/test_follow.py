@@ -0,0 +1,342 @@
+"""follow.pyのテスト"""
+
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from prcb_checks import follow as follow_module
+from prcb_checks.client import ChecksClientError
+from prcb_checks.follow import (
+    END_MARKER,
+    InotifyWatcher,
+    JsonLinesTail,
+    PollingWatcher,
+    create_watcher,
+    follow,
+    parse_line,
+    producer_alive,
+)
+from prcb_checks.main import main
+from tests.conftest import make_annotation
+
+
+def jsonl(annotations, end=True):
+    lines = [json.dumps(annotation) for annotation in annotations]
+    if end:
+        lines.append(json.dumps({"eof": True}))
+    return "".join(line + "\n" for line in lines)
+
+
+def make_payload(**overrides):
+    payload = {
+        "name": "Analyzer",
+        "head_sha": "abcdef1234567890",
+        "status": "completed",
+        "conclusion": "neutral",
+        "output": {"title": "Analyzer", "summary": "Findings"},
+    }
+    payload.update(overrides)
+    return payload
+
+
+@pytest.fixture(autouse=True)
+def fast_wait():
+    """待ち時間を短くする"""
+    with patch.object(follow_module, "WAIT_INTERVAL", 0.01):
+        yield
+
+
+@pytest.fixture
+def client():
+    client = MagicMock()
+    client.create.return_value = {"id": 7}
+    return client
+
+
+def sent_batches(client):
+    return [c[1]["annotations"] for c in client.update.call_args_list]
+
+
+class TestJsonLinesTail:
+    """JsonLinesTailクラスのテスト"""
+
+    def test_partial_line(self):
+        """最後の不完全な行は次の読み込みまで保持するケース"""
+        file = io.BytesIO()
+        tail = JsonLinesTail(file)
+        file.write(b'{"a": 1}\n{"b"')
+        file.seek(0)
+
+        assert list(tail.read_lines()) == [b'{"a": 1}']
+        position = file.tell()
+        file.write(b": 2}\n")
+        file.seek(position)
+        assert list(tail.read_lines()) == [b'{"b": 2}']
+        assert list(tail.read_lines()) == []
+
+
+class TestParseLine:
+    """parse_line関数のテスト"""
+
+    def test_annotation(self):
+        assert parse_line(json.dumps(make_annotation(1)).encode(), 1) == (
+            make_annotation(1)
+        )
+
+    def test_end_marker(self):
+        assert parse_line(b'{"eof": true}', 1) is END_MARKER
+
+    @pytest.mark.parametrize("line", [b"", b"  ", b"{broken", b'{"path": "a.py"}'])
+    def test_skipped(self, line):
+        assert parse_line(line, 1) is None
+
+
+class TestProducerAlive:
+    """producer_alive関数のテスト"""
+
+    def test_alive(self):
+        assert producer_alive(None)
+        assert producer_alive(os.getpid())
+
+    def test_exited(self):
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+
+        assert not producer_alive(process.pid)
+
+    def test_zombie(self):
+        """回収されていない終了済みのプロセスのケース"""
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        for _ in range(500):
+            if not producer_alive(process.pid):
+                break
+            time.sleep(0.01)
+
+        assert not producer_alive(process.pid)
+        process.wait()
+
+    @patch("os.kill", side_effect=PermissionError)
+    def test_other_user(self, mock_kill):
+        assert producer_alive(1)
+
+    def test_without_proc(self):
+        """/procが無い環境のケース"""
+        with patch("builtins.open", side_effect=OSError):
+            assert producer_alive(os.getpid())
+
+
+class TestWatcher:
+    """ファイルの変化を待つクラスのテスト"""
+
+    def test_inotify(self, tmp_path):
+        """追記されたらタイムアウトを待たずに戻るケース"""
+        path = tmp_path / "findings.jsonl"
+        path.write_text("")
+        watcher = create_watcher(str(path))
+        assert isinstance(watcher, InotifyWatcher)
+
+        timer = threading.Timer(0.05, lambda: path.write_text("x\n"))
+        timer.start()
+        started = time.monotonic()
+        watcher.wait(5.0)
+        watcher.close()
+        timer.join()
+
+        assert time.monotonic() - started < 2.0
+
+    def test_inotify_timeout(self, tmp_path):
+        path = tmp_path / "findings.jsonl"
+        path.write_text("")
+        watcher = InotifyWatcher(str(path))
+
+        watcher.wait(0.01)
+        watcher.close()
+
+    def test_polling_fallback(self, tmp_path):
+        """inotifyが使えない場合はポーリングするケース"""
+        assert isinstance(create_watcher(str(tmp_path / "missing")), PollingWatcher)
+        with patch("sys.platform", "darwin"):
+            watcher = create_watcher(str(tmp_path))
+        assert isinstance(watcher, PollingWatcher)
+
+        watcher.wait(0.01)
+        watcher.close()
+
+    def test_inotify_init_error(self, tmp_path):
+        with patch("ctypes.CDLL") as mock_cdll:
+            mock_cdll.return_value.inotify_init1.return_value = -1
+            with pytest.raises(OSError):
+                InotifyWatcher(str(tmp_path))
+
+
+class TestFollow:
+    """follow関数のテスト"""
+
+    def test_finished_file(self, client, tmp_path):
+        """50件ずつ送信し、残りは完了時の更新で送るケース"""
+        path = tmp_path / "findings.jsonl"
+        annotations = [make_annotation(i) for i in range(1, 121)]
+        path.write_text(
+            "{broken\n" + jsonl(annotations) + json.dumps(make_annotation(999)) + "\n"
+        )
+
+        assert follow(client, make_payload(), str(path)) == 120
+
+        assert client.create.call_args[1]["status"] == "in_progress"
+        assert [len(batch) for batch in sent_batches(client)] == [50, 50, 20]
+        final = client.update.call_args[1]
+        assert final["status"] == "completed"
+        assert final["conclusion"] == "neutral"
+        assert final["summary"] == "Findings"
+        assert sent_batches(client)[2][-1] == make_annotation(120)
+
+    def test_growing_file(self, client, tmp_path):
+        """書き込みを追いかけ、時間経過でも送信するケース"""
+        path = tmp_path / "findings.jsonl"
+
+        def produce():
+            time.sleep(0.05)
+            with open(path, "a") as file:
+                file.write(jsonl([make_annotation(1)], end=False))
+                file.write(json.dumps(make_annotation(2))[:10])
+                file.flush()
+                time.sleep(0.3)
+                file.write(json.dumps(make_annotation(2))[10:] + "\n")
+                file.write(jsonl([]))
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        follow(client, make_payload(), str(path), flush_interval=0.1)
+        producer.join()
+
+        assert sent_batches(client) == [
+            [make_annotation(1)],
+            [make_annotation(2)],
+        ]
+
+    def test_producer_exits(self, client, tmp_path, caplog):
+        """プロデューサーが終了したら完了し、不完全な行は捨てるケース"""
+        path = tmp_path / "findings.jsonl"
+        script = (
+            "import json, time\n"
+            f"file = open({str(path)!r}, 'w')\n"
+            "for i in range(3):\n"
+            "    file.write(json.dumps({'path': 'a.py', 'start_line': i + 1,"
+            " 'end_line': i + 1, 'annotation_level': 'failure', 'message': 'm'}) + '\\n')\n"
+            "    file.flush()\n"
+            "    time.sleep(0.05)\n"
+            "file.write('{\"path\"')\n"
+        )
+        process = subprocess.Popen([sys.executable, "-c", script])
+        try:
+            assert (
+                follow(
+                    client,
+                    make_payload(),
+                    str(path),
+                    pid=process.pid,
+                    auto_summary=True,
+                )
+                == 3
+            )
+        finally:
+            process.wait()
+
+        assert "**3 annotations**" in client.update.call_args[1]["summary"]
+        assert "Skipped an incomplete last line" in caplog.text
+
+    def test_never_created(self, client, tmp_path, caplog):
+        """ファイルが作られずにプロデューサーが終了したケース"""
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+
+        follow(client, make_payload(), str(tmp_path / "missing"), pid=process.pid)
+
+        assert "was not created" in caplog.text
+        assert client.update.call_args[1]["annotations"] is None
+
+    def test_created_later(self, client, tmp_path):
+        path = tmp_path / "findings.jsonl"
+        timer = threading.Timer(0.05, lambda: path.write_text(jsonl([])))
+        timer.start()
+
+        follow(client, make_payload(), str(path))
+        timer.join()
+
+        assert client.update.call_count == 1
+
+
+class TestFollowMain:
+    """--followオプションのテスト"""
+
+    def argv(self, path, *options):
+        return [
+            "prcb-checks",
+            "--follow",
+            f"file://{path}",
+            *options,
+            "Analyzer",
+            "completed",
+            "neutral",
+            "Analyzer",
+            "Findings",
+        ]
+
+    def test_follow(self, mock_environ, tmp_path):
+        path = tmp_path / "findings.jsonl"
+        path.write_text(jsonl([make_annotation(1)]))
+
+        with (
+            patch("sys.argv", self.argv(path, "--auto-summary")),
+            patch("prcb_checks.follow.ChecksClient") as mock_client_class,
+        ):
+            client = mock_client_class.return_value.__enter__.return_value
+            client.create.return_value = {"id": 7}
+            main()
+
+        assert mock_client_class.call_args[1]["timeout"] == (60.0, 60.0)
+        final = client.update.call_args[1]
+        assert final["annotations"] == [make_annotation(1)]
+        assert final["summary"].startswith("Findings\n\n**1 annotation")
+
+    @pytest.mark.parametrize("missing", [2, 1])
+    def test_missing_title_or_summary(self, mock_environ, tmp_path, caplog, missing):
+        """titleかsummaryが無い場合は使い方のエラーにするケース"""
+        argv = self.argv(tmp_path / "f.jsonl")[:-missing]
+        with (
+            patch("sys.argv", argv),
+            patch("prcb_checks.follow.ChecksClient") as mock_client_class,
+        ):
+            with pytest.raises(SystemExit):
+                main()
+
+        assert "--follow requires the title and summary arguments" in caplog.text
+        mock_client_class.assert_not_called()
+
+    def test_client_error(self, mock_environ, tmp_path):
+        with (
+            patch("sys.argv", self.argv(tmp_path / "f.jsonl")),
+            patch(
+                "prcb_checks.follow.ChecksClient", side_effect=ChecksClientError("boom")
+            ),
+        ):
+            with pytest.raises(SystemExit):
+                main()
+
+    def test_invalid_flush_interval(self, mock_environ, tmp_path):
+        argv = self.argv(tmp_path / "f.jsonl", "--flush-interval", "soon")
+        with patch("sys.argv", argv):
+            with pytest.raises(SystemExit):
+                main()
+
+    def test_with_delta(self, mock_environ, tmp_path):
+        with patch("sys.argv", self.argv(tmp_path / "f.jsonl", "--delta")):
+            with pytest.raises(SystemExit):
+                main()
@@ -6,14 +6,18 @@ import pytest
 import json
 from unittest.mock import patch, MagicMock, call
 
+from prcb_checks.cache import load_installation_id, save_installation_id
 from prcb_checks.main import (
     get_full_repository_name,
     get_secret_value,
     get_access_token,
+    get_installation_token,
     create_check_runs,
-    parse_json_file,
+    iter_payload_chunks,
+    serialize_payload,
     main,
 )
+from tests.conftest import sent_payload
 
 
 class TestGetSecretValue:
@@ -90,6 +94,131 @@ class TestGetAccessToken:
             get_access_token(b"mock-private-key")
 
 
+class TestDiscoverInstallation:
+    """GITHUB_APP_INSTALLATION_IDを省略した場合のテスト"""
+
+    @pytest.fixture
+    def environ(self, mock_environ):
+        with patch.dict(os.environ):
+            del os.environ["GITHUB_APP_INSTALLATION_ID"]
+            yield
+
+    @pytest.fixture
+    def mock_get(self):
+        with patch("requests.get") as mock_get:
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.json.return_value = {"id": 424242}
+            yield mock_get
+
+    def test_discover(
+        self, environ, mock_boto3_client, mock_jwt, mock_requests, mock_get
+    ):
+        """インストールIDを探し、以降は索引とトークンのキャッシュを使うケース"""
+        mock_post, mock_response = mock_requests
+        mock_response.json.return_value = {
+            "token": "mock-token",
+            "expires_at": "2099-01-01T00:00:00Z",
+        }
+
+        assert get_installation_token() == "mock-token"
+        assert mock_get.call_args[0][0] == (
+            "https://api.github.com/repos/test-owner/test-repo/installation"
+        )
+        assert mock_post.call_args[0][0] == (
+            "https://api.github.com/app/installations/424242/access_tokens"
+        )
+
+        assert get_installation_token() == "mock-token"
+        mock_get.assert_called_once()
+        mock_post.assert_called_once()
+
+    def test_indexed(self, environ, mock_jwt, mock_requests, mock_get):
+        """トークンが失効しても索引のインストールIDを使うケース"""
+        mock_post, _ = mock_requests
+        save_installation_id("test-owner/test-repo", "111")
+
+        get_access_token(b"mock-private-key")
+
+        mock_get.assert_not_called()
+        assert mock_post.call_args[0][0] == (
+            "https://api.github.com/app/installations/111/access_tokens"
+        )
+
+    def test_not_installed(self, environ, mock_jwt, mock_requests, mock_get, caplog):
+        """GitHub Appがインストールされていないケース"""
+        mock_get.return_value.status_code = 404
+
+        with pytest.raises(SystemExit):
+            get_access_token(b"mock-private-key")
+        assert "GitHub App is not installed on test-owner/test-repo: 404" in (
+            caplog.text
+        )
+
+    def test_stale_index(self, environ, mock_jwt, mock_requests, mock_get):
+        """索引のインストールIDが失効していれば、索引から消して探し直すケース"""
+        mock_post, mock_response = mock_requests
+        rejected = MagicMock(status_code=404)
+        mock_post.side_effect = [rejected, mock_response]
+        save_installation_id("test-owner/test-repo", "111")
+
+        assert get_access_token(b"mock-private-key") == "mock-token"
+
+        assert [args[0][0] for args in mock_post.call_args_list] == [
+            "https://api.github.com/app/installations/111/access_tokens",
+            "https://api.github.com/app/installations/424242/access_tokens",
+        ]
+        assert load_installation_id("test-owner/test-repo") == "424242"
+
+    def test_token_error(self, mock_environ, mock_jwt, mock_requests, caplog):
+        """トークンを取得できない場合はステータスコードを報告するケース"""
+        _, mock_response = mock_requests
+        mock_response.status_code = 404
+
+        with pytest.raises(SystemExit):
+            get_access_token(b"mock-private-key")
+        assert "Could not get an access token: 404" in caplog.text
+        assert "Required environment variable" not in caplog.text
+
+
+class TestGetInstallationToken:
+    """get_installation_token関数のテスト"""
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_missing_installation_id(self):
+        """環境変数が設定されていない場合のエラー処理"""
+        with pytest.raises(SystemExit):
+            get_installation_token()
+
+    def test_missing_secret_id(self, mock_environ):
+        """秘密鍵のシークレットIDが設定されていない場合のエラー処理"""
+        with patch.dict(os.environ):
+            del os.environ["SECRETS_MANAGER_SECRETID"]
+            with pytest.raises(SystemExit):
+                get_installation_token()
+
+
+class TestIterPayloadChunks:
+    """iter_payload_chunks関数のテスト"""
+
+    def test_same_as_serialize_payload(self):
+        """チャンクを連結するとserialize_payloadと同じJSONになるケース"""
+        payload = {
+            "name": "test-check",
+            "output": {"title": "タイトル", "summary": "s", "text": "x" * 1000},
+        }
+
+        chunks = list(iter_payload_chunks(payload, chunk_size=100))
+
+        assert len(chunks) > 1
+        assert all(len(chunk) < 1100 for chunk in chunks)
+        assert b"".join(chunks).decode("utf-8") == serialize_payload(payload)
+
+    def test_nan(self):
+        """NaNはJSONとして送信できないケース"""
+        with pytest.raises(ValueError):
+            list(iter_payload_chunks({"value": float("nan")}))
+
+
 class TestCreateCheckRuns:
     """create_check_runs関数のテスト"""
 
@@ -111,7 +240,7 @@ class TestCreateCheckRuns:
         assert headers["Accept"] == "application/vnd.github+json"
 
         # ペイロードの確認
-        payload = mock_post.call_args[1]["json"]
+        payload = sent_payload(mock_post.call_args)
         assert payload["name"] == "test-check"
         assert payload["head_sha"] == "abcdef1234567890"
         assert "status" not in payload
@@ -134,7 +263,7 @@ class TestCreateCheckRuns:
         )
 
         # ペイロードの確認
-        payload = mock_post.call_args[1]["json"]
+        payload = sent_payload(mock_post.call_args)
         assert payload["name"] == "test-check"
         assert payload["status"] == "completed"
         assert payload["conclusion"] == "success"
@@ -170,7 +299,7 @@ class TestCreateCheckRuns:
         )
 
         # ペイロードの確認
-        payload = mock_post.call_args[1]["json"]
+        payload = sent_payload(mock_post.call_args)
         assert payload["name"] == "test-check"
         assert payload["status"] == "completed"
         assert payload["conclusion"] == "failure"
@@ -180,25 +309,22 @@ class TestCreateCheckRuns:
         assert payload["output"]["annotations"] == annotations
 
     def test_create_check_runs_non_complete(self, mock_requests, mock_environ):
-        """すべてのパラメータを指定してチェックランを作成するケース"""
+        """titleが無い場合はsummary等を黙って落とさず、送信前にエラーにするケース"""
         mock_post, mock_response = mock_requests
 
         # テスト実行
-        create_check_runs(
-            "mock-access-token",
-            "test-check",
-            status="completed",
-            conclusion="success",
-            summary="Test Summary",
-            text="Test Text",
-        )
+        with pytest.raises(SystemExit):
+            create_check_runs(
+                "mock-access-token",
+                "test-check",
+                status="completed",
+                conclusion="success",
+                summary="Test Summary",
+                text="Test Text",
+            )
 
-        # ペイロードの確認
-        payload = mock_post.call_args[1]["json"]
-        assert payload["name"] == "test-check"
-        assert payload["status"] == "completed"
-        assert payload["conclusion"] == "success"
-        assert "output" not in payload
+        # APIが呼び出されていないことを確認
+        mock_post.assert_not_called()
 
     def test_create_check_runs_error_response(self, mock_requests, mock_environ):
         """APIがエラーを返すケース"""
@@ -266,7 +392,7 @@ class TestMainFunction:
 
         # チェックランの作成が正しく呼び出されていることを確認
         mock_post.assert_called()
-        payload = mock_post.call_args[1]["json"]
+        payload = sent_payload(mock_post.call_args)
         assert payload["name"] == "test-check"
         assert payload["status"] == "completed"
         assert payload["conclusion"] == "success"
@@ -298,7 +424,7 @@ class TestMainFunction:
 
         # チェックランの作成が正しく呼び出されていることを確認
         mock_post.assert_called()
-        payload = mock_post.call_args[1]["json"]
+        payload = sent_payload(mock_post.call_args)
         assert payload["name"] == "test-check"
         assert payload["output"]["annotations"] == [
             {
@@ -346,7 +472,7 @@ class TestMainFunction:
 
         # チェックランの作成が正しく呼び出されていることを確認
         mock_post.assert_called()
-        payload = mock_post.call_args[1]["json"]
+        payload = sent_payload(mock_post.call_args)
         assert payload["name"] == "test-check"
         assert payload["status"] == "completed"
         assert payload["conclusion"] == "success"
@@ -393,7 +519,7 @@ class TestMainFunction:
 
         # チェックランの作成が正しく呼び出されていることを確認
         mock_post.assert_called()
-        payload = mock_post.call_args[1]["json"]
+        payload = sent_payload(mock_post.call_args)
         assert payload["name"] == "test-check"
         assert payload["output"]["annotations"] == test_annotations
 
@@ -408,7 +534,7 @@ class TestMainFunction:
         main()
 
         # チェックランの作成が正しく呼び出されていることを確認
-        payload = mock_post.call_args[1]["json"]
+        payload = sent_payload(mock_post.call_args)
         assert payload["name"] == "test-check"
         assert payload["status"] == "queued"
         assert "conclusion" not in payload
@@ -425,7 +551,7 @@ class TestMainFunction:
         main()
 
         # チェックランの作成が正しく呼び出されていることを確認
-        payload = mock_post.call_args[1]["json"]
+        payload = sent_payload(mock_post.call_args)
         assert payload["name"] == "test-check"
         assert payload["status"] == "queued"
         assert "conclusion" not in payload
@@ -454,7 +580,7 @@ class TestMainFunction:
         main()
 
         # チェックランの作成が正しく呼び出されていることを確認
-        payload = mock_post.call_args[1]["json"]
+        payload = sent_payload(mock_post.call_args)
         assert payload["name"] == "test-check"
         assert payload["status"] == "completed"
         assert payload["conclusion"] == "success"
@@ -498,6 +624,213 @@ class TestMainFunction:
             main()
 
 
+class TestDryRun:
+    """--dry-runオプションのテスト"""
+
+    @patch(
+        "sys.argv",
+        [
+            "prcb-checks",
+            "--dry-run",
+            "test-check",
+            "completed",
+            "success",
+            "Test Title",
+            "Test Summary",
+        ],
+    )
+    def test_dry_run_prints_payload(
+        self, mock_environ, mock_boto3_client, mock_requests, capsys, caplog
+    ):
+        """ペイロードを出力し、ネットワークI/Oを行わないケース"""
+        mock_post, _ = mock_requests
+
+        main()
+
+        out = capsys.readouterr().out
+        payload = json.loads(out.splitlines()[0])
+        assert payload["name"] == "test-check"
+        assert payload["output"]["summary"] == "Test Summary"
+        assert f"Payload size: {len(out.splitlines()[0])} bytes" in caplog.text
+
+        mock_boto3_client.get_secret_value.assert_not_called()
+        mock_post.assert_not_called()
+
+    @patch(
+        "sys.argv",
+        [
+            "prcb-checks",
+            "test-check",
+            "in_progress",
+            "bogus",
+            "Test Title",
+            "",
+            "",
+            '[{"path": "a.py", "start_line": 1, "end_line": 2, "start_column": 3, "annotation_level": "error", "message": "m"}]',
+        ],
+    )
+    def test_invalid_payload_reports_all_errors(
+        self, mock_environ, mock_boto3_client, mock_requests
+    ):
+        """すべての違反を報告し、シークレット取得前に終了するケース"""
+        mock_post, _ = mock_requests
+
+        with patch("prcb_checks.main.logger") as mock_logger:
+            with pytest.raises(SystemExit):
+                main()
+
+        messages = [c.args[0] for c in mock_logger.error.call_args_list]
+        assert any("conclusion" in m and "bogus" in m for m in messages)
+        assert any("output.summary: is required" in m for m in messages)
+        assert any("annotation_level" in m for m in messages)
+        assert any("start_column/end_column" in m for m in messages)
+
+        mock_boto3_client.get_secret_value.assert_not_called()
+        mock_post.assert_not_called()
+
+    @patch.dict(os.environ, {}, clear=True)
+    @patch("sys.argv", ["prcb-checks", "--dry-run", "test-check"])
+    def test_dry_run_missing_head_sha(self):
+        """CODEBUILD_RESOLVED_SOURCE_VERSIONが無い場合のエラー処理"""
+        with pytest.raises(SystemExit) as excinfo:
+            main()
+
+        assert excinfo.value.code == 1
+
+
+class TestAutoSummary:
+    """--auto-summaryオプションのテスト"""
+
+    @pytest.mark.parametrize(
+        "summary, expected_prefix",
+        [
+            ("", "**1 annotations** (1 warning)"),
+            ("Lint report", "Lint report\n\n**1 annotations** (1 warning)"),
+        ],
+    )
+    def test_auto_summary(
+        self,
+        mock_environ,
+        mock_boto3_client,
+        mock_jwt,
+        mock_requests,
+        summary,
+        expected_prefix,
+    ):
+        """アノテーションの統計からサマリーを生成するケース"""
+        mock_post, _ = mock_requests
+
+        with patch.object(
+            sys,
+            "argv",
+            [
+                "prcb-checks",
+                "--auto-summary",
+                "Lint",
+                "completed",
+                "failure",
+                "Lint",
+                summary,
+                "",
+                '[{"path": "src/main.py", "start_line": 1, "end_line": 1, "annotation_level": "warning", "message": "m"}]',
+            ],
+        ):
+            main()
+
+        payload = sent_payload(mock_post.call_args)
+        assert payload["output"]["summary"].startswith(expected_prefix)
+        assert "| `src/main.py` | 1 |" in payload["output"]["summary"]
+
+    def test_not_an_array(self, mock_environ, caplog):
+        """配列でないアノテーションは集計せず、検証エラーにするケース"""
+        argv = ["prcb-checks", "--dry-run", "--auto-summary"]
+        argv += ["n", "completed", "success", "t", "s", "", '{"a": 1}']
+        with patch.object(sys, "argv", argv):
+            with pytest.raises(SystemExit):
+                main()
+
+        assert "output.annotations: must be an array" in caplog.text
+
+
+class TestShardMode:
+    """--shard-storeオプションのテスト"""
+
+    def test_write_shard(
+        self, mock_environ, mock_boto3_client, mock_requests, tmp_path
+    ):
+        """APIを呼び出さずにシャードとして書き出すケース(件数の上限なし)"""
+        mock_post, _ = mock_requests
+        annotations = [
+            {
+                "path": "src/main.py",
+                "start_line": i,
+                "end_line": i,
+                "annotation_level": "warning",
+                "message": "m",
+            }
+            for i in range(1, 61)
+        ]
+
+        with patch.object(
+            sys,
+            "argv",
+            [
+                "prcb-checks",
+                "--shard-store",
+                f"file://{tmp_path}",
+                "--shard-id",
+                "shard-1",
+                "Lint",
+                "completed",
+                "failure",
+                "Lint",
+                "Summary",
+                "",
+                json.dumps(annotations),
+            ],
+        ):
+            main()
+
+        lines = (
+            (tmp_path / "shards" / "Lint" / "abcdef1234567890" / "shard-1.jsonl")
+            .read_text()
+            .splitlines()
+        )
+        assert json.loads(lines[0])["counts"]["warning"] == 60
+        assert len(lines) == 61
+        mock_boto3_client.get_secret_value.assert_not_called()
+        mock_post.assert_not_called()
+
+    def test_dry_run_does_not_write(self, mock_environ, mock_requests, tmp_path):
+        """--dry-runではシャードを書き出さないケース"""
+        with patch.object(
+            sys,
+            "argv",
+            [
+                "prcb-checks",
+                "--dry-run",
+                "--shard-store",
+                str(tmp_path),
+                "--shard-id",
+                "shard-1",
+                "Lint",
+                "completed",
+                "success",
+            ],
+        ):
+            main()
+
+        assert list(tmp_path.iterdir()) == []
+
+    @patch("sys.argv", ["prcb-checks", "aggregate", "Lint"])
+    def test_aggregate_subcommand(self, mock_environ):
+        """aggregateサブコマンドに処理を委譲するケース"""
+        with patch("prcb_checks.aggregate.aggregate_main") as mock_aggregate_main:
+            main()
+
+        assert mock_aggregate_main.call_args[0][1] == ["Lint"]
+
+
 class TestReadFileContent:
     """ファイル読み込み機能のテスト"""
 
@@ -530,36 +863,6 @@ class TestReadFileContent:
         mock_exit.assert_called_once_with(1)
 
 
-class TestJsonParsing:
-    """JSON解析機能のテスト"""
-
-    def test_parse_json_file(self, tmp_path):
-        """JSONファイルの解析のテスト"""
-        # テスト用のJSONファイルを作成
-        test_file = tmp_path / "test.json"
-        test_data = {
-            "items": [
-                {"id": 1, "name": "Item 1"},
-                {"id": 2, "name": "Item 2"},
-            ]
-        }
-        test_file.write_text(json.dumps(test_data))
-
-        # 関数のテスト
-        result = parse_json_file(str(test_file))
-        assert result == test_data
-
-    def test_parse_json_file_invalid(self, tmp_path):
-        """不正なJSONファイルの解析のテスト"""
-        # 不正なJSON形式のファイルを作成
-        test_file = tmp_path / "invalid.json"
-        test_file.write_text("This is not valid JSON")
-
-        # 不正なJSONの場合、エラーになることを確認
-        with pytest.raises(SystemExit) as excinfo:
-            parse_json_file(str(test_file))
-
-
 class TestEnvironmentInitialization:
     """環境変数の初期化処理のテスト"""
 
@@ -0,0 +1,93 @@
+"""profiling.pyのテスト"""
+
+import pstats
+import sys
+import tracemalloc
+from unittest.mock import patch
+
+import pytest
+
+from prcb_checks.main import main
+from prcb_checks.profiling import run_profiled
+
+
+def allocate():
+    return [bytes(1024) for _ in range(1000)]
+
+
+def reports(directory, suffix):
+    return sorted(directory.glob(f"prcb-checks-*{suffix}"))
+
+
+class TestRunProfiled:
+    """run_profiled関数のテスト"""
+
+    def test_cpu(self, tmp_path, caplog):
+        result = run_profiled("cpu", str(tmp_path), allocate)
+
+        assert len(result) == 1000
+        assert len(reports(tmp_path, "-cpu.txt")) == 1
+        assert not reports(tmp_path, ".tracemalloc")
+        stats = pstats.Stats(str(reports(tmp_path, ".pstats")[0]))
+        assert any(key[2] == "allocate" for key in stats.stats)
+        assert "CPU profile:" in caplog.text
+        assert "calls" in caplog.text
+
+    def test_mem(self, tmp_path, caplog):
+        run_profiled("mem", str(tmp_path / "new"), allocate)
+
+        assert not tracemalloc.is_tracing()
+        assert not reports(tmp_path / "new", ".pstats")
+        assert "Peak:" in reports(tmp_path / "new", "-mem.txt")[0].read_text()
+        snapshot = tracemalloc.Snapshot.load(
+            str(reports(tmp_path / "new", ".tracemalloc")[0])
+        )
+        assert snapshot.statistics("lineno")
+        assert "Memory profile:" in caplog.text
+        assert "test_profiling.py" in caplog.text
+
+    def test_exit(self, tmp_path):
+        """sys.exit()で終了してもレポートを書き出すケース"""
+        with pytest.raises(SystemExit):
+            run_profiled("both", str(tmp_path), sys.exit, 1)
+
+        assert len(reports(tmp_path, ".pstats")) == 1
+        assert len(reports(tmp_path, ".tracemalloc")) == 1
+
+    def test_unwritable(self, tmp_path, caplog):
+        """レポートを書けなくても処理の結果は変えないケース"""
+        directory = tmp_path / "file"
+        directory.write_text("")
+
+        assert run_profiled("cpu", str(directory), len, "abc") == 3
+        assert "Could not write the profile" in caplog.text
+
+
+class TestProfileOption:
+    """--profileオプションのテスト"""
+
+    def test_profile(self, tmp_path, mock_environ, caplog):
+        argv = [
+            "prcb-checks",
+            "--profile",
+            "both",
+            "--profile-dir",
+            str(tmp_path),
+            "--dry-run",
+            "test-check",
+            "completed",
+            "success",
+            "Test Title",
+            "Test Summary",
+        ]
+        with patch("sys.argv", argv):
+            main()
+
+        assert len(reports(tmp_path, ".pstats")) == 1
+        assert len(reports(tmp_path, ".tracemalloc")) == 1
+        assert "Payload size" in caplog.text
+
+    def test_invalid_mode(self):
+        with patch("sys.argv", ["prcb-checks", "--profile", "io", "test-check"]):
+            with pytest.raises(SystemExit):
+                main()
@@ -0,0 +1,238 @@
+"""pytest_plugin.pyのテスト"""
+
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from prcb_checks.client import ChecksClientError
+from prcb_checks.pytest_plugin import ChecksReporter, pytest_configure
+from prcb_checks.validator import validate_annotation
+from tests.conftest import make_annotation
+
+pytest_plugins = ["pytester"]
+
+TEST_MODULE = """
+import pytest
+
+def test_pass():
+    assert True
+
+def test_fail():
+    assert 1 == 2
+
+@pytest.mark.skip
+def test_skip():
+    pass
+
+@pytest.mark.parametrize("i", range(60))
+def test_many_failures(i):
+    assert i < 0
+"""
+
+
+@pytest.fixture
+def mock_client():
+    """ChecksClientのモック"""
+    client = MagicMock()
+    client.create.return_value = {"id": 12345}
+    with patch("prcb_checks.client.ChecksClient", return_value=client):
+        yield client
+
+
+@pytest.fixture
+def run_pytest(pytester, monkeypatch):
+    """プラグインを有効にしてpytestを実行する"""
+    monkeypatch.setenv("PYTEST_DISABLE_PLUGIN_AUTOLOAD", "1")
+
+    def run(*args):
+        pytester.makepyfile(test_sample=TEST_MODULE)
+        return pytester.inline_run("-p", "prcb_checks.pytest_plugin", *args)
+
+    return run
+
+
+class TestPytestPlugin:
+    """pytestプラグインのテスト"""
+
+    def test_disabled_by_default(self, run_pytest, mock_client):
+        """オプションを指定しない場合は何もしないケース"""
+        result = run_pytest()
+
+        result.assertoutcome(passed=1, failed=61, skipped=1)
+        mock_client.create.assert_not_called()
+
+    def test_reports_session(self, run_pytest, mock_client):
+        """失敗をアノテーションとして送信し、件数とともに完了するケース"""
+        run_pytest("--prcb-check", "Unit Tests")
+
+        mock_client.create.assert_called_once_with("Unit Tests", status="in_progress")
+
+        annotations = [
+            a for c in mock_client.add_annotations.call_args_list for a in c[0][1]
+        ]
+        assert len(annotations) == 61
+        for c in mock_client.add_annotations.call_args_list:
+            assert c[0][0] == 12345
+            assert len(c[0][1]) <= 50
+        first = annotations[0]
+        assert first["path"] == "test_sample.py"
+        assert first["start_line"] == 7
+        assert first["annotation_level"] == "failure"
+        assert first["title"] == "test_sample.py::test_fail"
+        assert "assert 1 == 2" in first["message"]
+
+        mock_client.complete.assert_called_once_with(
+            12345,
+            "failure",
+            title="Unit Tests",
+            summary="1 passed, 61 failed, 1 skipped",
+        )
+        mock_client.close.assert_called_once()
+
+    def test_create_error_does_not_fail_session(self, run_pytest, mock_client):
+        """チェックランの作成に失敗してもテストは継続するケース"""
+        mock_client.create.side_effect = ChecksClientError("boom")
+
+        result = run_pytest("--prcb-check", "Unit Tests")
+
+        result.assertoutcome(passed=1, failed=61, skipped=1)
+        mock_client.add_annotations.assert_not_called()
+        mock_client.complete.assert_not_called()
+
+    def test_client_error_does_not_fail_session(self, run_pytest):
+        """クライアントを作れない場合(認証情報が無い等)もテストは継続するケース"""
+        with patch("prcb_checks.client.ChecksClient", side_effect=RuntimeError("boom")):
+            result = run_pytest("--prcb-check", "Unit Tests")
+
+        result.assertoutcome(passed=1, failed=61, skipped=1)
+
+    @pytest.mark.parametrize(
+        "error", [ChecksClientError("boom"), requests.ConnectionError("boom")]
+    )
+    def test_send_errors_are_logged(self, run_pytest, mock_client, error):
+        """送信や完了に失敗してもテストは継続するケース"""
+        mock_client.add_annotations.side_effect = error
+        mock_client.complete.side_effect = error
+
+        result = run_pytest("--prcb-check", "Unit Tests")
+
+        result.assertoutcome(passed=1, failed=61, skipped=1)
+        assert mock_client.add_annotations.call_count == 2
+        mock_client.close.assert_called_once()
+
+    def test_lazy_import(self):
+        """オプションを指定しない場合はクライアントの依存関係を読み込まないケース"""
+        code = (
+            "import sys, prcb_checks.pytest_plugin\n"
+            "assert 'requests' not in sys.modules and 'boto3' not in sys.modules\n"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    @pytest.mark.parametrize("worker, registered", [(False, True), (True, False)])
+    def test_xdist_worker(self, worker, registered):
+        """pytest-xdistのワーカーではチェックランを作らないケース"""
+        config = SimpleNamespace(
+            getoption=lambda name: "Unit Tests", pluginmanager=MagicMock()
+        )
+        if worker:
+            config.workerinput = {"workerid": "gw0"}
+
+        pytest_configure(config)
+
+        assert config.pluginmanager.register.called == registered
+
+
+class TestChecksReporter:
+    """ChecksReporterのテスト"""
+
+    def test_flush_on_idle(self, tmp_path):
+        """50件に満たない失敗も一定時間後に送信されるケース"""
+        config = MagicMock()
+        config.rootpath = tmp_path
+        client = MagicMock()
+        client.create.return_value = {"id": 1}
+        reporter = ChecksReporter(config, "Unit Tests", client, flush_interval=0.01)
+        reporter.pytest_sessionstart(None)
+
+        report = MagicMock(passed=False, skipped=False, failed=True)
+        report.nodeid = "tests/test_x.py::test_x"
+        report.location = ("tests/test_x.py", 9, "test_x")
+        report.longrepr.reprcrash.path = "/outside/of/root.py"
+        report.longrepr.reprcrash.message = ""
+        report.longreprtext = "details"
+        reporter.pytest_runtest_logreport(report)
+
+        for _ in range(500):
+            if client.add_annotations.called:
+                break
+            reporter._worker.join(0.01)
+        reporter.pytest_sessionfinish(None, 0)
+
+        (annotation,) = client.add_annotations.call_args[0][1]
+        assert annotation["path"] == "tests/test_x.py"
+        assert annotation["start_line"] == 10
+        assert annotation["message"] == "tests/test_x.py::test_x"
+        client.complete.assert_called_once_with(
+            1, "failure", title="Unit Tests", summary="0 passed, 1 failed, 0 skipped"
+        )
+
+    def test_flush_while_failures_keep_arriving(self, tmp_path):
+        """失敗が送信間隔より短い間隔で届き続けても、最も古い失敗から数えて送信するケース"""
+        client = MagicMock()
+        client.create.return_value = {"id": 1}
+        reporter = ChecksReporter(MagicMock(), "Unit Tests", client, flush_interval=0.2)
+        reporter.pytest_sessionstart(None)
+
+        for _ in range(20):
+            reporter._queue.put(make_annotation())
+            time.sleep(0.05)
+        sent_before_finish = client.add_annotations.call_count
+        reporter.pytest_sessionfinish(None, 1)
+
+        assert sent_before_finish >= 1
+        assert sum(len(c[0][1]) for c in client.add_annotations.call_args_list) == 20
+
+    def test_without_reprcrash(self, tmp_path):
+        """トレースバック情報が無い失敗のケース"""
+        config = MagicMock()
+        config.rootpath = tmp_path
+        reporter = ChecksReporter(config, "Unit Tests", MagicMock())
+        reporter.check_run_id = 1
+
+        report = MagicMock(passed=False, skipped=False, failed=True)
+        report.longrepr = "line 1\nFailed: timeout"
+        report.nodeid = "test_x.py::test_x"
+        report.location = ("test_x.py", 0, "test_x")
+        report.longreprtext = "x" * 70000
+        reporter.pytest_runtest_logreport(report)
+
+        annotation = reporter._queue.get_nowait()
+        assert annotation["message"] == "Failed: timeout"
+        assert annotation["start_line"] == 1
+        assert len(annotation["raw_details"]) == 64 * 1024
+        assert annotation["raw_details"].endswith("...")
+
+    def test_truncate_multibyte(self, tmp_path):
+        """UTF-8で64KBを超える場合は、文字の途中で切らずにバイト数で切り詰めるケース"""
+        config = MagicMock()
+        config.rootpath = tmp_path
+        reporter = ChecksReporter(config, "Unit Tests", MagicMock())
+        reporter.check_run_id = 1
+
+        report = MagicMock(passed=False, skipped=False, failed=True)
+        report.longrepr = "失敗: " + "あ" * 30000
+        report.nodeid = "test_x.py::test_x[" + "p" * 300 + "]"
+        report.location = ("test_x.py", 0, "test_x")
+        report.longreprtext = "詳細" * 20000
+        reporter.pytest_runtest_logreport(report)
+
+        annotation = reporter._queue.get_nowait()
+        assert validate_annotation(annotation) == []
+        assert annotation["message"].endswith("あ...")
+        assert len(annotation["title"]) == 255
+        assert len(annotation["raw_details"].encode("utf-8")) <= 64 * 1024
@@ -0,0 +1,367 @@
+"""reuse.pyのテスト"""
+
+import json
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from prcb_checks.cache import read_json
+from prcb_checks.client import ChecksClientError, ChecksClientTimeout
+from prcb_checks.main import main
+from prcb_checks.reuse import (
+    parse_globs,
+    replay_result,
+    result_key,
+    result_record,
+    run_main,
+    serialize_result,
+    tree_hash,
+)
+from prcb_checks.spool import drop_superseded, list_spooled
+from tests.conftest import make_annotation
+
+
+def make_options(**overrides):
+    options = {
+        "inputs": None,
+        "result_store": None,
+        "annotations_file": None,
+        "dry_run": False,
+        "deadline": None,
+        "connect_timeout": "60s",
+        "read_timeout": "60s",
+        "on_deadline": "fail",
+    }
+    options.update(overrides)
+    return SimpleNamespace(**options)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """入力ファイルを置いた作業ディレクトリ"""
+    directory = tmp_path / "work"
+    (directory / "src").mkdir(parents=True)
+    (directory / "src" / "main.py").write_text("print('hello')\n")
+    (directory / "README.md").write_text("readme\n")
+    monkeypatch.chdir(directory)
+    return directory
+
+
+@pytest.fixture
+def mock_client():
+    with patch("prcb_checks.reuse.ChecksClient") as mock_client_class:
+        client = mock_client_class.return_value.__enter__.return_value
+        client.create_serialized.return_value = {"id": 1}
+        yield client
+
+
+class TestTreeHash:
+    """tree_hash関数のテスト"""
+
+    def test_parse_globs(self):
+        assert parse_globs(None) == []
+        assert parse_globs("src/**/*.py, setup.cfg,") == ["src/**/*.py", "setup.cfg"]
+
+    def test_files(self, workdir):
+        """Gitの作業ツリーでない場合はファイルの内容から計算するケース"""
+        before = tree_hash(["src/**"])
+        (workdir / "README.md").write_text("changed\n")
+        assert tree_hash(["src/**"]) == before
+        assert tree_hash([]) != tree_hash(["src/**"])
+
+        (workdir / "src" / "main.py").write_text("print('bye')\n")
+        assert tree_hash(["src/**"]) != before
+
+    def test_git(self, workdir):
+        """Gitの作業ツリーではインデックスから計算するケース"""
+        subprocess.run(["git", "init", "-q"], check=True)
+        subprocess.run(["git", "add", "."], check=True)
+        before = tree_hash(["src/**"])
+
+        (workdir / "README.md").write_text("changed\n")
+        subprocess.run(["git", "add", "."], check=True)
+        assert tree_hash(["src/**"]) == before
+
+        (workdir / "src" / "main.py").write_text("print('bye')\n")
+        subprocess.run(["git", "add", "."], check=True)
+        assert tree_hash(["src/**"]) != before
+
+    def test_no_match(self, workdir):
+        """一致するファイルが無い場合は再利用できるハッシュを返さないケース"""
+        assert tree_hash(["typo_dir/*.py"]) is None
+
+        subprocess.run(["git", "init", "-q"], check=True)
+        subprocess.run(["git", "add", "."], check=True)
+        assert tree_hash(["typo_dir/*.py"]) is None
+
+    def test_result_key(self):
+        """チェック名・コマンド・入力のいずれかが違えば別のキーになるケース"""
+        key = result_key("Lint", ["flake8"], "abc")
+
+        assert key.startswith("results/") and key.endswith(".jsonl")
+        assert key == result_key("Lint", ["flake8"], "abc")
+        assert key != result_key("Test", ["flake8"], "abc")
+        assert key != result_key("Lint", ["flake8", "src"], "abc")
+        assert key != result_key("Lint", ["flake8"], "abd")
+
+
+class TestSerializeResult:
+    """結果の保存と再送信のテスト"""
+
+    def test_replay(self):
+        """保存したリクエストを別のSHAで送信するケース"""
+        payload = {
+            "name": "Lint",
+            "head_sha": "old-sha",
+            "status": "completed",
+            "conclusion": "failure",
+            "output": {
+                "title": "Lint",
+                "summary": "s",
+                "annotations": [make_annotation(i) for i in range(1, 121)],
+            },
+        }
+        result = serialize_result(payload, 1)
+        client = MagicMock()
+        client.create_serialized.return_value = {"id": 7}
+
+        meta = replay_result(client, result, "new-sha")
+
+        assert meta == {"head_sha": "old-sha", "returncode": 1}
+        created = json.loads(client.create_serialized.call_args[0][0])
+        assert created["head_sha"] == "new-sha"
+        assert created["conclusion"] == "failure"
+        assert len(created["output"]["annotations"]) == 50
+        updates = [json.loads(c[0][1]) for c in client.update_serialized.call_args_list]
+        assert [c[0][0] for c in client.update_serialized.call_args_list] == [7, 7]
+        assert [len(u["output"]["annotations"]) for u in updates] == [50, 20]
+        assert updates[1]["output"]["annotations"][-1]["start_line"] == 120
+
+    def test_replay_without_annotations(self):
+        payload = {
+            "name": "Lint",
+            "head_sha": "old-sha",
+            "status": "completed",
+            "conclusion": "success",
+            "output": {"title": "Lint", "summary": "s"},
+        }
+        client = MagicMock()
+
+        replay_result(client, serialize_result(payload, 0), "new-sha")
+
+        created = json.loads(client.create_serialized.call_args[0][0])
+        assert "annotations" not in created["output"]
+        client.update_serialized.assert_not_called()
+
+    def test_result_record(self):
+        """保存した結果から、flushで送信できる引数を組み立て直すケース"""
+        payload = {
+            "name": "Lint",
+            "head_sha": "old-sha",
+            "status": "completed",
+            "conclusion": "failure",
+            "output": {
+                "title": "Lint",
+                "summary": "s",
+                "annotations": [make_annotation(i) for i in range(1, 121)],
+            },
+        }
+
+        record = result_record(serialize_result(payload, 1), "new-sha")
+
+        assert record["head_shas"] == ["new-sha"]
+        assert record["delta"] is True
+        assert record["payload"] == dict(payload, head_sha="new-sha")
+
+    def test_result_record_without_annotations(self):
+        payload = {
+            "name": "Lint",
+            "head_sha": "old-sha",
+            "status": "completed",
+            "conclusion": "success",
+            "output": {"title": "Lint", "summary": "s"},
+        }
+
+        record = result_record(serialize_result(payload, 0), "new-sha")
+
+        assert record["payload"] == dict(payload, head_sha="new-sha")
+        assert record["delta"] is False
+
+
+class TestRunMain:
+    """runサブコマンドのテスト"""
+
+    def tool(self, workdir, returncode=0, annotations=None):
+        """実行回数を記録し、アノテーションを書き出すコマンド"""
+        script = (
+            "import json, sys\n"
+            "open('runs.log', 'a').write('run\\n')\n"
+            f"json.dump({annotations!r}, open('lint.json', 'w'))\n"
+            f"sys.exit({returncode})\n"
+        )
+        return [sys.executable, "-c", script]
+
+    def runs(self, workdir):
+        return (workdir / "runs.log").read_text().count("run")
+
+    def test_reuse(self, mock_environ, workdir, mock_client, caplog):
+        """同じ入力の別のコミットでは、ツールを実行せずに結果をコピーするケース"""
+        command = self.tool(workdir, annotations=[])
+        options = make_options(inputs="src/**", annotations_file="lint.json")
+
+        run_main(options, ["Lint"] + command)
+        with patch.dict(os.environ, {"CODEBUILD_RESOLVED_SOURCE_VERSION": "new-sha"}):
+            run_main(options, ["Lint"] + command)
+
+        assert self.runs(workdir) == 1
+        bodies = [
+            json.loads(c[0][0]) for c in mock_client.create_serialized.call_args_list
+        ]
+        assert [body["head_sha"] for body in bodies] == ["abcdef1234567890", "new-sha"]
+        assert bodies[1]["conclusion"] == "success"
+        assert "Copied the result of abcdef1234567890 to new-sha" in caplog.text
+
+        # 入力が変わったら再実行する
+        (workdir / "src" / "main.py").write_text("print('bye')\n")
+        run_main(options, ["Lint"] + command)
+        assert self.runs(workdir) == 2
+
+    def test_failure_with_annotations(self, mock_environ, workdir, mock_client):
+        """アノテーション付きの失敗は保存し、終了ステータスも再現するケース"""
+        command = self.tool(workdir, 1, [make_annotation(1)])
+        options = make_options(inputs="src/**", annotations_file="lint.json")
+
+        for _ in range(2):
+            with pytest.raises(SystemExit) as e:
+                run_main(options, ["Lint"] + command)
+            assert e.value.code == 1
+
+        assert self.runs(workdir) == 1
+        body = json.loads(mock_client.create_serialized.call_args[0][0])
+        assert body["conclusion"] == "failure"
+        assert body["output"]["annotations"] == [make_annotation(1)]
+        assert "1" in body["output"]["summary"]
+
+    def test_failure_without_annotations(self, mock_environ, workdir, mock_client):
+        """アノテーションなしの失敗は保存しないケース"""
+        command = self.tool(workdir, 2)
+
+        for _ in range(2):
+            with pytest.raises(SystemExit):
+                run_main(make_options(), ["Lint"] + command)
+
+        assert self.runs(workdir) == 2
+        body = json.loads(mock_client.create_serialized.call_args[0][0])
+        assert "exited with 2" in body["output"]["summary"]
+
+    def test_annotations_not_an_array(self, mock_environ, workdir, caplog):
+        """配列でないアノテーションファイルは集計せず、検証エラーにするケース"""
+        command = self.tool(workdir, annotations={"a": 1})
+        options = make_options(annotations_file="lint.json")
+
+        with pytest.raises(SystemExit):
+            run_main(options, ["Lint"] + command)
+
+        assert "output.annotations: must be an array" in caplog.text
+
+    def test_no_matching_inputs(self, mock_environ, workdir, tmp_path, caplog):
+        """--inputsに一致するファイルが無い場合は結果を保存せず毎回実行するケース"""
+        store = tmp_path / "store"
+        options = make_options(inputs="typo_dir/*.py", result_store=f"file://{store}")
+
+        with patch("prcb_checks.reuse.ChecksClient"):
+            for _ in range(2):
+                run_main(options, ["Lint"] + self.tool(workdir))
+        options.dry_run = True
+        run_main(options, ["Lint"] + self.tool(workdir))
+
+        assert self.runs(workdir) == 2
+        assert not store.exists()
+        assert "No file matches --inputs" in caplog.text
+
+    def test_result_store(self, mock_environ, workdir, tmp_path, mock_client):
+        store = tmp_path / "store"
+        options = make_options(result_store=f"file://{store}")
+
+        run_main(options, ["Lint"] + self.tool(workdir))
+
+        assert len(list((store / "results").iterdir())) == 1
+
+    def test_dry_run(self, mock_environ, workdir, mock_client, caplog):
+        run_main(make_options(dry_run=True), ["Lint"] + self.tool(workdir))
+
+        assert not (workdir / "runs.log").exists()
+        assert "not found" in caplog.text
+        mock_client.create_serialized.assert_not_called()
+
+    def test_client_error(self, mock_environ, workdir):
+        with patch("prcb_checks.reuse.ChecksClient") as mock_client_class:
+            mock_client_class.side_effect = ChecksClientError("boom")
+            with pytest.raises(SystemExit):
+                run_main(make_options(), ["Lint"] + self.tool(workdir))
+
+    @pytest.mark.parametrize("policy", ["fail", "skip", "spool"])
+    def test_deadline_exceeded(self, mock_environ, workdir, mock_client, policy):
+        """時間切れは --on-deadline に従い、ツールの終了ステータスで終了するケース"""
+        mock_client.create_serialized.side_effect = ChecksClientTimeout("slow")
+        command = self.tool(workdir, returncode=1, annotations=[make_annotation()])
+
+        with pytest.raises(SystemExit) as excinfo:
+            options = make_options(on_deadline=policy, annotations_file="lint.json")
+            run_main(options, ["Lint"] + command)
+
+        assert excinfo.value.code == 1
+        assert len(list_spooled()) == (1 if policy == "spool" else 0)
+        if policy == "spool":
+            [name] = list_spooled()
+            record = read_json("spool", name)
+            assert record["payload"]["name"] == "Lint"
+            assert len(record["payload"]["output"]["annotations"]) == 1
+
+    def test_deadline_skipped(self, mock_environ, workdir, mock_client):
+        mock_client.create_serialized.side_effect = ChecksClientTimeout("slow")
+
+        run_main(make_options(on_deadline="skip"), ["Lint"] + self.tool(workdir))
+
+        assert self.runs(workdir) == 1
+
+    def test_supersedes_spooled(self, mock_environ, workdir, mock_client):
+        """送信できた結果は、それより前に保存したチェックをflushで送らせないケース"""
+        mock_client.create_serialized.side_effect = ChecksClientTimeout("slow")
+        options = make_options(inputs="src/**", on_deadline="spool")
+        run_main(options, ["Lint"] + self.tool(workdir))
+        mock_client.create_serialized.side_effect = None
+        run_main(options, ["Lint"] + self.tool(workdir))
+
+        [name] = list_spooled()
+        assert drop_superseded(read_json("spool", name), name) is None
+
+    def test_command_not_found(self, mock_environ, workdir, mock_client):
+        with pytest.raises(SystemExit):
+            run_main(make_options(), ["Lint", "/nonexistent/tool"])
+
+    def test_usage_error(self):
+        with pytest.raises(SystemExit):
+            run_main(make_options(), ["Lint"])
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_missing_head_sha(self):
+        with pytest.raises(SystemExit):
+            run_main(make_options(), ["Lint", "true"])
+
+    @patch(
+        "sys.argv",
+        ["prcb-checks", "--inputs", "src/**", "run", "Lint", "--", "tool", "--flag"],
+    )
+    def test_subcommand(self):
+        """`--` 以降はツールのコマンドラインとして扱うケース"""
+        with patch("prcb_checks.reuse.run_main") as mock_run_main:
+            main()
+
+        options, args = mock_run_main.call_args[0]
+        assert options.inputs == "src/**"
+        assert args == ["Lint", "tool", "--flag"]
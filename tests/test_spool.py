@@ -0,0 +1,144 @@
+"""spool.pyのテスト"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from prcb_checks.main import main
+from prcb_checks.cache import read_json
+from prcb_checks.spool import SENT_INDEX, list_spooled, record_sent, spool_check_run
+from tests.conftest import sent_payload
+
+ARGV = [
+    "prcb-checks",
+    "--deadline",
+    "10s",
+    "--on-deadline",
+    "spool",
+    "test-check",
+    "completed",
+    "success",
+    "Test Title",
+    "Test Summary",
+]
+
+
+class TestSpool:
+    """--on-deadline=spoolとflushサブコマンドのテスト"""
+
+    @patch("sys.argv", ARGV)
+    def test_spool_and_flush(
+        self, mock_environ, mock_boto3_client, mock_jwt, mock_requests
+    ):
+        """タイムアウトしたチェックを保存し、flushで再送するケース"""
+        mock_post, _ = mock_requests
+        mock_post.side_effect = requests.ConnectTimeout("timed out")
+
+        main()
+        assert len(list_spooled()) == 1
+
+        mock_post.side_effect = None
+        mock_post.reset_mock()
+        with patch("sys.argv", ["prcb-checks", "flush"]):
+            main()
+
+        assert list_spooled() == []
+        payload = sent_payload(mock_post.call_args)
+        assert payload["name"] == "test-check"
+        assert payload["head_sha"] == "abcdef1234567890"
+
+    @patch("sys.argv", ["prcb-checks", "flush"])
+    def test_flush_keeps_remaining(
+        self, mock_environ, mock_boto3_client, mock_jwt, mock_requests
+    ):
+        """再送がタイムアウトした場合は残りを保存したまま失敗するケース"""
+        mock_post, _ = mock_requests
+        mock_post.side_effect = requests.ReadTimeout("timed out")
+        record = {"payload": {"name": "a"}, "head_shas": ["sha"], "delta": False}
+        spool_check_run(record)
+        spool_check_run(dict(record, payload={"name": "b"}))
+
+        with pytest.raises(SystemExit) as e:
+            main()
+
+        assert e.value.code == 1
+        assert len(list_spooled()) == 2
+
+    @patch("sys.argv", ["prcb-checks", "flush"])
+    def test_flush_keeps_failed(
+        self, mock_environ, mock_boto3_client, mock_jwt, mock_requests, caplog
+    ):
+        """GitHubが作成しなかった場合は保存したまま失敗するケース"""
+        mock_post, mock_response = mock_requests
+        spool_check_run(
+            {
+                "payload": {"name": "a", "head_sha": "sha"},
+                "head_shas": [],
+                "delta": False,
+            }
+        )
+        # トークンの取得は成功し、チェックランの作成が502になる
+        rejected = MagicMock(status_code=502)
+        mock_post.side_effect = [mock_response, rejected]
+
+        with pytest.raises(SystemExit):
+            main()
+
+        assert len(list_spooled()) == 1
+        assert "Could not send spooled check run a" in caplog.text
+        assert "Sent spooled check run" not in caplog.text
+
+    def test_superseded(
+        self, mock_environ, mock_boto3_client, mock_jwt, mock_requests, caplog
+    ):
+        """保存した後に同じチェックを直接送った場合、古い保存分は送らないケース"""
+        mock_post, _ = mock_requests
+        mock_post.side_effect = requests.ConnectTimeout("timed out")
+        with patch("sys.argv", ARGV):
+            main()
+
+        mock_post.side_effect = None
+        with patch("sys.argv", ARGV[:6] + ["completed", "failure", "Done", "Failed"]):
+            main()
+        mock_post.reset_mock()
+        with patch("sys.argv", ["prcb-checks", "flush"]):
+            main()
+
+        mock_post.assert_not_called()
+        assert list_spooled() == []
+        assert "Dropped spooled check run test-check" in caplog.text
+        assert read_json(*SENT_INDEX) == {}
+
+    @patch("sys.argv", ["prcb-checks", "flush"])
+    def test_partially_superseded(
+        self, mock_environ, mock_boto3_client, mock_jwt, mock_requests
+    ):
+        """直接送ったSHAを除いて送るケース"""
+        mock_post, _ = mock_requests
+        payload = {"name": "Build", "head_sha": "sha-1"}
+        spool_check_run(
+            {"payload": payload, "head_shas": ["sha-1", "sha-2"], "delta": False}
+        )
+        record_sent({"payload": payload, "head_shas": [], "delta": False})
+
+        main()
+
+        assert sent_payload(mock_post.call_args)["head_sha"] == "sha-2"
+        assert list_spooled() == []
+
+    def test_record_sent_without_spool(self, cache_dir):
+        """保存分が無ければ送信を記録しないケース"""
+        record_sent({"payload": {"name": "a", "head_sha": "s"}, "head_shas": []})
+
+        assert read_json(*SENT_INDEX) is None
+
+    @patch("sys.argv", ["prcb-checks", "flush"])
+    def test_flush_skips_broken(self, cache_dir, caplog):
+        """壊れたファイルは読み飛ばすケース"""
+        (cache_dir / "spool").mkdir(parents=True)
+        (cache_dir / "spool" / "0-1.json").write_text("{")
+
+        main()
+
+        assert "Skipped a broken spooled check run" in caplog.text
@@ -0,0 +1,107 @@
+"""store.pyのテスト"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+from botocore.exceptions import ClientError
+
+from prcb_checks.store import LocalStore, S3Store, get_store
+
+
+@pytest.fixture
+def mock_s3_client():
+    """Amazon S3クライアントのモック"""
+    mock_client = MagicMock()
+    with patch("boto3.session.Session") as mock_session:
+        mock_session.return_value.client.return_value = mock_client
+        yield mock_client
+
+
+class TestGetStore:
+    """get_store関数のテスト"""
+
+    def test_local_path(self, tmp_path):
+        store = get_store(str(tmp_path))
+        assert isinstance(store, LocalStore)
+        assert store.directory == str(tmp_path)
+
+    def test_file_url(self, tmp_path):
+        store = get_store(f"file://{tmp_path}")
+        assert isinstance(store, LocalStore)
+        assert store.directory == str(tmp_path)
+
+    def test_s3_url(self, mock_s3_client):
+        store = get_store("s3://my-bucket/builds/123/")
+        assert isinstance(store, S3Store)
+        assert store.bucket == "my-bucket"
+        assert store.prefix == "builds/123/"
+
+    def test_s3_url_without_prefix(self, mock_s3_client):
+        store = get_store("s3://my-bucket")
+        assert store.prefix == ""
+
+
+class TestLocalStore:
+    """LocalStoreのテスト"""
+
+    def test_put_get_list(self, tmp_path):
+        """書き込んだオブジェクトを読み込み・一覧できるケース"""
+        store = LocalStore(str(tmp_path))
+        store.put("a/b/2.jsonl", b"two\n")
+        store.put("a/b/1.jsonl", b"one\r\nline\n")
+
+        assert store.get("a/b/2.jsonl") == b"two\n"
+        assert store.list("a/b/") == ["a/b/1.jsonl", "a/b/2.jsonl"]
+        assert list(store.iter_lines("a/b/1.jsonl")) == [b"one", b"line"]
+
+    def test_missing(self, tmp_path):
+        """存在しないオブジェクトのケース"""
+        store = LocalStore(str(tmp_path))
+        assert store.get("missing") is None
+        assert store.list("missing/") == []
+
+
+class TestS3Store:
+    """S3Storeのテスト"""
+
+    def test_put(self, mock_s3_client):
+        S3Store("bucket", "prefix").put("a/1.jsonl", b"data")
+        mock_s3_client.put_object.assert_called_once_with(
+            Bucket="bucket", Key="prefix/a/1.jsonl", Body=b"data"
+        )
+
+    def test_get(self, mock_s3_client):
+        mock_s3_client.get_object.return_value["Body"].read.return_value = b"data"
+        assert S3Store("bucket").get("a/1.jsonl") == b"data"
+        mock_s3_client.get_object.assert_called_once_with(
+            Bucket="bucket", Key="a/1.jsonl"
+        )
+
+    def test_get_missing(self, mock_s3_client):
+        mock_s3_client.get_object.side_effect = ClientError(
+            {"Error": {"Code": "NoSuchKey", "Message": "missing"}}, "GetObject"
+        )
+        assert S3Store("bucket").get("a/1.jsonl") is None
+
+    def test_get_error(self, mock_s3_client):
+        mock_s3_client.get_object.side_effect = ClientError(
+            {"Error": {"Code": "AccessDenied", "Message": "denied"}}, "GetObject"
+        )
+        with pytest.raises(ClientError):
+            S3Store("bucket").get("a/1.jsonl")
+
+    def test_iter_lines(self, mock_s3_client):
+        body = mock_s3_client.get_object.return_value["Body"]
+        body.iter_lines.return_value = iter([b"one", b"two"])
+        assert list(S3Store("bucket").iter_lines("a")) == [b"one", b"two"]
+
+    def test_list(self, mock_s3_client):
+        paginator = mock_s3_client.get_paginator.return_value
+        paginator.paginate.return_value = [
+            {"Contents": [{"Key": "prefix/a/2"}, {"Key": "prefix/a/1"}]},
+            {},
+        ]
+        assert S3Store("bucket", "/prefix/").list("a/") == ["a/1", "a/2"]
+        paginator.paginate.assert_called_once_with(
+            Bucket="bucket", Prefix="prefix/a/", Delimiter="/"
+        )
@@ -0,0 +1,87 @@
+"""summary.pyのテスト"""
+
+from prcb_checks.summary import (
+    AnnotationStats,
+    SpaceSaving,
+    render_summary,
+    summarize_annotations,
+)
+from tests.conftest import make_annotation
+
+
+class TestSpaceSaving:
+    """SpaceSavingのテスト"""
+
+    def test_exact_when_within_capacity(self):
+        """容量内では正確に数えるケース"""
+        sketch = SpaceSaving(capacity=10)
+        for key in "aabbbc":
+            sketch.update(key)
+
+        assert sketch.top(2) == [("b", 3, 0), ("a", 2, 0)]
+
+    def test_heavy_hitters_survive(self):
+        """容量を超えても頻出する要素は上位に残るケース"""
+        sketch = SpaceSaving(capacity=10)
+        for i in range(10000):
+            sketch.update("hot-1" if i % 3 == 0 else f"cold-{i}")
+            if i % 5 == 0:
+                sketch.update("hot-2")
+
+        assert len(sketch.counters) == 10
+        top = [key for key, _, _ in sketch.top(2)]
+        assert sorted(top) == ["hot-1", "hot-2"]
+        key, count, error = sketch.top(1)[0]
+        # 件数は過大評価になり、誤差の上限を超えない
+        assert count >= 3334 and count - error <= 3334
+
+
+class TestRenderSummary:
+    """サマリーのMarkdown出力のテスト"""
+
+    def test_summary(self):
+        """レベル別件数・上位ファイル・上位ルールを出力するケース"""
+        annotations = [
+            make_annotation(path="src/a.py", annotation_level="failure", title="E1")
+        ] * 3
+        annotations += [make_annotation(path="src/b|c.py", title="W1")] * 2
+
+        summary = summarize_annotations(annotations)
+
+        assert summary.startswith("**5 annotations** (3 failure, 2 warning)")
+        assert "| failure | 3 |" in summary
+        assert "| notice | 0 |" in summary
+        assert "| `src/a.py` | 3 |" in summary
+        assert "| `src/b\\|c.py` | 2 |" in summary
+        assert "#### Top rules" in summary
+        assert "| `E1` | 3 |" in summary
+
+    def test_no_rules(self):
+        """ルール(title)が無い場合は上位ルールを出力しないケース"""
+        summary = summarize_annotations([make_annotation(path="a.py")])
+        assert "Top rules" not in summary
+
+    def test_no_annotations(self):
+        assert summarize_annotations([]) == "No annotations."
+
+    def test_approximate_counts_and_long_paths(self):
+        """概数と長いパスの省略のケース"""
+        stats = AnnotationStats(capacity=1)
+        stats.update(make_annotation(path="a.py"))
+        stats.update(make_annotation(path="x" * 200 + ".py"))
+
+        summary = render_summary(stats)
+
+        assert "| `…" in summary
+        assert "| ~2 |" in summary
+
+    def test_max_length(self):
+        """サイズ上限を超えないよう行単位で切り詰めるケース"""
+        stats = AnnotationStats()
+        for i in range(50):
+            stats.update(make_annotation(path=f"file_{i}.py", title=f"R{i}"))
+
+        summary = render_summary(stats, top=50, max_length=300)
+
+        assert len(summary) <= 300
+        assert summary.startswith("**50 annotations**")
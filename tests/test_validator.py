@@ -0,0 +1,157 @@
+"""validator.pyのテスト"""
+
+import pytest
+
+from prcb_checks.validator import (
+    MAX_ANNOTATIONS_PER_REQUEST,
+    validate_annotation,
+    validate_check_run_payload,
+)
+from tests.conftest import make_annotation
+
+
+class TestValidateAnnotation:
+    """validate_annotation関数のテスト"""
+
+    def test_valid_annotation(self):
+        """正しいアノテーションはエラーにならないケース"""
+        annotation = make_annotation(start_column=1, end_column=5, title="t")
+        assert validate_annotation(annotation) == []
+
+    def test_missing_required_fields(self):
+        """必須フィールドが欠けているケース"""
+        errors = validate_annotation({}, 0)
+        assert "annotations[0].path: is required" in errors
+        assert "annotations[0].start_line: is required" in errors
+        assert "annotations[0].annotation_level: is required" in errors
+        assert "annotations[0].message: is required" in errors
+
+    def test_not_an_object(self):
+        """アノテーションがオブジェクトでないケース"""
+        assert validate_annotation("oops") == ["annotation: must be an object"]
+
+    @pytest.mark.parametrize(
+        "overrides, expected",
+        [
+            ({"annotation_level": "error"}, "annotation.annotation_level"),
+            ({"start_line": 0}, "annotation.start_line: must be >= 1"),
+            ({"start_line": True}, "annotation.start_line: must be an integer"),
+            ({"start_line": 5, "end_line": 4}, "annotation.end_line"),
+            (
+                {"end_line": 12, "start_column": 1},
+                "annotation.start_column/end_column",
+            ),
+            ({"start_column": 5, "end_column": 2}, "annotation.end_column"),
+            ({"title": "x" * 256}, "annotation.title: must be at most 255"),
+            ({"message": 1}, "annotation.message: must be a string"),
+            ({"title": 1}, "annotation.title: must be a string"),
+            # 文字数は上限内でも、UTF-8のバイト数で上限を超える
+            (
+                {"message": "あ" * 30000},
+                "annotation.message: must be at most 65536 bytes",
+            ),
+            ({"raw_details": 1}, "annotation.raw_details: must be a string"),
+            ({"raw_details": "é" * 40000}, "annotation.raw_details: must be at most"),
+        ],
+    )
+    def test_invalid_annotation(self, overrides, expected):
+        """不正なアノテーションのケース"""
+        errors = validate_annotation(make_annotation(**overrides))
+        assert any(error.startswith(expected) for error in errors), errors
+
+
+class TestValidateCheckRunPayload:
+    """validate_check_run_payload関数のテスト"""
+
+    def test_valid_payload(self):
+        """正しいペイロードはエラーにならないケース"""
+        payload = {
+            "name": "test-check",
+            "head_sha": "abcdef",
+            "status": "completed",
+            "conclusion": "success",
+            "output": {
+                "title": "Title",
+                "summary": "Summary",
+                "text": "Text",
+                "annotations": [make_annotation()],
+            },
+        }
+        assert validate_check_run_payload(payload) == []
+
+    def test_conclusion_only(self):
+        """conclusionのみ指定した場合はstatusが補完されるので正しいケース"""
+        payload = {"name": "n", "head_sha": "s", "conclusion": "failure"}
+        assert validate_check_run_payload(payload) == []
+
+    def test_reports_every_violation(self):
+        """すべての違反をまとめて報告するケース"""
+        payload = {
+            "head_sha": "abcdef",
+            "status": "done",
+            "output": {"summary": "Summary", "annotations": [{"path": "a.py"}]},
+        }
+        errors = validate_check_run_payload(payload)
+        assert "name: is required" in errors
+        assert any(error.startswith("status: 'done'") for error in errors)
+        assert "output.title: is required" in errors
+        assert "output.annotations[0].start_line: is required" in errors
+
+    @pytest.mark.parametrize(
+        "status, conclusion, expected",
+        [
+            ("completed", None, "conclusion: is required"),
+            (None, "stale", "conclusion: 'stale' can only be set by GitHub"),
+            ("waiting", None, "status: 'waiting' can only be set by GitHub Actions"),
+            ("requested", None, "status: 'requested' can only be set by GitHub"),
+            ("pending", "success", "status: 'pending' can only be set by GitHub"),
+        ],
+    )
+    def test_status_conclusion_pairing(self, status, conclusion, expected):
+        """statusとconclusionの組み合わせが不正なケース"""
+        payload = {"name": "n", "head_sha": "s"}
+        if status is not None:
+            payload["status"] = status
+        if conclusion is not None:
+            payload["conclusion"] = conclusion
+        errors = validate_check_run_payload(payload)
+        assert any(error.startswith(expected) for error in errors), errors
+
+    @pytest.mark.parametrize("status", [None, "queued", "in_progress", "completed"])
+    def test_conclusion_with_any_status(self, status):
+        """conclusionを指定するとcompletedになるため、statusを問わず受け付けるケース"""
+        payload = {"name": "n", "head_sha": "s", "conclusion": "success"}
+        if status is not None:
+            payload["status"] = status
+        assert validate_check_run_payload(payload) == []
+
+    def test_output_not_an_object(self):
+        """outputがオブジェクトでないケース"""
+        payload = {"name": "n", "head_sha": "s", "output": "x"}
+        assert validate_check_run_payload(payload) == ["output: must be an object"]
+
+    def test_annotations_not_an_array(self):
+        """annotationsが配列でないケース"""
+        payload = {
+            "name": "n",
+            "head_sha": "s",
+            "output": {"title": "t", "summary": "s", "annotations": {}},
+        }
+        assert validate_check_run_payload(payload) == [
+            "output.annotations: must be an array"
+        ]
+
+    def test_too_many_annotations(self):
+        """1リクエストあたりのアノテーション数の上限を超えるケース"""
+        payload = {
+            "name": "n",
+            "head_sha": "s",
+            "output": {
+                "title": "t",
+                "summary": "s",
+                "annotations": [make_annotation()] * (MAX_ANNOTATIONS_PER_REQUEST + 1),
+            },
+        }
+        errors = validate_check_run_payload(payload)
+        assert len(errors) == 1
+        assert errors[0].startswith("output.annotations: at most 50")
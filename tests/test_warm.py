@@ -0,0 +1,90 @@
+"""warm.pyのテスト"""
+
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from prcb_checks.cache import load_access_token, load_installation_id
+from prcb_checks.main import main
+
+
+@pytest.fixture
+def token_response(mock_requests):
+    """有効期限付きのトークンを返すレスポンス"""
+    mock_post, mock_response = mock_requests
+    mock_response.json.return_value = {
+        "token": "mock-token",
+        "expires_at": "2099-01-01T00:00:00Z",
+    }
+    return mock_post
+
+
+class TestWarm:
+    """warmサブコマンドのテスト"""
+
+    @patch("sys.argv", ["prcb-checks", "warm"])
+    def test_warm(self, mock_environ, mock_boto3_client, mock_jwt, token_response):
+        """トークンを取得してキャッシュするケース"""
+        main()
+
+        assert load_access_token("67890")[0] == "mock-token"
+        mock_boto3_client.get_secret_value.assert_called_once()
+
+        # 2回目はネットワークI/Oを行わない
+        main()
+        mock_boto3_client.get_secret_value.assert_called_once()
+        token_response.assert_called_once()
+
+    @patch("sys.argv", ["prcb-checks", "warm"])
+    def test_warm_discovers_installation(
+        self, mock_environ, mock_boto3_client, mock_jwt, token_response
+    ):
+        """インストールIDを省略した場合は索引にも保存するケース"""
+        with patch.dict(os.environ), patch("requests.get") as mock_get:
+            del os.environ["GITHUB_APP_INSTALLATION_ID"]
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.json.return_value = {"id": 424242}
+            main()
+            main()
+
+        assert load_installation_id("test-owner/test-repo") == "424242"
+        assert load_access_token("424242")[0] == "mock-token"
+        mock_get.assert_called_once()
+        token_response.assert_called_once()
+
+    @patch("sys.argv", ["prcb-checks", "warm"])
+    def test_token_without_expiry(
+        self, mock_environ, mock_boto3_client, mock_jwt, mock_requests
+    ):
+        """キャッシュできないトークンのケース"""
+        with pytest.raises(SystemExit):
+            main()
+
+    @patch("sys.argv", ["prcb-checks", "warm"])
+    def test_missing_environment(self, mock_environ):
+        with patch.dict(os.environ):
+            del os.environ["SECRETS_MANAGER_SECRETID"]
+            with pytest.raises(SystemExit):
+                main()
+
+    def test_warm_then_check(
+        self, mock_environ, mock_boto3_client, mock_jwt, token_response
+    ):
+        """warm後の最初のチェックは1リクエストで送信されるケース"""
+        with patch.object(sys, "argv", ["prcb-checks", "warm"]):
+            main()
+        token_response.reset_mock()
+        mock_boto3_client.reset_mock()
+
+        with patch.object(sys, "argv", ["prcb-checks", "Build", "in_progress"]):
+            main()
+
+        mock_boto3_client.get_secret_value.assert_not_called()
+        token_response.assert_called_once()
+        assert token_response.call_args[0][0].endswith("/check-runs")
+        assert (
+            token_response.call_args[1]["headers"]["Authorization"]
+            == "Bearer mock-token"
+        )